@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the scheduling overhead of MP_Executor with a chain of trivial
+steps. Because each step depends on its previous step, the wall time per
+step measures how fast a completed step is harvested and its successor is
+dispatched.
+
+    python bench_chain.py              # a chain of 5000 steps
+    python bench_chain.py -n 500 -j 4
+    python bench_chain.py -p           # use a pool of persistent workers
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import MP_Executor
+from sos.utils import env
+
+
+def chain_script(num_steps):
+    return '\n'.join('[chain_{}]\nstep_value = {}\n'.format(i + 1, i)
+        for i in range(num_steps))
+
+
+def benchmark(num_steps, max_jobs, worker_pool):
+    env.verbosity = 0
+    env.max_jobs = max_jobs
+    env.worker_pool = worker_pool
+    env.sig_mode = 'ignore'
+    wf = SoS_Script(chain_script(num_steps)).workflow()
+    start = time.time()
+    MP_Executor(wf).run()
+    elapsed = time.time() - start
+    print('{:>6} steps with -j {}{}: {:8.3f}s in total, {:8.5f}s per step'.format(
+        num_steps, max_jobs, ' -p' if worker_pool else '', elapsed, elapsed / num_steps))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark MP_Executor with a chain of steps')
+    parser.add_argument('-n', type=int, nargs='+', default=[5000],
+        help='Number of steps in the chain')
+    parser.add_argument('-j', type=int, default=2,
+        help='Number of concurrent processes')
+    parser.add_argument('-p', action='store_true',
+        help='Execute steps in a pool of persistent workers')
+    args = parser.parse_args()
+    for n in args.n:
+        benchmark(n, args.j, args.p)
+    sys.exit(0)
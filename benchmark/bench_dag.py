@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the construction of DAGs with synthetic targets.
+
+Each synthetic node produces one target and depends on the target of an
+earlier node, which mimics per-sample auxiliary steps of large workflows.
+
+    python bench_dag.py                  # 1k, 10k and 100k targets
+    python bench_dag.py -n 5000 --legacy # compare with pairwise target scan
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.dag import SoS_DAG
+
+
+def synthetic_dag(num_targets, seed=0):
+    random.seed(seed)
+    dag = SoS_DAG()
+    context = {'__signature_vars__': set(), '__environ_vars__': set(),
+        '__changed_vars__': set()}
+    for i in range(num_targets):
+        depends = ['sample_{}.txt'.format(random.randrange(i))] if i > 0 else []
+        dag.add_step('step_{}'.format(i % 100), 'step {}'.format(i), None,
+            [], depends, ['sample_{}.txt'.format(i)], context=context)
+    return dag
+
+
+def legacy_build(dag):
+    '''Connect nodes by comparing all pairs of targets, which was how
+    SoS_DAG.build was implemented before targets were indexed.'''
+    for target, in_node in dag._all_dependent_files.items():
+        for out_node in [y for (x,y) in dag._all_output_files.items() if x == target]:
+            for i in in_node:
+                for j in out_node:
+                    dag.add_edge(j, i)
+
+
+def benchmark(num_targets, legacy=False):
+    start = time.time()
+    dag = synthetic_dag(num_targets)
+    added = time.time()
+    dag.build([])
+    built = time.time()
+    # adding a node afterwards only connects the new node
+    dag.add_step('extra', 'extra step', None, [], ['sample_0.txt'],
+        ['extra.txt'], context={'__signature_vars__': set(),
+        '__environ_vars__': set(), '__changed_vars__': set()})
+    dag.build([])
+    rebuilt = time.time()
+    print('{:>8} targets: add {:8.3f}s  build {:8.3f}s  incremental {:8.5f}s  ({} edges)'
+        .format(num_targets, added - start, built - added, rebuilt - built,
+        dag.number_of_edges()))
+    if legacy:
+        dag = synthetic_dag(num_targets)
+        start = time.time()
+        legacy_build(dag)
+        print('{:>8} targets: legacy build {:8.3f}s'.format(num_targets,
+            time.time() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark SoS_DAG.build')
+    parser.add_argument('-n', type=int, nargs='+', default=[1000, 10000, 100000],
+        help='Number of synthetic targets')
+    parser.add_argument('--legacy', action='store_true',
+        help='Also time the quadratic target scan, which is slow for more than 10k targets')
+    args = parser.parse_args()
+    for n in args.n:
+        benchmark(n, args.legacy)
+    sys.exit(0)
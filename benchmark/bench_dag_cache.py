@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the initialization of the DAG of a workflow with and without
+configuration dag_cache, with which the DAG is created by the first execution
+and loaded by later executions of the same workflow. A step depends on targets
+that are provided by different auxiliary steps.
+
+    python bench_dag_cache.py               # 100 auxiliary steps, 3000 targets
+    python bench_dag_cache.py -a 10 -t 1000 10000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import Base_Executor
+from sos.utils import env
+
+
+def dag_script(num_rules, num_targets):
+    rules = ''.join('[rule_{0}: provides="{{name}}.ext{0}"]\noutput: "${{name}}.ext{0}"\n\n'.format(i)
+        for i in range(num_rules))
+    return rules + '''
+[default]
+depends: ['sample_{{}}.ext{{}}'.format(i, i % {}) for i in range({})]
+'''.format(num_rules, num_targets)
+
+
+def initialize_dag(script, config_file):
+    env.verbosity = 0
+    executor = Base_Executor(SoS_Script(script).workflow(), config_file=config_file)
+    start = time.time()
+    dag = executor.initialize_dag()
+    return dag, time.time() - start
+
+
+def benchmark(num_rules, num_targets):
+    script = dag_script(num_rules, num_targets)
+    with open('dag_cache.yaml', 'w') as config:
+        config.write('dag_cache: true\n')
+    # the first initialization also imports modules used by sos
+    initialize_dag(script, None)
+    _, uncached = initialize_dag(script, None)
+    _, saved = initialize_dag(script, 'dag_cache.yaml')
+    dag, loaded = initialize_dag(script, 'dag_cache.yaml')
+    assert dag.num_nodes() == num_targets + 1
+    print('{} auxiliary steps, {} targets: build {:.3f}s, build and save {:.3f}s, load {:.3f}s'.format(
+        num_rules, num_targets, uncached, saved, loaded))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark initialization of DAG with saved DAG')
+    parser.add_argument('-a', type=int, default=100, help='Number of auxiliary steps')
+    parser.add_argument('-t', type=int, nargs='+', default=[3000], help='Number of targets')
+    args = parser.parse_args()
+    for t in args.t:
+        benchmark(args.a, t)
+    sys.exit(0)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the export of a DAG with an auxiliary step that is called for
+each sample and a step that depends on the outputs of all samples.
+
+    python bench_dag_export.py              # 100000 samples
+    python bench_dag_export.py -n 10000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.dag import SoS_DAG
+
+
+def create_dag(num_samples):
+    dag = SoS_DAG()
+    context = {'__signature_vars__': {'name'}, '__environ_vars__': {'name'},
+        '__changed_vars__': set()}
+    for i in range(num_samples):
+        dag.add_step('align', "align ['sample_{}.bam']".format(i), None,
+            ['sample_{}.fq'.format(i)], [], ['sample_{}.bam'.format(i)], context)
+    dag.add_step('default', 'default_0', 0, ['sample_{}.bam'.format(i) for i in range(num_samples)],
+        [], ['all.txt'], context)
+    dag.build([])
+    return dag
+
+
+def benchmark(num_samples):
+    dag = create_dag(num_samples)
+    times = []
+    for filename, kwargs in [('dag.dot', {}), ('dag.json', {}), ('collapsed.dot', {'collapse': True})]:
+        # previous versions of sos can only write DOT files with pydot
+        if (filename.endswith('.json') or kwargs) and not hasattr(dag, 'write_json'):
+            times.append('n/a')
+            continue
+        start = time.time()
+        (dag.write_json if filename.endswith('.json') else dag.write_dot)(filename, **kwargs)
+        times.append('{:.2f}s ({:.1f}M)'.format(time.time() - start, os.path.getsize(filename) / 2**20))
+    print('{} nodes: DOT {}, JSON {}, collapsed DOT {}'.format(dag.num_nodes(), *times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark export of DAG')
+    parser.add_argument('-n', type=int, nargs='+', default=[100000], help='Number of samples')
+    args = parser.parse_args()
+    for n in args.n:
+        benchmark(n)
+    sys.exit(0)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark memory used by a large DAG and the time to build and to
+"execute" it (find executable nodes and mark them completed). Each sample
+has a chain of steps (e.g. per-chromosome alignment, calling and merging),
+and a final step depends on the last steps of all samples.
+
+    python bench_dag_memory.py              # 100000 samples, 3 steps each
+    python bench_dag_memory.py -n 10000 -s 5
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.dag import SoS_DAG
+
+
+def create_dag(num_samples, num_steps):
+    dag = SoS_DAG()
+    context = {'__signature_vars__': {'name'}, '__environ_vars__': {'name'},
+        '__changed_vars__': set()}
+    for i in range(num_samples):
+        for s in range(num_steps):
+            dag.add_step('step_{}'.format(s), 'step_{} sample_{}'.format(s, i), None,
+                ['sample_{}.{}'.format(i, s)], [], ['sample_{}.{}'.format(i, s + 1)], context)
+    dag.add_step('final', 'final', None, ['sample_{}.{}'.format(i, num_steps) for i in range(num_samples)],
+        [], ['final.out'], context)
+    dag.build([])
+    return dag
+
+
+def execute(dag):
+    while True:
+        node = dag.find_executable()
+        if node is None:
+            break
+        dag.set_status(node, 'completed')
+
+
+def benchmark(num_samples, num_steps):
+    start = time.time()
+    dag = create_dag(num_samples, num_steps)
+    created = time.time() - start
+    start = time.time()
+    assert not dag.circular_dependencies()
+    checked = time.time() - start
+    start = time.time()
+    execute(dag)
+    executed = time.time() - start
+    assert all(x._status == 'completed' for x in dag.nodes())
+    del dag
+    tracemalloc.start()
+    dag = create_dag(num_samples, num_steps)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{} nodes: {:.1f}M ({:.0f} bytes per node), create {:.2f}s, check {:.2f}s, execute {:.2f}s'.format(
+        dag.num_nodes(), size / 2**20, size / dag.num_nodes(), created, checked, executed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark memory and time of large DAGs')
+    parser.add_argument('-n', type=int, default=100000, help='Number of samples')
+    parser.add_argument('-s', type=int, default=3, help='Number of steps for each sample')
+    args = parser.parse_args()
+    benchmark(args.n, args.s)
+    sys.exit(0)
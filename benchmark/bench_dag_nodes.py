@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the addition of auxiliary-step nodes to a DAG, which happens when
+an auxiliary step is added for each requested target, and the lookup of nodes
+by their UUIDs, which happens when steps are completed.
+
+    python bench_dag_nodes.py               # 100k nodes
+    python bench_dag_nodes.py -n 10000 50000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.dag import SoS_DAG
+
+
+def benchmark(num_nodes):
+    dag = SoS_DAG()
+    start = time.time()
+    for i in range(num_nodes):
+        context = {
+            'name': 'sample_{}'.format(i),
+            '__signature_vars__': {'name', 'ref', 'opt'},
+            '__environ_vars__': {'name', 'ref'},
+            '__changed_vars__': set(),
+            '__default_output__': ['sample_{}.bam'.format(i)]}
+        dag.add_step('aux_uuid', 'align sample_{}.bam'.format(i), None,
+            ['sample_{}.fq'.format(i)], [], ['sample_{}.bam'.format(i)], context)
+        # the same step is requested again by another target
+        dag.add_step('aux_uuid', 'align sample_{}.bam'.format(i), None,
+            ['sample_{}.fq'.format(i)], [], ['sample_{}.bam'.format(i)], context)
+    added = time.time() - start
+    assert dag.num_nodes() == num_nodes
+    start = time.time()
+    dag.build([])
+    built = time.time() - start
+    uuids = [x._node_uuid for x in dag.nodes()]
+    start = time.time()
+    for uuid in uuids[-1000:]:
+        dag.node_by_id(uuid)
+    lookup = time.time() - start
+    print('{:>7} nodes: add {:8.3f}s ({:.1f}us per node), build {:.3f}s, 1000 lookups {:.4f}s'.format(
+        num_nodes, added, added / num_nodes / 2 * 1e6, built, lookup))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark addition of nodes to DAG')
+    parser.add_argument('-n', type=int, nargs='+', default=[100000],
+        help='Number of auxiliary-step nodes')
+    args = parser.parse_args()
+    for n in args.n:
+        benchmark(n)
+    sys.exit(0)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark memory and time used by file targets. Each file is referred to by
+several targets (e.g. output of a step, input of another step, and their
+signatures), and the signature path of each target is calculated.
+
+    python bench_file_target.py               # 1M files, 3 targets per file
+    python bench_file_target.py -n 100000 -r 5
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.target import FileTarget
+try:
+    from sos.target import clear_file_paths
+except ImportError:
+    # targets of previous versions of sos do not share paths
+    clear_file_paths = lambda: None
+
+
+def create_targets(names, num_refs):
+    targets = [FileTarget(x) for r in range(num_refs) for x in names]
+    for t in targets:
+        t.sig_file()
+    return targets
+
+
+def benchmark(num_files, num_refs):
+    names = ['data/sample_{}/file_{}.txt'.format(x // 100, x) for x in range(num_files)]
+    start = time.time()
+    targets = create_targets(names, num_refs)
+    elapsed = time.time() - start
+    del targets
+    clear_file_paths()
+    # memory is measured separately because tracemalloc slows down allocations
+    tracemalloc.start()
+    targets = create_targets(names, num_refs)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('{} files, {} targets: {:.2f}s, {:.1f}M ({:.1f}M per 1M targets)'.format(
+        num_files, len(targets), elapsed, size / 2**20, size / 2**20 / len(targets) * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark file targets')
+    parser.add_argument('-n', type=int, default=1000000, help='Number of files')
+    parser.add_argument('-r', type=int, default=3, help='Number of targets per file')
+    args = parser.parse_args()
+    benchmark(args.n, args.r)
+    sys.exit(0)
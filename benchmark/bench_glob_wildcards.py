@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark glob_wildcards on a directory tree with samples/{sample}/raw/{read}.fq
+and large intermediate directories (samples/{sample}/work) that cannot match
+the pattern, comparing a full os.walk of the tree with the pruned scanner.
+
+    python bench_glob_wildcards.py                # 200 samples, 200 files under work
+    python bench_glob_wildcards.py -s 50 -w 1000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+from itertools import chain
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.pattern import glob_wildcards, compile_pattern, directory_listings
+from sos.utils import env
+
+
+def walk_wildcards(pattern):
+    # glob_wildcards that walks through the whole tree
+    dirname, names, regex = compile_pattern(pattern)
+    res = {x: [] for x in names}
+    for f in ((os.path.join(dirpath, f) if dirpath != "." else f)
+              for dirpath, dirnames, filenames in os.walk(dirname)
+              for f in chain(filenames, dirnames)):
+        match = regex.match(f)
+        if match:
+            for name, value in match.groupdict().items():
+                res[name].append(value)
+    return res
+
+
+def benchmark(num_samples, num_work):
+    for s in range(num_samples):
+        os.makedirs(os.path.join('samples', 'S{}'.format(s), 'raw'))
+        for r in (1, 2):
+            open(os.path.join('samples', 'S{}'.format(s), 'raw', 'R{}.fq'.format(r)), 'w').close()
+        for w in range(num_work // 10):
+            work_dir = os.path.join('samples', 'S{}'.format(s), 'work', 'w{}'.format(w))
+            os.makedirs(work_dir)
+            for f in range(10):
+                open(os.path.join(work_dir, 'tmp_{}.txt'.format(f)), 'w').close()
+    pattern = r'samples/{sample,\w+}/raw/{read,\w+}.fq'
+    start = time.time()
+    expected = walk_wildcards(pattern)
+    walk = time.time() - start
+    start = time.time()
+    res = glob_wildcards(pattern)
+    pruned = time.time() - start
+    assert res == expected
+    env.listing_cache = True
+    directory_listings.clear()
+    # listings of directories modified recently are not cached
+    time.sleep(directory_listings.RACY_WINDOW + 0.5)
+    glob_wildcards(pattern)
+    start = time.time()
+    glob_wildcards(pattern)
+    cached = time.time() - start
+    print('{} samples, {} work files each: os.walk {:.3f}s, pruned {:.3f}s, cached {:.3f}s'.format(
+        num_samples, num_work, walk, pruned, cached))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark glob_wildcards')
+    parser.add_argument('-s', type=int, default=200, help='Number of samples')
+    parser.add_argument('-w', type=int, default=200,
+        help='Number of files under the work directory of each sample')
+    args = parser.parse_args()
+    benchmark(args.s, args.w)
+    sys.exit(0)
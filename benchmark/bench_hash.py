@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the calculation of file signatures with different algorithms,
+one file at a time and concurrently.
+
+    python bench_hash.py                       # 64 files of 4M
+    python bench_hash.py -n 16 -s 64 -a md5 blake2b xxh64
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.target import fileDigest, fileDigests
+
+
+def benchmark(num_files, size, algorithms):
+    files = []
+    for i in range(num_files):
+        files.append('file_{}.bin'.format(i))
+        with open(files[-1], 'wb') as f:
+            f.write(os.urandom(size * 2**20))
+    for algorithm in algorithms:
+        start = time.time()
+        for f in files:
+            fileDigest(f, algorithm)
+        serial = time.time() - start
+        start = time.time()
+        fileDigests(files, algorithm)
+        parallel = time.time() - start
+        print('{:>8}: {} files of {}M, serial {:7.3f}s, concurrent {:7.3f}s'.format(
+            algorithm, num_files, size, serial, parallel))
+    for f in files:
+        os.remove(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark hashing of files')
+    parser.add_argument('-n', type=int, default=64, help='Number of files')
+    parser.add_argument('-s', type=int, default=4, help='Size of files in M')
+    parser.add_argument('-a', nargs='+', default=['md5', 'sha1', 'blake2b'],
+        help='Hash algorithms')
+    args = parser.parse_args()
+    benchmark(args.n, args.s, args.a)
+    sys.exit(0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark interpolation of typical shell script templates with parsed
+templates and with the dynamic interpolator that parses templates on each
+call.
+
+    python bench_interpolate.py               # 10000 interpolations of each template
+    python bench_interpolate.py -n 100000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_eval import SoS_String, interpolate
+from sos.utils import env, WorkflowDict
+
+TEMPLATES = [
+    ('simple', 'samtools index ${_input}', '${ }'),
+    ('options', 'bwa mem -t ${nthreads} -R "${rg!q}" ${ref!q} ${_input!q} > ${_output!q}', '${ }'),
+    ('expressions', '''
+for f in ${' '.join(_input)}; do
+    gzip -c $f > ${_output[0]!a}.gz
+done
+echo ${len(_input):>5} files ${_input!b,}
+''', '${ }'),
+    ('sigil', 'cut -f ${cols} %(_input!q) | sort -k%(key + 1) > %(_output!q)', '%( )'),
+]
+
+
+def benchmark(num_calls):
+    env.sos_dict = WorkflowDict({
+        '_input': ['data/sample 1.fastq', 'data/sample_2.fastq'],
+        '_output': ['result/sample.bam'],
+        'nthreads': 4,
+        'rg': '@RG\\tID:sample',
+        'ref': 'ref/hg19.fa',
+        'cols': '1,2',
+        'key': 2,
+        'interpolate': interpolate,
+        })
+    for name, text, sigil in TEMPLATES:
+        ss = SoS_String(sigil)
+        assert ss.interpolate(text) == ss._dynamic_interpolate(text)
+        start = time.time()
+        for i in range(num_calls):
+            SoS_String(sigil)._dynamic_interpolate(text)
+        dynamic = time.time() - start
+        start = time.time()
+        for i in range(num_calls):
+            SoS_String(sigil).interpolate(text)
+        template = time.time() - start
+        print('{:>12}: {} interpolations, dynamic {:7.3f}s, template {:7.3f}s'.format(
+            name, num_calls, dynamic, template))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark string interpolation')
+    parser.add_argument('-n', type=int, default=10000, help='Number of interpolations')
+    args = parser.parse_args()
+    benchmark(args.n)
+    sys.exit(0)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the resolution of dangling targets by auxiliary steps. A step
+depends on targets that are provided by different auxiliary steps, which
+are added to the DAG when the DAG is initialized.
+
+    python bench_resolve.py                 # 300 auxiliary steps, 3000 targets
+    python bench_resolve.py -a 100 -t 10000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import Base_Executor
+from sos.utils import env
+
+
+def resolve_script(num_rules, num_targets):
+    rules = ''.join('[rule_{0}: provides="{{name}}.ext{0}"]\noutput: "${{name}}.ext{0}"\n\n'.format(i)
+        for i in range(num_rules))
+    return rules + '''
+[default]
+depends: ['sample_{{}}.ext{{}}'.format(i, i % {}) for i in range({})]
+'''.format(num_rules, num_targets)
+
+
+def benchmark(num_rules, num_targets):
+    env.verbosity = 0
+    wf = SoS_Script(resolve_script(num_rules, num_targets)).workflow()
+    start = time.time()
+    dag = Base_Executor(wf).initialize_dag()
+    elapsed = time.time() - start
+    assert dag.num_nodes() == num_targets + 1
+    print('{} auxiliary steps, {} targets: {:.3f}s'.format(num_rules, num_targets, elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark resolution of dangling targets')
+    parser.add_argument('-a', type=int, default=300, help='Number of auxiliary steps')
+    parser.add_argument('-t', type=int, nargs='+', default=[3000], help='Number of targets')
+    args = parser.parse_args()
+    for t in args.t:
+        benchmark(args.a, t)
+    sys.exit(0)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the re-execution of an interrupted workflow with and without
+option --resume. A chain of steps writes a file each and the last step fails
+in the first execution. The workflow is then executed again, either by
+validating the signatures of completed steps or by resuming it from its
+checkpoint.
+
+    python bench_resume.py              # 200 steps, 4M files
+    python bench_resume.py -n 50 -s 64
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import MP_Executor, ExecuteError
+from sos.utils import env
+
+
+def resume_script(num_steps, size):
+    steps = ''.join('''[chain_{0}]
+output: 'file_{0}.dat'
+with open('file_{0}.dat', 'wb') as out:
+    out.write(b'x' * {1} * 1024 * 1024)
+
+'''.format(i + 1, size) for i in range(num_steps))
+    return steps + '''[chain_{}]
+fail_if(not os.path.isfile('resume.ok'))
+'''.format(num_steps + 1)
+
+
+def execute(num_steps, size, resume):
+    env.verbosity = 0
+    env.max_jobs = 2
+    env.resume = resume
+    wf = SoS_Script(resume_script(num_steps, size)).workflow()
+    start = time.time()
+    try:
+        MP_Executor(wf).run()
+    except ExecuteError:
+        pass
+    return time.time() - start
+
+
+def benchmark(num_steps, size):
+    first = execute(num_steps, size, False)
+    rerun = execute(num_steps, size, False)
+    open('resume.ok', 'w').close()
+    resumed = execute(num_steps, size, True)
+    os.remove('resume.ok')
+    print('{} steps, {}M files: first execution {:.3f}s, rerun {:.3f}s, resume {:.3f}s'.format(
+        num_steps, size, first, rerun, resumed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark resuming of interrupted workflows')
+    parser.add_argument('-n', type=int, default=200, help='Number of steps')
+    parser.add_argument('-s', type=int, default=4, help='Size of files in MB')
+    args = parser.parse_args()
+    benchmark(args.n, args.s)
+    sys.exit(0)
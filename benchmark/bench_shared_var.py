@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the passing of a large shared variable from a step to the steps
+after it. The variable is a bytes object, or a numpy array if option --numpy
+is specified.
+
+    python bench_shared_var.py              # 500M, 5 steps
+    python bench_shared_var.py -m 100 -s 10 --numpy
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import Base_Executor, MP_Executor
+from sos.utils import env
+
+
+def shared_script(size, num_steps, numpy):
+    if numpy:
+        value = 'numpy.ones({}, dtype="uint8")'.format(size * 2**20)
+    else:
+        value = 'b"a" * {}'.format(size * 2**20)
+    return '''
+[step_1: shared='data']
+import numpy
+data = {}
+'''.format(value).replace('import numpy\n', 'import numpy\n' if numpy else '') + ''.join('''
+[step_{}]
+assert len(data) == {}
+'''.format(i + 2, size * 2**20) for i in range(num_steps - 1))
+
+
+def benchmark(size, num_steps, numpy):
+    env.verbosity = 0
+    script = SoS_Script(shared_script(size, num_steps, numpy))
+    for executor in (Base_Executor, MP_Executor):
+        env.max_jobs = 2
+        # steps are executed by both executors
+        env.sig_mode = 'ignore'
+        start = time.time()
+        executor(script.workflow('step')).run()
+        print('{}: {}M {}, {} steps: {:.2f}s'.format(executor.__name__, size,
+            'array' if numpy else 'bytes', num_steps, time.time() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark large shared variables')
+    parser.add_argument('-m', type=int, default=500, help='Size of variable in MB')
+    parser.add_argument('-s', type=int, default=5, help='Number of steps')
+    parser.add_argument('--numpy', action='store_true', help='Share a numpy array')
+    args = parser.parse_args()
+    benchmark(args.m, args.s, args.numpy)
+    sys.exit(0)
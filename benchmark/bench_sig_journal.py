@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark contention on the workflow signature when records of executed
+steps are appended by concurrent processes, either by locking the workflow
+signature for each record, or by buffering records in the journal of each
+process and merging them in the master process.
+
+    python bench_sig_journal.py                # 8 processes, 2000 records each
+    python bench_sig_journal.py -n 4 -r 500
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import fasteners
+import multiprocessing as mp
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.signatures import workflow_journal
+
+RECORD = 'EXE_SIG\tstep={0:032x}\tsession={0:032x}\n'
+
+
+def append_with_lock(workflow_sig, num_records, wait):
+    lock_wait = 0
+    for i in range(num_records):
+        start = time.time()
+        with fasteners.InterProcessLock(workflow_sig + '_'):
+            lock_wait += time.time() - start
+            with open(workflow_sig, 'a') as wf:
+                wf.write(RECORD.format(i))
+    wait.put(lock_wait)
+
+
+def append_to_journal(workflow_sig, num_records, wait):
+    for i in range(num_records):
+        workflow_journal.append(workflow_sig, RECORD.format(i))
+    workflow_journal.flush()
+    wait.put(workflow_journal.lock_wait)
+
+
+def benchmark(method, num_procs, num_records):
+    workflow_sig = os.path.abspath('{}.sig'.format(method.__name__))
+    wait = mp.Queue()
+    start = time.time()
+    procs = [mp.Process(target=method, args=(workflow_sig, num_records, wait))
+        for i in range(num_procs)]
+    for p in procs:
+        p.start()
+    lock_wait = sum(wait.get() for p in procs)
+    for p in procs:
+        p.join()
+    workflow_journal.lock_wait = 0
+    workflow_journal.merge(workflow_sig)
+    lock_wait += workflow_journal.lock_wait
+    elapsed = time.time() - start
+    with open(workflow_sig) as sig:
+        assert len(sig.readlines()) == num_procs * num_records
+    print('{:>18}: {} processes x {} records, {:7.3f}s in total, {:7.3f}s waiting for lock'.format(
+        method.__name__, num_procs, num_records, elapsed, lock_wait))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark writing of workflow signatures')
+    parser.add_argument('-n', type=int, default=8, help='Number of processes')
+    parser.add_argument('-r', type=int, default=2000, help='Number of records per process')
+    args = parser.parse_args()
+    for method in (append_with_lock, append_to_journal):
+        benchmark(method, args.n, args.r)
+    sys.exit(0)
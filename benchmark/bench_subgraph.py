@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the creation of a DAG for thousands of targets (sos run -t),
+which are provided by auxiliary steps, and the addition of auxiliary steps
+one at a time to the DAG, each followed by a check of circular dependencies,
+as is done when steps request targets dynamically.
+
+    python bench_subgraph.py               # 5000 targets
+    python bench_subgraph.py -t 1000 10000
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.sos_script import SoS_Script
+from sos.sos_executor import Base_Executor
+from sos.utils import env
+
+script = '''
+[align: provides='{name}.bam']
+output: "${name}.bam"
+
+[call: provides='{name}.vcf']
+depends: "${name}.bam"
+output: "${name}.vcf"
+'''
+
+
+def benchmark(num_targets, num_added):
+    env.verbosity = 0
+    wf = SoS_Script(script).workflow()
+    targets = ['sample_{}.vcf'.format(i) for i in range(num_targets)]
+    start = time.time()
+    dag = Base_Executor(wf).initialize_dag(targets=targets)
+    initialized = time.time() - start
+    assert dag.num_nodes() == 2 * num_targets
+    # DAGs trimmed by previous versions of sos cannot be modified
+    executor = Base_Executor(wf)
+    dag = executor.initialize_dag()
+    executor.resolve_dangling_targets(dag, targets)
+    dag.build(wf.auxiliary_sections)
+    context = {'__signature_vars__': set(), '__environ_vars__': set(), '__changed_vars__': set()}
+    start = time.time()
+    for i in range(num_added):
+        dag.add_step('uuid', 'extra {}'.format(i), None, ['sample_{}.vcf'.format(i)], [],
+            ['extra_{}.txt'.format(i)], context)
+        dag.build([])
+        assert not dag.circular_dependencies()
+    added = time.time() - start
+    print('{} targets: initialize DAG {:.3f}s, add {} steps {:.3f}s'.format(
+        num_targets, initialized, num_added, added))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark DAG with many targets')
+    parser.add_argument('-t', type=int, nargs='+', default=[5000], help='Number of targets')
+    parser.add_argument('-a', type=int, default=200,
+        help='Number of steps added to the DAG one at a time')
+    args = parser.parse_args()
+    for t in args.t:
+        benchmark(t, args.a)
+    sys.exit(0)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+'''Benchmark the creation of payloads of tasks, which are variables that are
+sent with tasks of substeps to workers of the task pool. Each substep has its
+own _input and _output, and shares the input of the step and a few other
+variables with other substeps.
+
+    python bench_task_payload.py            # 10000 substeps
+    python bench_task_payload.py -n 1000 5000
+'''
+import os
+import sys
+import time
+import pickle
+import argparse
+import tempfile
+
+# sos creates .sos/.runtime under the current directory upon import
+os.chdir(tempfile.mkdtemp())
+
+from sos.utils import env, WorkflowDict
+try:
+    from sos.utils import PickledVars
+except ImportError:
+    # previous versions of sos clone and pickle variables
+    PickledVars = None
+
+
+def benchmark(num_substeps):
+    env.verbosity = 0
+    sos_dict = WorkflowDict()
+    files = ['data/sample_{}.fq'.format(i) for i in range(num_substeps)]
+    sos_dict.set('input', files)
+    sos_dict.set('step_name', 'align')
+    sos_dict.set('ref', 'hg19.fa')
+    sos_dict.set('options', ('--threads', 4, '--quality', 30))
+    sos_dict.set('__workflow_sig__', '.sos/workflow.sig')
+    selected = {'_input', '_output', '_index', '_runtime', 'input', 'step_name', 'ref',
+        'options', '__workflow_sig__'}
+    cache = {}
+    size = 0
+    start = time.time()
+    for idx, name in enumerate(files):
+        sos_dict.set('_index', idx)
+        sos_dict.set('_input', [name])
+        sos_dict.set('_output', [name[:-3] + '.bam'])
+        sos_dict.set('_runtime', {'concurrent': True})
+        if PickledVars is None:
+            payload = pickle.dumps(sos_dict.clone_selected_vars(selected))
+        else:
+            payload = pickle.dumps(PickledVars(sos_dict.pickle_selected_vars(selected, cache)))
+        size += len(payload)
+    elapsed = time.time() - start
+    print('{} substeps: {:.2f}s ({:.1f}us per substep), {:.1f}M payload'.format(
+        num_substeps, elapsed, elapsed / num_substeps * 1e6, size / 2**20))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark payloads of tasks')
+    parser.add_argument('-n', type=int, nargs='+', default=[10000], help='Number of substeps')
+    args = parser.parse_args()
+    for n in args.n:
+        benchmark(n)
+    sys.exit(0)
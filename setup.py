@@ -138,9 +138,6 @@ setup(name = "sos",
           'ipython',
           'notebook',
           'ptpython',
-          # for DAG
-          'networkx',
-          'pydotplus',
       ],
     entry_points= '''
 [console_scripts]
@@ -243,5 +240,6 @@ ipynb_sos.func = sos.jupyter.converter:notebook_to_script
         'rq':       ['rq', 'rq-dashboard'],
         'celery':   ['celery', 'flower'],
         'bam':      ['pysam'],
+        'dag':      ['networkx'],
     }
 )
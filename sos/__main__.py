@@ -173,6 +173,11 @@ def get_run_parser(interactive=False, with_workflow=True):
             specified processes concurrently. These include looped processes
             within a step (with runtime option `concurrent=True`) and steps with
             non-missing required files.''')
+    if not interactive:
+        parser.add_argument('-p', action='store_true', dest='__worker_pool__',
+            help='''Execute steps in a pool of JOBS long-lived worker processes
+                instead of starting a new process for each step. This reduces the
+                overhead of workflows with a large number of small steps.''')
     parser.add_argument('-c', dest='__config__', metavar='CONFIG_FILE',
         help='''A configuration file in the format of YAML/JSON. The content
             of the configuration file will be available as a dictionary
@@ -211,6 +216,20 @@ def get_run_parser(interactive=False, with_workflow=True):
         help='''Execute the workflow in a special run mode that re-use existing
             output files and recontruct runtime signatures if output files
             exist.''')
+    if not interactive:
+        runmode.add_argument('--resume', action='store_true', dest='__resume__',
+            help='''Resume the execution of a workflow that was interrupted or
+                failed, from a checkpoint of its completed steps. Completed steps
+                are not executed again (and their signatures are not validated)
+                if their input, dependent and output files are unchanged. This
+                option is only used for parallel execution (JOBS > 1).''')
+    runmode.add_argument('-s', dest='__sig_store__', metavar='STORE',
+        help='''Store runtime signatures in one file per signature ('file'),
+            or in a SQLite database under .sos ('sqlite'), which is more
+            efficient for workflows with a large number of targets. Default
+            to configuration sig_store, or 'sqlite' if signatures have been
+            migrated to a database by command 'sos migrate', and 'file'
+            otherwise.''')
     parser.add_argument('-v', '--verbosity', type=int, choices=range(5), default=1 if interactive else 2,
         help='''Output error (0), warning (1), info (2), debug (3) and trace (4)
             information to standard output (default to 2).'''),
@@ -221,9 +240,17 @@ def cmd_run(args, workflow_args):
     import atexit
     from .utils import env, get_traceback
     from .sos_script import SoS_Script
+    from .signatures import signature_store_names
     
+    if args.__sig_store__ and args.__sig_store__ not in signature_store_names():
+        sys.exit('Unrecognized signature store {}. Available stores are: {}'
+            .format(args.__sig_store__, ', '.join(signature_store_names())))
     env.max_jobs = args.__max_jobs__
+    env.worker_pool = args.__worker_pool__
+    env.resume = args.__resume__
     env.verbosity = args.verbosity
+    # if unspecified, set by configuration sig_store or default_signature_store()
+    env.sig_store = args.__sig_store__
 
     if args.__queue__:
         # import all executors
@@ -274,7 +301,10 @@ def cmd_run(args, workflow_args):
         workflow = script.workflow(args.workflow, use_default=not args.__targets__)
         executor = executor_class(workflow, args=workflow_args, config_file=args.__config__)
         #
-        if args.__dryrun__:
+        if args.__dryrun__ and getattr(args, '__dag__', None):
+            # only write the DAG of the workflow
+            return executor.write_dag(args.__dag__, args.__targets__, args.__collapse__)
+        elif args.__dryrun__:
             return executor.dryrun(args.__targets__)
         else:
             # if dag is None, the script will be run sequentially and cannot handle
@@ -305,6 +335,13 @@ def get_dryrun_parser():
             will be the target of execution. If specified, SoS will execute
             only part of a workflow or multiple workflows or auxiliary steps
             to generate specified targets. ''')
+    parser.add_argument('--dag', dest='__dag__', metavar='DAG_FILE',
+        help='''Write the DAG of the workflow to DAG_FILE, in JSON format if
+            its name ends with .json and in DOT format otherwise, without
+            executing any step.''')
+    parser.add_argument('--collapse', dest='__collapse__', action='store_true',
+        help='''Write nodes of the same step (e.g. an auxiliary step that
+            produces many targets) as a single node to the DAG file.''')
     parser.add_argument('-v', '--verbosity', type=int, choices=range(5), default=2,
         help='''Output error (0), warning (1), info (2), debug (3) and trace (4)
             information to standard output (default to 2).'''),
@@ -314,8 +351,11 @@ def get_dryrun_parser():
 def cmd_dryrun(args, workflow_args):
     args.__rerun__ = False
     args.__construct__ = False
+    args.__sig_store__ = None
     args.__queue__ = None
     args.__max_jobs__ = 1
+    args.__worker_pool__ = False
+    args.__resume__ = False
     args.__dryrun__ = True
     args.__bin_dirs__ = []
     cmd_run(args, workflow_args)
@@ -365,14 +405,19 @@ def get_tracked_files(sig_file):
                 # format is something like IN_FILE\tfilename=xxxx\tsession=...
                 tracked_files.append(line.rsplit('\t', 4)[1][9:])
                 t = FileTarget(tracked_files[-1])
-                if t.exists('signature'):
+                if os.path.isfile(t.sig_file()):
                     runtime_files.append(t.sig_file())
             elif line.startswith('EXE_SIG'):
-                runtime_files.append('.sos/.runtime/{}.exe_info'.format(line.split('session=', 1)[1].strip()))
+                info_file = '.sos/.runtime/{}.exe_info'.format(line.split('session=', 1)[1].strip())
+                if os.path.isfile(info_file):
+                    runtime_files.append(info_file)
             elif line.startswith('# script:'):
                 script_files.append(line.split(':', 1)[1].strip())
             elif line.startswith('# included:'):
                 script_files.extend(line.split(':', 1)[-1].strip().split(','))
+    # signatures migrated to a database are packed with the database
+    if os.path.isfile('.sos/signatures.db'):
+        runtime_files.append('.sos/signatures.db')
     return script_files, set(tracked_files), set(runtime_files)
 
 def cmd_remove(args, unknown_args):
@@ -381,6 +426,9 @@ def cmd_remove(args, unknown_args):
     import shutil
     from collections import OrderedDict
     from .target import FileTarget
+    from .signatures import default_signature_store
+
+    env.sig_store = default_signature_store()
 
     sig_files = glob.glob('.sos/*.sig')
     if not sig_files:
@@ -542,6 +590,56 @@ def cmd_remove(args, unknown_args):
                     else:
                         os.unlink(target)
 
+#
+# command migrate
+#
+def get_migrate_parser():
+    parser = argparse.ArgumentParser('migrate',
+        description='''Migrate runtime signatures of the current project (and
+            signatures of files outside of the project, which are saved under
+            ~/.sos) from one signature store to another, for example from one
+            file per signature to a SQLite database (.sos/signatures.db), which
+            will be used by subsequent runs of the project.''')
+    parser.add_argument('--from', dest='from_store', default='file',
+        help='''Signature store from which signatures are read, default to
+            'file'.''')
+    parser.add_argument('--to', dest='to_store', default='sqlite',
+        help='''Signature store to which signatures are written, default to
+            'sqlite'.''')
+    parser.add_argument('-r', '--remove', action='store_true',
+        help='''Remove signatures from the original signature store after
+            migration.''')
+    parser.add_argument('-v', '--verbosity', type=int, choices=range(5), default=2,
+        help='''Output error (0), warning (1), info (2), debug (3) and trace (4)
+            information to standard output (default to 2).'''),
+    parser.set_defaults(func=cmd_migrate)
+    return parser
+
+def cmd_migrate(args, unknown_args):
+    import glob
+    from .utils import env, get_traceback
+    from .signatures import migrate_signatures
+
+    env.verbosity = args.verbosity
+    if args.from_store == args.to_store:
+        sys.exit('Signatures cannot be migrated to the same signature store.')
+    try:
+        count = 0
+        # signatures of files under and outside of the current directory
+        for runtime_dir in ['.sos/.runtime', os.path.join(os.path.expanduser('~'), '.sos', '.runtime')]:
+            count += migrate_signatures(runtime_dir, args.from_store, args.to_store, args.remove)
+            if args.remove and args.from_store == 'sqlite':
+                # so that the database will not be used by default
+                for db in glob.glob(os.path.join(os.path.dirname(runtime_dir), 'signatures.db*')):
+                    os.remove(db)
+        env.logger.info('{} signature{} migrated from {} to {}.'.format(count,
+            's' if count != 1 else '', args.from_store, args.to_store))
+    except Exception as e:
+        if args.verbosity and args.verbosity > 2:
+            sys.stderr.write(get_traceback())
+        env.logger.error(e)
+        sys.exit(1)
+
 #
 # subcommand config
 #
@@ -940,7 +1038,7 @@ def get_unpack_parser():
 def cmd_unpack(args, unknown_args):
     import tarfile
     from .utils import env, ProgressBar, pretty_size, ProgressFileObj
-    from .target import fileMD5
+    from .target import fileDigest, digest_algorithm
     import fnmatch
     import time
 
@@ -1030,7 +1128,7 @@ def cmd_unpack(args, unknown_args):
                 # runtime file?
                 if os.path.isfile(dest_file):
                     # signature files should not have md5
-                    if fileMD5(dest_file) == md5[f.name]:
+                    if fileDigest(dest_file, digest_algorithm(md5[f.name])) == md5[f.name]:
                         if not f.name.startswith('.sos'):
                             env.logger.info('Ignore identical {}'.format(f.name))
                         continue
@@ -1113,6 +1211,9 @@ def main():
     # command config
     add_sub_parser(subparsers, get_config_parser())
     #
+    # command migrate
+    add_sub_parser(subparsers, get_migrate_parser())
+    #
     # command pack
     add_sub_parser(subparsers, get_pack_parser())
     #
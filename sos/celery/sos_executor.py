@@ -30,7 +30,7 @@ class Celery_Executor(MP_Executor):
         MP_Executor.__init__(self, workflow, args, config_file, nested=nested)
         env.__task_engine__ = 'Celery'
 
-    def step_executor(self, section, queue):
+    def step_executor(self, section, pipe):
         # pass celery_app if needed
-        return Celery_Step_Executor(section, queue)
+        return Celery_Step_Executor(section, pipe)
 
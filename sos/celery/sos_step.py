@@ -23,12 +23,14 @@
 import os
 import time
 
-from sos.utils import env
+from sos.utils import env, PickledVars
 from sos.sos_step import SP_Step_Executor, TaskParams
 
 class Celery_Step_Executor(SP_Step_Executor):
-    def __init__(self, step, queue):
-        SP_Step_Executor.__init__(self, step, queue)
+    def __init__(self, step, pipe):
+        SP_Step_Executor.__init__(self, step, pipe)
+        # pickled values of variables that are not changed across substeps
+        self._pickled_vars = {}
 
     def submit_task(self, signature):
         # if concurrent is set, create a pool object
@@ -39,10 +41,10 @@ class Celery_Step_Executor(SP_Step_Executor):
                 self.step.task,         # task
                 self.step.global_def,   # global process
                 self.step.global_sigil,
-                env.sos_dict.clone_selected_vars(env.sos_dict['__signature_vars__'] \
+                PickledVars(env.sos_dict.pickle_selected_vars(env.sos_dict['__signature_vars__'] \
                     | {'_input', '_output', '_depends', 'input', 'output',
                         'depends', '_index', '__args__', 'step_name', '_runtime',
-                        '__workflow_sig__'}),
+                        '__workflow_sig__', '__workflow_run__'}, self._pickled_vars)),
                 signature,
                 self.step.sigil
             ))
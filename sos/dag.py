@@ -20,16 +20,22 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
-import networkx as nx
+import os
+import re
+import json
+from array import array
 from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
 import copy
+import heapq
 import pickle
 import time
-import fasteners
 
 from .utils import env, ActivityNotifier, short_repr
 from .sos_eval import Undetermined
 from .target import FileTarget, sos_variable, textMD5
+from .signatures import signature_store
 
 
 #
@@ -92,9 +98,40 @@ from .target import FileTarget, sos_variable, textMD5
 #    c. Addition of node is currently not considered, but should
 #       be allowed.
 #
+def target_key(target):
+    '''Return a hashable and normalized key of a target so that different
+    names of the same file (e.g. a.txt and ./a.txt) refer to the same target.'''
+    if isinstance(target, str):
+        return os.path.abspath(os.path.expanduser(target))
+    elif isinstance(target, FileTarget):
+        return os.path.abspath(target.fullname())
+    else:
+        return target
+
+_DOT_ID = re.compile(r'^([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$')
+_DOT_KEYWORDS = {'node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'}
+
+def dot_id(name):
+    '''Return name as an ID in DOT format, quoted if necessary.'''
+    if _DOT_ID.match(name) and name.lower() not in _DOT_KEYWORDS:
+        return name
+    return '"{}"'.format(name.replace('"', '\\"'))
+
+@contextmanager
+def _output_file(filename):
+    '''Open filename for writing, or use it directly if it is a file object.'''
+    if hasattr(filename, 'write'):
+        yield filename
+    else:
+        with open(filename, 'w') as output:
+            yield output
+
 class SoS_Node(object):
+    __slots__ = ('_step_uuid', '_node_id', '_node_index', '_input_targets', '_depends_targets',
+        '_output_targets', '_context', '_status', '_node_uuid', '_signature')
+
     def __init__(self, step_uuid, node_name, node_index, input_targets=[], depends_targets=[],
-        output_targets=[], context={}):
+        output_targets=[], context={}, node_uuid=None):
         self._step_uuid = step_uuid
         self._node_id = node_name
         self._node_index = node_index
@@ -103,13 +140,19 @@ class SoS_Node(object):
         self._output_targets = Undetermined() if output_targets is None else copy.copy(output_targets)
         #env.logger.error('Note {}: Input: {} Depends: {} Output: {}'.format(self._node_id, self._input_targets,
         #      self._depends_targets,  self._output_targets))
-        self._context = copy.deepcopy(context)
+        # context is copied with pickle, which is much faster than deepcopy
+        self._context = pickle.loads(pickle.dumps(context, pickle.HIGHEST_PROTOCOL))
         self._status = None
-        # unique ID to avoid add duplicate nodes ...
-        self._node_uuid = textMD5(pickle.dumps((step_uuid, node_name, node_index,
-                input_targets, depends_targets, output_targets,
-                [(k, sorted(list(context[k])) if isinstance(context[k], set) else context[k])
-                    for k in sorted(context.keys())])))
+        # unique ID to avoid add duplicate nodes
+        self._node_uuid = node_uuid if node_uuid is not None else SoS_Node.make_uuid(step_uuid,
+            node_name, node_index, input_targets, depends_targets, output_targets)
+
+    @staticmethod
+    def make_uuid(step_uuid, node_name, node_index, input_targets, depends_targets, output_targets):
+        '''Return a digest of the step, index and normalized keys of targets of a node'''
+        return textMD5(repr((step_uuid, node_name, node_index) + tuple(
+            x if x is None or isinstance(x, Undetermined) else [target_key(y) for y in x]
+            for x in (input_targets, depends_targets, output_targets))))
 
     def __repr__(self):
         return self._node_id
@@ -118,47 +161,274 @@ class SoS_Node(object):
         print('{} ({}, {}): input {}, depends {}, output {}, context {}'.format(self._node_id, self._node_index, self._status, self._input_targets,
             self._depends_targets, self._output_targets, self._context))
 
-class SoS_DAG(nx.DiGraph):
+class SoS_DAG(object):
+    '''DAG of steps. Nodes are identified by integer IDs in the order they are
+    added. Successors and predecessors of nodes are saved in compressed sparse
+    row (CSR) arrays, namely targets[offsets[i]:offsets[i+1]] for node i, and
+    edges added after the last compaction of the arrays are kept in lists of
+    new successors and predecessors.'''
     def __init__(self):
-        nx.DiGraph.__init__(self)
+        # nodes, their IDs, and nodes indexed by their UUIDs for the detection
+        # of duplicate nodes and the lookup of nodes
+        self._nodes = []
+        self._ids = {}
+        self._nodes_by_uuid = {}
+        # edges in CSR arrays and new edges, by IDs of nodes
+        self._succ_offsets = array('l', [0])
+        self._succ_targets = array('l')
+        self._pred_offsets = array('l', [0])
+        self._pred_targets = array('l')
+        self._new_succ = {}
+        self._new_pred = {}
+        self._num_new_edges = 0
+        self._num_edges = 0
+        # sets of variables in contexts of nodes, which are shared by nodes
+        # because they are never modified
+        self._shared_vars = {}
+        # a topological order (positions of nodes), which is maintained
+        # incrementally for edges (pairs of IDs) added since the last check
+        # of circular dependencies, and the circular dependency (edges) found
+        self._topo_order = array('l')
+        self._new_edges = array('l')
+        self._cycle = None
         # all_dependent files includes input and depends files
         self._all_dependent_files = defaultdict(list)
         self._all_output_files = defaultdict(list)
+        # the same targets indexed by normalized keys so that nodes can be
+        # connected by hash lookup instead of comparing all pairs of targets
+        self._dependent_index = defaultdict(list)
+        self._output_index = defaultdict(list)
+        # targets changed and whether or not indexed (regular) steps have been
+        # added since the last build, so that build only handles new nodes
+        self._dirty_targets = set()
+        self._dirty_steps = False
+        # number of unfinished predecessors of each node and a priority queue
+        # of nodes that are ready to be executed. They are created by the first
+        # call to find_executable and are reset if the graph is changed.
+        self._unmet_deps = None
+        self._ready = []
+        self._priority = None
 
     def num_nodes(self):
-        return nx.number_of_nodes(self)
+        return len(self._nodes)
+
+    def number_of_nodes(self):
+        return len(self._nodes)
+
+    def number_of_edges(self):
+        return self._num_edges
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def edges(self):
+        return [(node, self._nodes[x]) for i, node in enumerate(self._nodes)
+            for x in self._successor_ids(i)]
+
+    def out_edges(self, node):
+        return [(node, self._nodes[x]) for x in self._successor_ids(self._ids[node])]
+
+    def successors(self, node):
+        return [self._nodes[x] for x in self._successor_ids(self._ids[node])]
+
+    def predecessors(self, node):
+        return [self._nodes[x] for x in self._predecessor_ids(self._ids[node])]
+
+    def has_edge(self, u, v):
+        return u in self._ids and v in self._ids and self._has_edge_ids(self._ids[u], self._ids[v])
+
+    def _row(self, offsets, targets, new, i):
+        row = targets[offsets[i]:offsets[i + 1]].tolist() if i + 1 < len(offsets) else []
+        if i in new:
+            row.extend(new[i])
+        return row
+
+    def _degree(self, offsets, new, i):
+        return (offsets[i + 1] - offsets[i] if i + 1 < len(offsets) else 0) + len(new.get(i, ()))
+
+    def _successor_ids(self, i):
+        return self._row(self._succ_offsets, self._succ_targets, self._new_succ, i)
+
+    def _predecessor_ids(self, i):
+        return self._row(self._pred_offsets, self._pred_targets, self._new_pred, i)
+
+    def _has_edge_ids(self, u, v):
+        # look for the edge in the shorter of successors of u and predecessors of v
+        if self._degree(self._succ_offsets, self._new_succ, u) <= self._degree(self._pred_offsets, self._new_pred, v):
+            return v in self._successor_ids(u)
+        else:
+            return u in self._predecessor_ids(v)
+
+    def _merge_rows(self, offsets, targets, new):
+        merged_offsets = array('l', [0])
+        merged_targets = array('l')
+        for i in range(len(self._nodes)):
+            if i + 1 < len(offsets):
+                merged_targets.extend(targets[offsets[i]:offsets[i + 1]])
+            if i in new:
+                merged_targets.extend(new[i])
+            merged_offsets.append(len(merged_targets))
+        return merged_offsets, merged_targets
+
+    def _compact(self):
+        '''Merge new edges into the CSR arrays'''
+        self._succ_offsets, self._succ_targets = self._merge_rows(self._succ_offsets,
+            self._succ_targets, self._new_succ)
+        self._pred_offsets, self._pred_targets = self._merge_rows(self._pred_offsets,
+            self._pred_targets, self._new_pred)
+        self._new_succ = {}
+        self._new_pred = {}
+        self._num_new_edges = 0
 
     def add_step(self, step_uuid, node_name, node_index, input_targets, depends_targets,
         output_targets, context={}):
-        node = SoS_Node(step_uuid, node_name, node_index, input_targets, depends_targets, output_targets, context)
-        if node._node_uuid in [x._node_uuid for x in self.nodes()]:
+        node_uuid = SoS_Node.make_uuid(step_uuid, node_name, node_index, input_targets,
+            depends_targets, output_targets)
+        if node_uuid in self._nodes_by_uuid:
             return
-        if not isinstance(input_targets, (type(None), Undetermined)):
-            for x in input_targets:
-                self._all_dependent_files[x].append(node)
-        if not isinstance(depends_targets, (type(None), Undetermined)):
-            for x in depends_targets:
-                self._all_dependent_files[x].append(node)
-        if not isinstance(output_targets, (type(None), Undetermined)):
-            for x in output_targets:
-                self._all_output_files[x].append(node)
-        for x in context['__changed_vars__']:
-            self._all_output_files[sos_variable(x)].append(node)
+        # context is copied only for nodes that are added
+        node = SoS_Node(step_uuid, node_name, node_index, input_targets, depends_targets,
+            output_targets, context, node_uuid)
+        for key in ('__signature_vars__', '__environ_vars__', '__changed_vars__'):
+            if key in node._context:
+                node._context[key] = self._shared_vars.setdefault(frozenset(node._context[key]), node._context[key])
+        self._add_step_node(node)
+
+    def _add_step_node(self, node):
+        '''Add node and index its targets'''
+        if not isinstance(node._input_targets, Undetermined):
+            for x in node._input_targets:
+                self._add_dependent_target(x, node)
+        for x in node._depends_targets:
+            self._add_dependent_target(x, node)
+        if not isinstance(node._output_targets, Undetermined):
+            for x in node._output_targets:
+                self._add_output_target(x, node)
+        for x in node._context['__changed_vars__']:
+            self._add_output_target(sos_variable(x), node)
+        if node._node_index is not None:
+            self._dirty_steps = True
         self.add_node(node)
+        self._nodes_by_uuid[node._node_uuid] = node
+
+    def add_node(self, node):
+        if node not in self._ids:
+            self._ids[node] = len(self._nodes)
+            self._nodes.append(node)
+            self._topo_order.append(len(self._topo_order))
+            self._unmet_deps = None
+
+    def add_edge(self, u, v):
+        '''Add an edge, which is checked for circular dependency by the next
+        call to circular_dependencies'''
+        self.add_node(u)
+        self.add_node(v)
+        self._add_edge_ids(self._ids[u], self._ids[v])
+
+    def _add_edge_ids(self, u, v):
+        if self._has_edge_ids(u, v):
+            return
+        self._new_succ.setdefault(u, []).append(v)
+        self._new_pred.setdefault(v, []).append(u)
+        self._num_new_edges += 1
+        self._num_edges += 1
+        self._new_edges.append(u)
+        self._new_edges.append(v)
+        self._unmet_deps = None
+
+    def _add_dependent_target(self, target, node):
+        key = target_key(target)
+        self._all_dependent_files[target].append(node)
+        self._dependent_index[key].append(node)
+        self._dirty_targets.add(key)
+
+    def _add_output_target(self, target, node):
+        key = target_key(target)
+        self._all_output_files[target].append(node)
+        self._output_index[key].append(node)
+        self._dirty_targets.add(key)
+
+    def add_dependency(self, node, target):
+        '''Add target to the dependent targets of an existing node, which
+        happens when a step requests a target dynamically. The node will be
+        connected to the producer of the target by the next call to build.'''
+        node._depends_targets.append(target)
+        self._add_dependent_target(target, node)
+        self._unmet_deps = None
+
+    def set_priority(self, priority):
+        '''Set the priority of nodes that are ready to be executed. priority
+        can be None (execute nodes in the order they are added), a function that
+        returns a number for each node (nodes with higher numbers are executed
+        first), or 'critical_path', which gives higher priority to nodes with
+        longer chains of nodes depending on them.'''
+        if priority not in (None, 'critical_path') and not callable(priority):
+            raise ValueError('Unacceptable priority of DAG nodes: {}'.format(priority))
+        self._priority = priority
+        self._unmet_deps = None
+
+    def _critical_path_length(self):
+        length = array('l', [0]) * len(self._nodes)
+        if self.circular_dependencies():
+            # with circular dependency, which will be reported elsewhere
+            return length
+        for i in sorted(range(len(self._nodes)), key=self._topo_order.__getitem__, reverse=True):
+            length[i] = 1 + max([length[x] for x in self._successor_ids(i)], default=0)
+        return length
+
+    def _init_ready(self):
+        '''Count unfinished predecessors of all nodes and queue nodes
+        that are ready to be executed.'''
+        if self._priority == 'critical_path':
+            length = self._critical_path_length()
+            self._node_priority = lambda i: length[i]
+        elif self._priority is None:
+            self._node_priority = lambda i: 0
+        else:
+            priority = self._priority
+            self._node_priority = lambda i: priority(self._nodes[i])
+        self._unmet_deps = array('l', [0]) * len(self._nodes)
+        self._ready = []
+        for i, node in enumerate(self._nodes):
+            self._unmet_deps[i] = len([x for x in self._predecessor_ids(i) if self._nodes[x]._status != 'completed'])
+            if node._status is None and self._unmet_deps[i] == 0:
+                self._push_ready(i)
+
+    def _push_ready(self, i):
+        # nodes with the same priority are executed in the order they are added
+        heapq.heappush(self._ready, (-self._node_priority(i), i))
+
+    def set_status(self, node, status):
+        '''Set status of a node and update the queue of nodes that are
+        ready to be executed.'''
+        old_status = node._status
+        node._status = status
+        if self._unmet_deps is None or old_status == status:
+            return
+        i = self._ids[node]
+        if old_status == 'completed':
+            for succ in self._successor_ids(i):
+                self._unmet_deps[succ] += 1
+        elif status == 'completed':
+            for succ in self._successor_ids(i):
+                self._unmet_deps[succ] -= 1
+                if self._unmet_deps[succ] == 0 and self._nodes[succ]._status is None:
+                    self._push_ready(succ)
+        if status is None and self._unmet_deps[i] == 0:
+            self._push_ready(i)
 
     def find_executable(self):
         '''Find an executable node, which means nodes that has not been completed
         and has no input dependency.'''
-        for node in self.nodes():
-            # if it has not been executed
-            if node._status is None:
-                with_dependency = False
-                for edge in self.in_edges(node):
-                    if edge[0]._status != 'completed':
-                        with_dependency = True
-                        break
-                if not with_dependency:
-                    return node
+        if self._unmet_deps is None:
+            self._init_ready()
+        # entries of nodes that have been executed or that have been
+        # reset are outdated and are removed lazily
+        while self._ready:
+            i = self._ready[0][1]
+            if self._nodes[i]._status is None and self._unmet_deps[i] == 0:
+                return self._nodes[i]
+            heapq.heappop(self._ready)
         # if no node could be found, let use try pending ones
         pending_jobs = [x for x in self.nodes() if x._status == 'pending']
         if pending_jobs:
@@ -168,10 +438,10 @@ class SoS_DAG(nx.DiGraph):
                 while True:
                     for node in pending_jobs:
                         # if it has not been executed
-                        lock = fasteners.InterProcessLock(node._signature[1] + '_')
+                        lock = signature_store().lock(node._signature[1])
                         if lock.acquire(blocking=False):
                             lock.release()
-                            node._status = None
+                            self.set_status(node, None)
                             return node
                     time.sleep(0.1)
             except Exception as e:
@@ -181,9 +451,8 @@ class SoS_DAG(nx.DiGraph):
         return None
 
     def node_by_id(self, node_uuid):
-        for node in self.nodes():
-            if node._node_uuid == node_uuid:
-                return node
+        if node_uuid in self._nodes_by_uuid:
+            return self._nodes_by_uuid[node_uuid]
         raise RuntimeError('Failed to locate node with UUID {}'.format(node_uuid))
 
     def show_nodes(self):
@@ -193,59 +462,193 @@ class SoS_DAG(nx.DiGraph):
             print(edge)
 
     def circular_dependencies(self):
-        try:
-            return nx.find_cycle(self)
-        except Exception:
-            # if there is no cycle, an exception is given
-            return []
+        '''Return edges of a circular dependency, or an empty list if there is none.
+        The topological order of nodes is updated for each edge added since the
+        last call, which only visits nodes between the ends of the edge in the
+        order, or is recalculated if this visits more nodes than a full pass.'''
+        if self._cycle is None and self._new_edges:
+            budget = len(self._nodes)
+            for idx in range(0, len(self._new_edges), 2):
+                budget -= self._reorder(self._new_edges[idx], self._new_edges[idx + 1])
+                if self._cycle is not None:
+                    break
+                if budget < 0:
+                    self._sort_nodes()
+                    break
+            self._new_edges = array('l')
+        return [] if self._cycle is None else [(self._nodes[u], self._nodes[v]) for u, v in self._cycle]
+
+    def _reorder(self, u, v):
+        '''Update topological order after the addition of edge u -> v, or record
+        a circular dependency. Returns the number of visited nodes.'''
+        if u == v:
+            self._cycle = [(u, v)]
+            return 0
+        order = self._topo_order
+        lower, upper = order[v], order[u]
+        if lower > upper:
+            return 0
+        # nodes reachable from v that are not after u
+        forward = [v]
+        parent = {v: None}
+        for node in forward:
+            for succ in self._successor_ids(node):
+                if succ == u:
+                    # v -> ... -> node -> u -> v
+                    path = [node]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    path.reverse()
+                    self._cycle = [(u, v)] + list(zip(path, path[1:])) + [(node, u)]
+                    return len(forward)
+                if succ not in parent and order[succ] < upper:
+                    parent[succ] = node
+                    forward.append(succ)
+        # nodes that reach u and are not before v
+        backward = [u]
+        visited = {u}
+        for node in backward:
+            for pred in self._predecessor_ids(node):
+                if pred not in visited and order[pred] > lower:
+                    visited.add(pred)
+                    backward.append(pred)
+        # move nodes reaching u before nodes reachable from v, using their
+        # positions in the current order
+        backward.sort(key=order.__getitem__)
+        forward.sort(key=order.__getitem__)
+        positions = sorted(order[x] for x in backward + forward)
+        for node, pos in zip(backward + forward, positions):
+            order[node] = pos
+        return len(forward) + len(backward)
+
+    def _sort_nodes(self):
+        '''Recalculate topological order of all nodes, keeping the current
+        order of nodes that are not dependent on each other.'''
+        indegree = array('l', [self._degree(self._pred_offsets, self._new_pred, i) for i in range(len(self._nodes))])
+        ready = [(self._topo_order[i], i) for i in range(len(self._nodes)) if indegree[i] == 0]
+        heapq.heapify(ready)
+        order = array('l', [0]) * len(self._nodes)
+        count = 0
+        while ready:
+            i = heapq.heappop(ready)[1]
+            order[i] = count
+            count += 1
+            for succ in self._successor_ids(i):
+                indegree[succ] -= 1
+                if indegree[succ] == 0:
+                    heapq.heappush(ready, (self._topo_order[succ], succ))
+        if count == len(self._nodes):
+            self._topo_order = order
+            return
+        # each of the remaining nodes has a remaining predecessor, so walking
+        # through predecessors leads to a cycle
+        node = [i for i in range(len(self._nodes)) if indegree[i] > 0][0]
+        path = {}
+        while node not in path:
+            path[node] = len(path)
+            node = [x for x in self._predecessor_ids(node) if indegree[x] > 0][0]
+        cycle = list(path)[path[node]:][::-1]
+        self._cycle = list(zip(cycle, cycle[1:] + cycle[:1]))
 
     def steps_depending_on(self, target, workflow):
-        if target in self._all_dependent_files:
-            return ' requested by ' + ', '.join(set([workflow.section_by_id(x._step_uuid).step_name() for x in self._all_dependent_files[target]]))
+        key = target_key(target)
+        if key in self._dependent_index:
+            return ' requested by ' + ', '.join(set([workflow.section_by_id(x._step_uuid).step_name() for x in self._dependent_index[key]]))
         else:
             return ''
 
     def pending(self):
         return [x for x in self.nodes() if x._status == 'failed'], [x for x in self.nodes() if x._status is None]
 
-    def dangling(self, targets):
-        return [x for x in list(self._all_dependent_files.keys()) + ([] if targets is None else targets) \
-            if x not in self._all_output_files and not (FileTarget(x).exists() if isinstance(x, str) else x.exists())]
+    def dependent_targets(self):
+        return list(self._all_dependent_files.keys())
+
+    def num_dependent_targets(self):
+        return len(self._all_dependent_files)
+
+    def produces(self, target):
+        '''If target is the output of any step'''
+        return target_key(target) in self._output_index
+
+    def dangling(self, targets, start=0):
+        '''Return dependent targets (only those after the first start ones
+        if start is specified) and targets that are not produced by any step
+        and do not exist.'''
+        return [x for x in list(islice(self._all_dependent_files.keys(), start, None)) + ([] if targets is None else targets) \
+            if target_key(x) not in self._output_index and not (FileTarget(x).exists() if isinstance(x, str) else x.exists())]
 
     def regenerate_target(self, target):
-        if target in self._all_output_files:
-            for node in self._all_output_files[target]:
+        key = target_key(target)
+        if key in self._output_index:
+            for node in self._output_index[key]:
                 if node._status == 'completed':
                     env.logger.info('Re-running {} to generate {}'.format(node._node_id, target))
-                    node._status = None
+                    self.set_status(node, None)
         else:
             raise ValueError('Cannot regenerate {} because it is generated by any existing step.')
 
     def subgraph_from(self, targets):
-        '''Trim DAG to keep only nodes that produce targets'''
-        # first, find all nodes with targets
-        subnodes = []
-        for node in self.nodes():
-            if not isinstance(node._output_targets, Undetermined) and any(x in node._output_targets for x in targets):
-                subnodes.append(node)
+        '''Return a DAG with only nodes that produce targets and nodes they
+        depend on'''
+        # nodes that produce targets, and their ancestors by a single traversal
+        keep = set()
+        stack = []
+        for target in targets:
+            for node in self._output_index.get(target_key(target), []):
+                if self._ids[node] not in keep:
+                    keep.add(self._ids[node])
+                    stack.append(self._ids[node])
+        while stack:
+            for pred in self._predecessor_ids(stack.pop()):
+                if pred not in keep:
+                    keep.add(pred)
+                    stack.append(pred)
         #
-        ancestors = set()
-        for node in subnodes:
-            ancestors |= nx.ancestors(self, node)
-        return nx.subgraph(self, subnodes + list(ancestors))
+        dag = SoS_DAG()
+        dag._priority = self._priority
+        for i in sorted(keep):
+            dag._add_step_node(self._nodes[i])
+        for i in sorted(keep):
+            for succ in self._successor_ids(i):
+                if succ in keep:
+                    dag._add_edge_ids(dag._ids[self._nodes[i]], dag._ids[self._nodes[succ]])
+        dag._compact()
+        # existing edges between the nodes are copied
+        dag._dirty_targets.clear()
+        dag._dirty_steps = False
+        return dag
 
     def build(self, steps):
         '''Connect nodes according to status of targets'''
         # right now we do not worry about status of nodes
         # connecting the output to the input of other nodes
         #
-        # NOTE: This is implemented in the least efficient way just for
-        # testing. It has to be re-implemented.
-        #
-        # refer to http://stackoverflow.com/questions/33494376/networkx-add-edges-to-graph-from-node-attributes
+        # This function can be called repeatedly when new (auxiliary) nodes
+        # or dependent targets are added. Only targets that have been changed
+        # since the last call are processed, and dependencies between regular
+        # steps are only re-examined if new regular steps have been added.
         #
         # several cases triggers dependency.
-        indexed = [x for x in self.nodes() if x._node_index is not None]
+        if self._dirty_steps:
+            self._connect_steps()
+            self._dirty_steps = False
+        #
+        # 3. if the input of a step depends on the output of another step
+        for key in self._dirty_targets:
+            if key not in self._output_index or key not in self._dependent_index:
+                continue
+            for j in self._output_index[key]:
+                for i in self._dependent_index[key]:
+                    self._add_edge_ids(self._ids[j], self._ids[i])
+        self._dirty_targets.clear()
+        # merge new edges if there are many of them
+        if self._num_new_edges > max(1000, len(self._succ_targets) // 4):
+            self._compact()
+        self._unmet_deps = None
+
+    def _connect_steps(self):
+        '''Connect regular (indexed) steps according to their order and context'''
+        indexed = [x for x in self._nodes if x._node_index is not None]
         indexed.sort(key = lambda x: x._node_index)
 
         for idx, node in enumerate(indexed):
@@ -272,16 +675,77 @@ class SoS_DAG(nx.DiGraph):
                                 self.add_edge(prev_node, node)
                 else:
                     self.add_edge(indexed[idx-1], node)
-        #
-        # 3. if the input of a step depends on the output of another step
-        for target, in_node in self._all_dependent_files.items():
-            for out_node in [y for (x,y) in self._all_output_files.items() if x == target]:
-                for i in in_node:
-                    for j in out_node:
-                        self.add_edge(j, i)
 
-    def write_dot(self, filename):
+    def _export_nodes(self, collapse=False):
+        '''Return names and nodes of exported nodes, and an index from IDs of
+        nodes to exported nodes. Nodes of the same step (e.g. an auxiliary step
+        that produces many targets) are exported as one node if collapse is True.'''
+        if not collapse:
+            return [(x._node_id, [x]) for x in self._nodes], range(len(self._nodes))
+        exported = []
+        steps = {}
+        index = array('l', [0]) * len(self._nodes)
+        for i, node in enumerate(self._nodes):
+            if node._step_uuid not in steps:
+                steps[node._step_uuid] = len(exported)
+                exported.append((node._node_id, []))
+            index[i] = steps[node._step_uuid]
+            exported[index[i]][1].append(node)
+        # names of nodes of auxiliary steps are step names followed by targets
+        return [(name.split(' ', 1)[0] if len(nodes) > 1 else name, nodes) for name, nodes in exported], index
+
+    def _export_edges(self, index, collapse=False):
+        '''Yield edges between exported nodes'''
+        exported = set()
+        for i in range(len(self._nodes)):
+            for j in self._successor_ids(i):
+                if not collapse:
+                    yield i, j
+                elif index[i] != index[j] and (index[i], index[j]) not in exported:
+                    exported.add((index[i], index[j]))
+                    yield index[i], index[j]
+
+    def to_networkx(self, collapse=False):
+        '''Return the DAG as a networkx.DiGraph, with the same nodes (or names of
+        collapsed nodes if collapse is True) and edges, so that algorithms of
+        networkx can be applied to the DAG.'''
         try:
-            nx.drawing.nx_pydot.write_dot(self, filename)
-        except Exception as e:
-            env.logger.warning('Failed to call write_dot: {}'.format(e))
+            import networkx
+        except ImportError:
+            raise RuntimeError('Module networkx is required to convert DAG to networkx.DiGraph')
+        nodes, index = self._export_nodes(collapse)
+        keys = [name for name, members in nodes] if collapse else self._nodes
+        graph = networkx.DiGraph()
+        graph.add_nodes_from(keys)
+        graph.add_edges_from((keys[u], keys[v]) for u, v in self._export_edges(index, collapse))
+        return graph
+
+    def write_dot(self, filename, collapse=False):
+        '''Write DAG to filename (or a file object) in DOT format'''
+        nodes, index = self._export_nodes(collapse)
+        ids = [dot_id(name) for name, members in nodes]
+        with _output_file(filename) as dot:
+            dot.write('strict digraph "" {\n')
+            for node_id, (name, members) in zip(ids, nodes):
+                if len(members) > 1:
+                    dot.write('{} [label={}];\n'.format(node_id, dot_id('{} ({} nodes)'.format(name, len(members)))))
+                else:
+                    dot.write('{};\n'.format(node_id))
+            for u, v in self._export_edges(index, collapse):
+                dot.write('{} -> {};\n'.format(ids[u], ids[v]))
+            dot.write('}\n')
+
+    def write_json(self, filename, collapse=False):
+        '''Write DAG to filename (or a file object) in JSON format, with a list
+        of nodes and a list of edges (pairs of positions of nodes)'''
+        nodes, index = self._export_nodes(collapse)
+        with _output_file(filename) as js:
+            js.write('{"nodes": [')
+            for i, (name, members) in enumerate(nodes):
+                js.write('{}\n{}'.format(',' if i else '', json.dumps({'id': i, 'name': name,
+                    'step': str(members[0]._step_uuid), 'index': members[0]._node_index,
+                    'status': members[0]._status if len(members) == 1 else None, 'size': len(members)})))
+            js.write('],\n"edges": [')
+            for count, edge in enumerate(self._export_edges(index, collapse)):
+                js.write('{}\n[{}, {}]'.format(',' if count else '', edge[0], edge[1]))
+            js.write(']}\n')
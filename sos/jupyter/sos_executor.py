@@ -31,6 +31,7 @@ from sos.sos_script import SoS_Script
 from sos.sos_executor import Base_Executor, __null_func__
 from sos.sos_syntax import SOS_SECTION_HEADER
 from sos.target import FileTarget, UnknownTarget, RemovedTarget, UnavailableLock
+from sos.signatures import workflow_journal, signature_store_names
 from .sos_step import Interactive_Step_Executor
 
 class Interactive_Executor(Base_Executor):
@@ -75,6 +76,7 @@ class Interactive_Executor(Base_Executor):
                 raise RuntimeError('Failed to parse config file {}, is it in YAML/JSON format? ({})'.format(self.config_file, e))
         # set config to CONFIG
         env.sos_dict.set('CONFIG', frozendict(cfg))
+        self.set_signature_options(cfg)
         FileTarget('config.yaml').remove('both')
 
     def run(self, targets=None, mode='interactive'):
@@ -141,7 +143,7 @@ class Interactive_Executor(Base_Executor):
             # if the step has its own context
             env.sos_dict.quick_update(runnable._context)
             # execute section with specified input
-            runnable._status = 'running'
+            dag.set_status(runnable, 'running')
             try:
                 executor = Interactive_Step_Executor(section)
                 last_res = executor.run()
@@ -154,17 +156,15 @@ class Interactive_Executor(Base_Executor):
                         node._context.update(env.sos_dict.clone_selected_vars(
                             node._context['__signature_vars__'] | node._context['__environ_vars__'] \
                             | {'_input', '__step_output__', '__default_output__', '__args__'}))
-                runnable._status = 'completed'
+                dag.set_status(runnable, 'completed')
             except UnknownTarget as e:
-                runnable._status = None
+                dag.set_status(runnable, None)
                 target = e.target
                 if self.resolve_dangling_targets(dag, [target]) == 0:
                     raise RuntimeError('Failed to resolve {}{}.'
                         .format(target, dag.steps_depending_on(target, self.workflow)))
                 # now, there should be no dangling targets, let us connect nodes
-                # this can be done more efficiently
-                runnable._depends_targets.append(target)
-                dag._all_dependent_files[target].append(runnable)
+                dag.add_dependency(runnable, target)
                 #
                 dag.build(self.workflow.auxiliary_sections)
                 #dag.show_nodes()
@@ -172,17 +172,18 @@ class Interactive_Executor(Base_Executor):
                 if cycle:
                     raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
             except RemovedTarget as e:
-                runnable._status = None
+                dag.set_status(runnable, None)
                 dag.regenerate_target(e.target)
             except UnavailableLock as e:
-                runnable._status = 'pending'
+                dag.set_status(runnable, 'pending')
                 runnable._signature = (e.output, e.sig_file)
                 env.logger.info('Waiting on another process for step {}'.format(section.step_name()))
             # if the job is failed
             except Exception as e:
-                runnable._status = 'failed'
+                dag.set_status(runnable, 'failed')
                 raise
-
+        if '__workflow_sig__' in env.sos_dict:
+            workflow_journal.merge(env.sos_dict['__workflow_sig__'])
         return last_res
 
 #
@@ -221,9 +222,14 @@ def runfile(script=None, args='', wdir='.', code=None, **kwargs):
         parser.error = _parse_error
         args, workflow_args = parser.parse_known_args(args)
 
+    if args.__sig_store__ and args.__sig_store__ not in signature_store_names():
+        raise ValueError('Unrecognized signature store {}. Available stores are: {}'
+            .format(args.__sig_store__, ', '.join(signature_store_names())))
     env.max_jobs = args.__max_jobs__
     env.verbosity = args.verbosity
     env.__task_engine__ = 'interactive'
+    # if unspecified, set by configuration sig_store or default_signature_store()
+    env.sig_store = args.__sig_store__
 
     #
     if args.__rerun__:
@@ -274,5 +280,6 @@ def runfile(script=None, args='', wdir='.', code=None, **kwargs):
         raise
     finally:
         env.sig_mode = 'default'
+        env.sig_store = None
         env.verbosity = 1
 
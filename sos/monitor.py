@@ -23,9 +23,9 @@ import os
 import psutil
 import threading
 import time
-import fasteners
 from datetime import datetime
 from .utils import env
+from .signatures import workflow_journal
 
 class ProcessMonitor(threading.Thread):
     def __init__(self, pid, msg='', interval=1, sig=None):
@@ -105,12 +105,10 @@ def summarizeExecution(pid):
             if int(nch) > peak_nch:
                 peak_nch = int(nch)
     if start_time is not None and end_time is not None:
-        # successfully write signature, write in workflow runtime info
-        workflow_sig = env.sos_dict['__workflow_sig__']
-        with fasteners.InterProcessLock(workflow_sig + '_'):
-            with open(workflow_sig, 'a') as wf:
-                wf.write('EXE_RESOURCE\tsession={}\tnproc={}\tstart={}\tend={}\tcpu_peak={:.1f}\tcpu_avg={:.1f}\tmem_peak={:.1f}Mb\tmem_avg={:.1f}Mb\n'.format(
-                    sig, peak_nch, start_time, end_time,
-                    peak_cpu, accu_cpu/count, peak_mem/1024/1024, accu_mem/1024/1024/count))
+        # successfully write signature, buffer in workflow runtime info
+        workflow_journal.append(env.sos_dict['__workflow_sig__'],
+                'EXE_RESOURCE\tsession={}\tnproc={}\tstart={}\tend={}\tcpu_peak={:.1f}\tcpu_avg={:.1f}\tmem_peak={:.1f}Mb\tmem_avg={:.1f}Mb\n'.format(
+                sig, peak_nch, start_time, end_time,
+                peak_cpu, accu_cpu/count, peak_mem/1024/1024, accu_mem/1024/1024/count))
         
 
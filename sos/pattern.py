@@ -22,8 +22,12 @@
 import os
 import re
 import copy
+import glob
+import time
+import fnmatch
 import collections
 from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 from .utils import env
 from .sos_syntax import SOS_WILDCARD
 
@@ -62,70 +66,280 @@ def regex(filepattern):
     return "".join(f)
 
 
+# compiled patterns keyed by pattern, which are (dirname, names of wildcards,
+# compiled regex) for matching and lists of literal strings and wildcard
+# names for expansion. The caches are cleared when they are full, as with the
+# caches of compiled code of SoS_eval and SoS_exec.
+_compiled_patterns = {}
+_pattern_templates = {}
+MAX_CACHED_PATTERNS = 10000
+
+def compile_pattern(pattern):
+    '''Return the directory to search, names of wildcards and compiled regex of
+    a pattern, which are cached so that a pattern is compiled only once.'''
+    if pattern not in _compiled_patterns:
+        if len(_compiled_patterns) > MAX_CACHED_PATTERNS:
+            _compiled_patterns.clear()
+        normalized = os.path.normpath(pattern)
+        first_wildcard = re.search("{[^{]", normalized)
+        dirname = os.path.dirname(normalized[:first_wildcard.start(
+        )]) if first_wildcard else os.path.dirname(normalized)
+        if not dirname:
+            dirname = "."
+        names = [match.group('name')
+                 for match in SOS_WILDCARD.finditer(normalized)]
+        _compiled_patterns[pattern] = (dirname, names, re.compile(regex(normalized)))
+    return _compiled_patterns[pattern]
+
+#
+# Listings of directories that are scanned by glob_wildcards and glob_files.
+# If env.listing_cache is set, listings are saved and reused until the
+# modification time of the directories change.
+#
+class DirectoryListings:
+    '''Cache of directory listings, which are lists of (name, is_dir, is_link)
+    of entries in the order they are returned by os.scandir.'''
+    # directories modified within this number of seconds are not cached
+    # because changes within the resolution of mtime cannot be detected
+    RACY_WINDOW = 2
+
+    def __init__(self):
+        self._listings = {}
+
+    def clear(self):
+        self._listings.clear()
+
+    def _scan(self, dirname):
+        entries = []
+        try:
+            with os.scandir(dirname) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    try:
+                        is_link = entry.is_symlink()
+                    except OSError:
+                        is_link = False
+                    entries.append((entry.name, is_dir, is_link))
+        except OSError:
+            pass
+        return entries
+
+    def entries(self, dirname):
+        '''Return entries of dirname, or an empty list if it cannot be read'''
+        if not env.listing_cache:
+            return self._scan(dirname)
+        try:
+            mtime = os.stat(dirname).st_mtime_ns
+        except OSError:
+            return []
+        cached = self._listings.get(dirname)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        entries = self._scan(dirname)
+        if time.time() - mtime / 1e9 > self.RACY_WINDOW:
+            self._listings[dirname] = (mtime, entries)
+        return entries
+
+directory_listings = DirectoryListings()
+
+def _walk(dirname, prune=None, max_workers=8):
+    '''Yield paths of files and directories under dirname in the order of
+    os.walk, with listings of subdirectories read by worker threads. prune is
+    a function that is called with the path of a subdirectory and returns
+    True if the subdirectory should not be entered.'''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def walk(dirpath, listing):
+            entries = listing.result()
+            # os.walk yields files before directories
+            for name, is_dir, is_link in entries:
+                if not is_dir:
+                    yield os.path.join(dirpath, name) if dirpath != '.' else name
+            subdirs = []
+            for name, is_dir, is_link in entries:
+                if is_dir:
+                    yield os.path.join(dirpath, name) if dirpath != '.' else name
+                    # os.walk does not follow symbolic links to directories
+                    subdir = os.path.join(dirpath, name)
+                    if not is_link and (prune is None or not prune(subdir)):
+                        subdirs.append(subdir)
+            # read listings of all subdirectories before entering them
+            listings = [(x, executor.submit(directory_listings.entries, x)) for x in subdirs]
+            for subdir, sublisting in listings:
+                yield from walk(subdir, sublisting)
+
+        yield from walk(dirname, executor.submit(directory_listings.entries, dirname))
+
+def _slash_free(constraint):
+    '''Test if a constraint of wildcard cannot match a path separator. The
+    test is conservative so a constraint that is not understood is assumed
+    to match path separators.'''
+    if not constraint or os.sep != '/':
+        return False
+    # escapes of characters and classes that do not match /
+    constraint = re.sub(r'\\[wdsbB.\-_+*?(){}|^$]', '', constraint)
+    # character classes
+    for negated, body in re.findall(r'\[(\^?)((?:\\.|[^\]])*)\]', constraint):
+        if negated:
+            # a negated class should exclude /
+            if '/' not in body:
+                return False
+        elif '/' in body or '\\' in body or any(ord(x) <= ord('/') <= ord(y)
+                for x, y in re.findall(r'(.)-(.)', body)):
+            return False
+    rest = re.sub(r'\[\^?(?:\\.|[^\]])*\]', '', constraint)
+    # any character, / and other escapes (e.g. \S, \W, \x2f) can match /
+    return not re.search(r'\.|/|\\', rest)
+
+def _pruner(pattern):
+    '''Return a function that tests if a directory cannot contain paths
+    matching pattern, or None if directories cannot be pruned because some
+    wildcards of the pattern can match multiple levels of directories.'''
+    constraints = {}
+    for match in SOS_WILDCARD.finditer(pattern):
+        if match.group('name') not in constraints:
+            constraints[match.group('name')] = match.group('constraint')
+    if not all(_slash_free(x) for x in constraints.values()):
+        return None
+    # paths under dirname '.' are returned without the leading ./
+    segments = [re.compile(regex(x)) for x in pattern.split(os.sep)]
+    depth = len(segments)
+
+    def prune(path):
+        parts = path.split(os.sep)
+        # a match has exactly the same number of segments as the pattern
+        if len(parts) >= depth:
+            return True
+        return not all(segments[i].match(x) for i, x in enumerate(parts))
+    return prune
+
 def glob_wildcards(pattern, files=None):
     """
     Glob the values of the wildcards by matching the given pattern to the filesystem.
     Returns a named tuple with a list of values for each wildcard.
     """
-    pattern = os.path.normpath(pattern)
-    first_wildcard = re.search("{[^{]", pattern)
-    dirname = os.path.dirname(pattern[:first_wildcard.start(
-    )]) if first_wildcard else os.path.dirname(pattern)
-    if not dirname:
-        dirname = "."
-
-    names = [match.group('name')
-             for match in SOS_WILDCARD.finditer(pattern)]
+    dirname, names, regex = compile_pattern(pattern)
     res = {x: [] for x in names}
-    pattern = re.compile(regex(pattern))
 
     if files is None:
-        files = ((os.path.join(dirpath, f) if dirpath != "." else f)
-                 for dirpath, dirnames, filenames in os.walk(dirname)
-                 for f in chain(filenames, dirnames))
+        files = _walk(dirname, _pruner(os.path.normpath(pattern)))
 
     for f in files:
-        match = re.match(pattern, f)
+        match = regex.match(f)
         if match:
             for name, value in match.groupdict().items():
                 res[name].append(value)
     return res
 
+def _glob(pathname, dironly=False):
+    # adapted from glob._iglob of Python 3 without recursive patterns
+    dirname, basename = os.path.split(pathname)
+    if not glob.has_magic(pathname):
+        if basename:
+            if os.path.lexists(pathname):
+                yield pathname
+        elif os.path.isdir(dirname):
+            # patterns ending with a slash should match only directories
+            yield pathname
+        return
+    if dirname != pathname and glob.has_magic(dirname):
+        dirs = _glob(dirname, True)
+    else:
+        dirs = [dirname]
+    for dirname in dirs:
+        if glob.has_magic(basename):
+            names = [x[0] for x in directory_listings.entries(dirname or os.curdir)
+                     if not dironly or x[1]]
+            if basename[0] != '.':
+                names = [x for x in names if x[0] != '.']
+            matched = fnmatch.filter(names, basename)
+        elif basename:
+            matched = [basename] if os.path.lexists(os.path.join(dirname, basename)) else []
+        else:
+            matched = [basename] if os.path.isdir(dirname) else []
+        for name in matched:
+            yield os.path.join(dirname, name)
+
+# pathnames expanded by glob_files and their results, which are recorded
+# during the creation of a DAG so that a saved DAG can be validated
+_glob_records = None
+
+def record_globs(records):
+    '''Record pathnames and results of glob_files in dictionary records, or
+    stop recording if records is None.'''
+    global _glob_records
+    _glob_records = records
+
+def glob_files(pathname):
+    '''Return a list of paths matching pathname, which is the same as glob.glob
+    except that directory listings are cached if env.listing_cache is set.'''
+    if not env.listing_cache:
+        res = glob.glob(pathname)
+    else:
+        res = list(_glob(pathname))
+    if _glob_records is not None:
+        _glob_records[pathname] = sorted(res)
+    return res
+
+def _pattern_template(pattern):
+    '''Split pattern into literal strings and (wildcard name,) tuples'''
+    if pattern not in _pattern_templates:
+        if len(_pattern_templates) > MAX_CACHED_PATTERNS:
+            _pattern_templates.clear()
+        template = []
+        last = 0
+        for match in SOS_WILDCARD.finditer(pattern):
+            template.append(pattern[last:match.start()])
+            template.append((match.group('name'),))
+            last = match.end()
+        template.append(pattern[last:])
+        _pattern_templates[pattern] = template
+    return _pattern_templates[pattern]
+
 def apply_wildcards(pattern,
                     wildcards,
                     fill_missing=False,
                     fail_dynamic=False,
                     dynamic_fill=None,
                     keep_dynamic=False):
-    def format_match(match):
-        name = match.group("name")
+    res = []
+    for piece in _pattern_template(pattern):
+        if isinstance(piece, str):
+            res.append(piece)
+            continue
+        name = piece[0]
         try:
             value = wildcards[name]
             if fail_dynamic and value == dynamic_fill:
                 raise RuntimeError(name)
-            return str(value)  # convert anything into a str
+            res.append(str(value))  # convert anything into a str
         except KeyError as ex:
             if keep_dynamic:
-                return "{{{}}}".format(name)
+                res.append("{{{}}}".format(name))
             elif fill_missing:
-                return dynamic_fill
+                res.append(dynamic_fill)
             else:
                 raise RuntimeError('Wildcard apply error: {} ({})'.format(ex, wildcards))
-
-    return SOS_WILDCARD.sub(format_match, pattern)
+    return ''.join(res)
 
 def extract_pattern(pattern, ifiles):
     '''This function match pattern to a list of input files, extract and return
-    pieces of filenames as a list of variables with keys defined by pattern.'''
-    res = glob_wildcards(pattern, [])
+    pieces of filenames as a list of variables with keys defined by pattern.
+    Values of files that do not match the pattern are None.'''
+    dirname, names, regex = compile_pattern(pattern)
+    res = {x: [] for x in names}
+    columns = list(res.items())
+    match = regex.match
     for ifile in ifiles:
-        matched = glob_wildcards(pattern, [ifile])
-        for key in matched.keys():
-            if not matched[key]:
-                #env.logger.warning('Filename {} does not match pattern {}. None returned.'.format(ifile, pattern))
-                res[key].append(None)
-            else:
-                res[key].extend(matched[key])
+        matched = match(ifile)
+        if matched is None:
+            for key, values in columns:
+                values.append(None)
+        else:
+            for key, values in columns:
+                values.append(matched.group(key))
     return res
 
 def expand_pattern(pattern):
@@ -133,10 +347,8 @@ def expand_pattern(pattern):
     and return a list of filenames'''
     ofiles = []
     sz = None
-    res = glob_wildcards(pattern, [])
-    sz = None
     wildcard = [{}]
-    for key in res.keys():
+    for key in dict.fromkeys(compile_pattern(pattern)[1]):
         if key not in env.sos_dict:
             raise ValueError('Undefined variable {} in pattern {}'.format(key, pattern))
         if not isinstance(env.sos_dict[key], str) and isinstance(env.sos_dict[key], collections.Sequence):
@@ -54,6 +54,6 @@ class RQ_Executor(MP_Executor):
             redis_conn = Redis()
         self.redis_queue = rqQueue(connection=redis_conn)
 
-    def step_executor(self, section, queue):
-        return RQ_Step_Executor(section, queue, self.redis_queue)
+    def step_executor(self, section, pipe):
+        return RQ_Step_Executor(section, pipe, self.redis_queue)
 
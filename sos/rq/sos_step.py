@@ -22,15 +22,17 @@
 import os
 import time
 
-from sos.utils import env
+from sos.utils import env, PickledVars
 from sos.sos_step import SP_Step_Executor, TaskParams, execute_task
 
 class RQ_Step_Executor(SP_Step_Executor):
     #
     # This is not working yet
-    def __init__(self, step, queue, redis_queue):
-        SP_Step_Executor.__init__(self, step, queue)
+    def __init__(self, step, pipe, redis_queue):
+        SP_Step_Executor.__init__(self, step, pipe)
         self.redis_queue = redis_queue
+        # pickled values of variables that are not changed across substeps
+        self._pickled_vars = {}
 
     def submit_task(self, signature):
         if 'walltime' in env.sos_dict['_runtime']:
@@ -56,10 +58,10 @@ class RQ_Step_Executor(SP_Step_Executor):
                 self.step.global_sigil,
                 # if pool, it must not be in prepare mode and have
                 # __signature_vars__
-                env.sos_dict.clone_selected_vars(env.sos_dict['__signature_vars__'] \
+                PickledVars(env.sos_dict.pickle_selected_vars(env.sos_dict['__signature_vars__'] \
                     | {'_input', '_output', '_depends', 'input', 'output',
                         'depends', '_index', '__args__', 'step_name', '_runtime',
-                        '__workflow_sig__'}),
+                        '__workflow_sig__', '__workflow_run__'}, self._pickled_vars)),
                 signature,
                 self.step.sigil
             ))
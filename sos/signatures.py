@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+#
+# This file is part of Script of Scripts (SoS), a workflow system
+# for the execution of commands and scripts in different languages.
+# Please visit https://github.com/bpeng2000/SOS for more information.
+#
+# Copyright (C) 2016 Bo Peng (bpeng@mdanderson.org)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import glob
+import time
+import uuid
+import hashlib
+import sqlite3
+import fasteners
+try:
+    import fcntl
+except ImportError:
+    # locks of the sqlite store are saved to files under windows
+    fcntl = None
+import pkg_resources
+from collections import defaultdict
+from contextlib import contextmanager
+from .utils import env
+
+__all__ = []
+
+#
+# Runtime signatures (.file_info, .exe_info and .sig files under .sos/.runtime
+# and ~/.sos/.runtime) are identified by their paths and saved by a signature
+# store, which is selected by env.sig_store.
+#
+class FileSignatureStore:
+    '''Save each signature to a separate file under its path, which is the
+    default signature store.'''
+    def get(self, key):
+        '''Return content of signature, or None if it does not exist'''
+        try:
+            with open(key) as sig:
+                return sig.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, content):
+        with open(key, 'w') as sig:
+            sig.write(content)
+
+    def exists(self, key):
+        return os.path.isfile(key)
+
+    def remove(self, key):
+        if os.path.isfile(key):
+            os.remove(key)
+
+    def keys(self, runtime_dir):
+        '''Return all signatures under a runtime directory'''
+        return [x for x in glob.glob(os.path.join(runtime_dir, '*')) if
+            os.path.splitext(x)[1] in ('.file_info', '.exe_info', '.sig')]
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def lock(self, key):
+        '''Return an inter-process lock of signature key, which is a file next
+        to the signature.'''
+        return fasteners.InterProcessLock(key + '_')
+
+
+class _RangeLock:
+    '''An inter-process lock of one byte of a file (at an offset determined by
+    name of the lock), so that many locks can be held with a single file. Like
+    fasteners.InterProcessLock, locks are held by processes and are released
+    if the processes are killed.'''
+    # file descriptors of lock files opened by the current process
+    _files = {}
+
+    def __init__(self, path, name):
+        self.path = path
+        self.offset = int(hashlib.md5(name.encode()).hexdigest()[:12], 16)
+
+    def _fd(self):
+        pid, fd = self._files.get(self.path, (None, None))
+        # locks are not inherited by forked processes, and the lock file
+        # should be reopened if it has been removed (e.g. with .sos)
+        if pid != os.getpid() or not os.path.isfile(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            self._files[self.path] = (os.getpid(), fd)
+        return fd
+
+    def acquire(self, blocking=True):
+        try:
+            fcntl.lockf(self._fd(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB,
+                1, self.offset)
+        except OSError:
+            if blocking:
+                raise
+            return False
+        return True
+
+    def release(self):
+        fcntl.lockf(self._fd(), fcntl.LOCK_UN, 1, self.offset)
+
+
+class SQLiteSignatureStore:
+    '''Save signatures to a SQLite database (signatures.db) next to each
+    runtime directory. The database is opened in WAL mode so that readers
+    do not block writers, and signatures written within batch() are
+    written in a single transaction.'''
+    def __init__(self):
+        self._pid = None
+        self._conns = {}
+        self._batch = 0
+        self._dirty = set()
+
+    def _connect(self, key):
+        # connections cannot be shared by forked processes
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conns = {}
+            self._dirty = set()
+        db = self.db_file(os.path.dirname(key))
+        # reconnect if the database has been removed (e.g. with .sos)
+        if db not in self._conns or not os.path.isfile(db):
+            conn = sqlite3.connect(db, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS signatures (name TEXT PRIMARY KEY, content TEXT)')
+            self._conns[db] = conn
+        return self._conns[db]
+
+    def db_file(self, runtime_dir):
+        '''Database for signatures under runtime_dir (e.g. .sos/.runtime)'''
+        return os.path.abspath(os.path.join(os.path.dirname(
+            os.path.abspath(os.path.expanduser(runtime_dir))), 'signatures.db'))
+
+    def get(self, key):
+        res = self._connect(key).execute('SELECT content FROM signatures WHERE name=?',
+            (os.path.basename(key),)).fetchone()
+        return None if res is None else res[0]
+
+    def set(self, key, content):
+        conn = self._connect(key)
+        if self._batch and conn not in self._dirty:
+            conn.execute('BEGIN IMMEDIATE')
+            self._dirty.add(conn)
+        conn.execute('INSERT OR REPLACE INTO signatures VALUES (?, ?)',
+            (os.path.basename(key), content))
+
+    def exists(self, key):
+        return self._connect(key).execute('SELECT 1 FROM signatures WHERE name=?',
+            (os.path.basename(key),)).fetchone() is not None
+
+    def remove(self, key):
+        conn = self._connect(key)
+        if self._batch and conn not in self._dirty:
+            conn.execute('BEGIN IMMEDIATE')
+            self._dirty.add(conn)
+        conn.execute('DELETE FROM signatures WHERE name=?', (os.path.basename(key),))
+
+    def keys(self, runtime_dir):
+        if not os.path.isfile(self.db_file(runtime_dir)):
+            return []
+        return [os.path.join(runtime_dir, x[0]) for x in self._connect(
+            os.path.join(runtime_dir, 'signatures')).execute('SELECT name FROM signatures')]
+
+    @contextmanager
+    def batch(self):
+        self._batch += 1
+        try:
+            yield
+        except:
+            if self._batch == 1:
+                for conn in self._dirty:
+                    conn.execute('ROLLBACK')
+                self._dirty.clear()
+            raise
+        else:
+            if self._batch == 1:
+                for conn in self._dirty:
+                    conn.execute('COMMIT')
+                self._dirty.clear()
+        finally:
+            self._batch -= 1
+
+    def lock(self, key):
+        '''Return an inter-process lock of signature key, which locks a byte of
+        a single lock file next to the database instead of creating a lock file
+        for each signature.'''
+        if fcntl is None:
+            return fasteners.InterProcessLock(key + '_')
+        return _RangeLock(self.db_file(os.path.dirname(key)) + '.lock', os.path.basename(key))
+
+
+_signature_stores = {
+    'file': FileSignatureStore,
+    'sqlite': SQLiteSignatureStore,
+}
+
+_store_instances = {}
+
+def signature_store_names():
+    '''Names of built-in signature stores and stores registered by other
+    packages under entry point sos_signature_stores.'''
+    names = set(_signature_stores.keys())
+    names |= {x.name for x in pkg_resources.iter_entry_points(group='sos_signature_stores')}
+    return sorted(names)
+
+def default_signature_store():
+    '''Use the sqlite store for projects with migrated signatures.'''
+    return 'sqlite' if os.path.isfile(os.path.join('.sos', 'signatures.db')) else 'file'
+
+def signature_store(name=None):
+    '''Return signature store specified by name, default to env.sig_store
+    or default_signature_store() if env.sig_store is not set.'''
+    if name is None:
+        name = env.sig_store if env.sig_store is not None else default_signature_store()
+    if name not in _store_instances:
+        if name in _signature_stores:
+            _store_instances[name] = _signature_stores[name]()
+        else:
+            for entrypoint in pkg_resources.iter_entry_points(group='sos_signature_stores'):
+                if entrypoint.name == name:
+                    try:
+                        _store_instances[name] = entrypoint.load()()
+                        break
+                    except Exception as e:
+                        raise RuntimeError('Failed to load signature store {}: {}'.format(name, e))
+            else:
+                raise ValueError('Unrecognized signature store {}. Available stores are: {}'
+                    .format(name, ', '.join(signature_store_names())))
+    return _store_instances[name]
+
+def migrate_signatures(runtime_dir, from_store, to_store, remove=False):
+    '''Copy all signatures under runtime_dir from one signature store to
+    another and return the number of migrated signatures.'''
+    src = signature_store(from_store)
+    dest = signature_store(to_store)
+    keys = src.keys(runtime_dir)
+    with dest.batch():
+        for key in keys:
+            dest.set(key, src.get(key))
+    if remove:
+        with src.batch():
+            for key in keys:
+                src.remove(key)
+    return len(keys)
+
+
+#
+# Records of executed steps and tracked files are appended to workflow signature
+# files (.sos/*.sig). Instead of locking the workflow signature for each record,
+# processes buffer their records and write them as journal segments at the end
+# of each step, which are merged into workflow signatures by the master process.
+#
+class WorkflowSignatureJournal:
+    '''A per-process buffer of records to workflow signature files. Records
+    are written as journal segments named after the execution of the workflow
+    (__workflow_run__, which starts with the pid of the master process) so that
+    segments of other executions are not merged.'''
+    def __init__(self):
+        self._pid = os.getpid()
+        self._records = defaultdict(list)
+        # time spent on waiting for the lock of workflow signatures
+        self.lock_wait = 0
+
+    def _check_pid(self):
+        # forked processes do not write records of their parent process
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._records = defaultdict(list)
+            self.lock_wait = 0
+
+    def _run_id(self):
+        return env.sos_dict.get('__workflow_run__', 'default')
+
+    def append(self, workflow_sig, record):
+        '''Buffer record (one or more lines) to workflow signature'''
+        self._check_pid()
+        self._records[(workflow_sig, self._run_id())].append(record)
+
+    def flush(self):
+        '''Write buffered records as journal segments of workflow signatures,
+        which are renamed to their final (unique) names after they are written
+        so that incomplete segments are never merged.'''
+        self._check_pid()
+        for (workflow_sig, run_id), records in self._records.items():
+            if not records:
+                continue
+            segment = '{}.{}.{}.journal'.format(workflow_sig, run_id, uuid.uuid4().hex)
+            with open(segment + '.tmp', 'w') as journal:
+                journal.write(''.join(records))
+            os.rename(segment + '.tmp', segment)
+        self._records.clear()
+
+    def _remove_stale(self, segment, run_id):
+        '''Remove a segment of another execution if its master process has quit'''
+        import psutil
+        try:
+            if psutil.pid_exists(int(run_id.split('-', 1)[0])):
+                return
+        except ValueError:
+            return
+        try:
+            os.remove(segment)
+        except OSError:
+            pass
+
+    def merge(self, workflow_sig):
+        '''Append journal segments of workflow_sig written by the current
+        execution of the workflow to the workflow signature and remove them.
+        Segments left by executions that have quit are removed. Returns number
+        of merged segments.'''
+        self.flush()
+        run_id = self._run_id()
+        segments = []
+        for segment in sorted(glob.glob(workflow_sig + '.*.journal')):
+            segment_run = segment[len(workflow_sig) + 1:].split('.', 1)[0]
+            if segment_run != run_id:
+                self._remove_stale(segment, segment_run)
+                continue
+            # claim the segment so that it is not merged by another process
+            claimed = '{}.{}'.format(segment, os.getpid())
+            try:
+                os.rename(segment, claimed)
+            except OSError:
+                continue
+            segments.append(claimed)
+        if not segments:
+            return 0
+        content = []
+        for segment in segments:
+            with open(segment) as journal:
+                content.append(journal.read())
+        start = time.time()
+        with fasteners.InterProcessLock(workflow_sig + '_'):
+            self.lock_wait += time.time() - start
+            with open(workflow_sig, 'a') as wf:
+                wf.write(''.join(content))
+        for segment in segments:
+            os.remove(segment)
+        return len(segments)
+
+workflow_journal = WorkflowSignatureJournal()
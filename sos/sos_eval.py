@@ -77,6 +77,9 @@ class SoS_String:
         '${': re.compile(r'(?<!\\)\$\{')
         }
 
+    # parsed templates keyed by text and sigil
+    TEMPLATES = {}
+
     CONVERTERS = {
         'e': os.path.expanduser,
         'a': lambda x: os.path.abspath(os.path.expanduser(x)),
@@ -107,6 +110,98 @@ class SoS_String:
 
     def interpolate(self, text):
         '''Intepolate string with local and global dictionary'''
+        # 'in' test is 10 times faster than split so we do this test first.
+        # here we do not consider the case of \${
+        if self.l not in text:
+            return text
+        if hasattr(self, 'accessed_vars'):
+            return self._dynamic_interpolate(text)
+        key = (text, self.l, self.r)
+        if key not in self.TEMPLATES:
+            if len(self.TEMPLATES) > 10000:
+                self.TEMPLATES.clear()
+            self.TEMPLATES[key] = self._compile_template(text)
+        template = self.TEMPLATES[key]
+        if template is None:
+            return self._dynamic_interpolate(text)
+        res = list(template)
+        # as with direct_interpolate, variables (${var}) are interpolated before
+        # other expressions, and text with values that contain sigils has to be
+        # interpolated dynamically, which is decided before any expression
+        # (that might have side effects) is evaluated.
+        for idx, piece in enumerate(template):
+            if isinstance(piece, str) or not piece[4]:
+                continue
+            try:
+                value = self._repr(eval(piece[0], env.sos_dict._dict, self.local_dict))
+            except Exception:
+                return self._dynamic_interpolate(text)
+            if self.l in value:
+                return self._dynamic_interpolate(text)
+            res[idx] = value
+        for idx, piece in enumerate(template):
+            if isinstance(piece, str) or piece[4]:
+                continue
+            code, expr, fmt, conversion, _ = piece
+            try:
+                res[idx] = self._repr(eval(code, env.sos_dict._dict, self.local_dict), fmt, conversion)
+            except Exception as e:
+                raise InterpolationError(expr, e)
+        return ''.join(res)
+
+    def _compile_template(self, text):
+        '''Parse text into a list of literal strings and (code, expr, fmt,
+        conversion, is_var) of expressions, where is_var indicates variables
+        that are substituted by direct_interpolate, or return None if the text
+        has escaped or nested sigils, or ambiguous expressions that have to be
+        interpolated dynamically.'''
+        if '\\' + self.l in text:
+            return None
+        template = []
+        error_count = 0
+        while True:
+            mo = self.left_pattern.search(text)
+            if mo is None:
+                if text:
+                    template.append(text)
+                return template
+            if mo.start():
+                template.append(text[:mo.start()])
+            text = text[mo.end():]
+            if self.r not in text:
+                return None
+            i = text.index(self.r)
+            if i == 0:
+                # empty expression
+                text = text[len(self.r):]
+                continue
+            k = text.index(self.l) if self.l in text else len(text) + 100
+            if k < i:
+                return None
+            # try expressions ending at each ending sigil before the next left sigil
+            j = i
+            while True:
+                mo = FORMAT_SPECIFIER.match(text[:j])
+                if mo:
+                    expr, fmt, conversion = mo.group('expr', 'format_spec', 'conversion')
+                else:
+                    expr, fmt, conversion = text[:j], None, None
+                try:
+                    code = compile(expr, '<string>', 'eval')
+                    break
+                except Exception:
+                    error_count += 1
+                    if error_count > 10 or self.r not in text[j+1:]:
+                        return None
+                    j = text.index(self.r, j+1)
+                    if j > k:
+                        return None
+            template.append((code, expr, fmt, conversion, self.default_sigil and
+                SIMPLE_SUB.fullmatch(self.l + text[:j] + self.r) is not None))
+            text = text[j+len(self.r):]
+
+    def _dynamic_interpolate(self, text):
+        '''Intepolate string by parsing and evaluating it from left to right'''
         #
         # We could potentially parse the text and find all interpolation text,
         # but we cannot really do it because of possible nested interpolation
@@ -162,7 +257,7 @@ class SoS_String:
         i = text.index(self.r)
         if i == 0:
             # if no expression is found
-            return self.interpolate(text[len(self.r):])
+            return self._dynamic_interpolate(text[len(self.r):])
         #
         # substr contains ${
         if self.l in text[start_nested:]:
@@ -222,10 +317,10 @@ class SoS_String:
                     try:
                         if hasattr(self, 'accessed_vars'):
                             self.accessed_vars |= accessed_vars(expr, self.l + ' ' + self.r)
-                            return self.interpolate(text[j+len(self.r):])
+                            return self._dynamic_interpolate(text[j+len(self.r):])
                         else:
                             result = eval(expr, env.sos_dict._dict, self.local_dict)
-                            return self._repr(result, fmt, conversion) + self.interpolate(text[j+len(self.r):])
+                            return self._repr(result, fmt, conversion) + self._dynamic_interpolate(text[j+len(self.r):])
                     except Exception as e:
                         raise InterpolationError(expr, e)
                     # evaluate the expression and interpolate the next expression
@@ -235,7 +330,7 @@ class SoS_String:
                         raise
                     if self.r not in text[j+1:]:
                         if hasattr(self, 'accessed_vars'):
-                            return self.interpolate(text[len(self.r):])
+                            return self._dynamic_interpolate(text[len(self.r):])
                         else:
                             raise InterpolationError(text[:j], e)
                     j = text.index(self.r, j+1)
@@ -373,11 +468,22 @@ def accessed_vars(statement, sigil):
         prev_tok = tokval
     return result
 
+# compiled code of expressions and statements, keyed by text, sigil and
+# interpolate_single_quote, which determine how strings are converted. The
+# caches are cleared when they are full, as with templates of SoS_String.
+SoS_eval_cache = {}
+SoS_exec_cache = {}
+MAX_CACHED_CODE = 10000
+
 def SoS_eval(expr, sigil):
     '''Evaluate an expression after modifying (convert ' ' string to raw string,
     interpolate expressions) strings.'''
-    expr = ConvertString(expr, sigil)
-    return eval(expr, env.sos_dict._dict)
+    key = (expr, sigil, interpolate_single_quote)
+    if key not in SoS_eval_cache:
+        if len(SoS_eval_cache) > MAX_CACHED_CODE:
+            SoS_eval_cache.clear()
+        SoS_eval_cache[key] = compile(ConvertString(expr, sigil), '<string>', 'eval')
+    return eval(SoS_eval_cache[key], env.sos_dict._dict)
 
 def _is_expr(expr):
     try:
@@ -386,9 +492,8 @@ def _is_expr(expr):
     except:
         return False
 
-def SoS_exec(stmts, sigil, _dict=None):
-    '''Execute a statement after modifying (convert ' ' string to raw string,
-    interpolate expressions) strings.'''
+def _group_statements(stmts):
+    '''Split statements into groups of syntactically complete statements'''
     # the trouble here is that we have to execute the statements line by line
     # because the variables defined. The trouble is in cases such as class
     # definition
@@ -406,8 +511,6 @@ def SoS_exec(stmts, sigil, _dict=None):
     # we then try to find syntaxly valid groups
     code_group = [x for x in stmts.split('\n')]
     idx = 0
-    if _dict is None:
-        _dict = env.sos_dict._dict
     while True:
         try:
             # test current group
@@ -431,15 +534,42 @@ def SoS_exec(stmts, sigil, _dict=None):
                 idx -= 1
                 code_group[idx] += '\n' + code_group[idx + 1]
                 code_group.pop(idx+1)
+    return [x for x in code_group if x.strip()]
+
+def _compile_statements(stmts, sigil):
+    '''Group and convert statements and compile them into a list of
+    (code, converted statements, compiled code, is_expr). The last group is
+    compiled in eval mode if it is an expression so that its value can be
+    returned. Groups that fail to compile are left to exec so that
+    errors are raised after previous groups are executed.'''
+    code_group = _group_statements(stmts)
+    res = []
+    for idx, code in enumerate(code_group):
+        converted = ConvertString(code, sigil)
+        if not converted.strip():
+            continue
+        is_expr = idx + 1 == len(code_group) and _is_expr(converted)
+        try:
+            compiled = compile(converted, '<string>', 'eval' if is_expr else 'exec')
+        except Exception:
+            compiled = None
+        res.append((code, converted, compiled, is_expr))
+    return res
+
+def SoS_exec(stmts, sigil, _dict=None):
+    '''Execute a statement after modifying (convert ' ' string to raw string,
+    interpolate expressions) strings.'''
+    key = (stmts, sigil, interpolate_single_quote)
+    if key not in SoS_exec_cache:
+        if len(SoS_exec_cache) > MAX_CACHED_CODE:
+            SoS_exec_cache.clear()
+        SoS_exec_cache[key] = _compile_statements(stmts, sigil)
+    if _dict is None:
+        _dict = env.sos_dict._dict
     #
     # execute statements one by one
     res = None
-    executed = ''
-    code_group = [x for x in code_group if x.strip()]
-    for idx,code in enumerate(code_group):
-        stmts = ConvertString(code, sigil)
-        if not stmts.strip():
-            continue
+    for code, stmts, compiled, is_expr in SoS_exec_cache[key]:
         if env.run_mode == 'prepare':
             env.logger.trace('Preparing statement:\n{}'.format(stmts))
         #else:
@@ -450,13 +580,12 @@ def SoS_exec(stmts, sigil, _dict=None):
                 act = DelayedAction(env.logger.info, 'Running {}'.format(short_repr(code)))
             else:
                 act = None
-            if idx + 1 == len(code_group) and _is_expr(stmts):
-                res = eval(stmts, _dict)
+            if is_expr:
+                res = eval(stmts if compiled is None else compiled, _dict)
             else:
-                exec(stmts, _dict)
+                exec(stmts if compiled is None else compiled, _dict)
         finally:
             del act
-        executed += stmts + '\n'
         # check if the statement has altered any readonly variables
         env.sos_dict.check_readonly_vars()
     return res
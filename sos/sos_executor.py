@@ -23,21 +23,27 @@ import os
 import sys
 import yaml
 import time
+import pickle
 import keyword
+import uuid
+from collections import defaultdict
 from collections.abc import Sequence
 import multiprocessing as mp
-from queue import Empty
+from multiprocessing.connection import wait
 
 from io import StringIO
 from ._version import __version__
 from .sos_step import Dryrun_Step_Executor, SP_Step_Executor, MP_Step_Executor, \
-    analyze_section
-from .utils import env, Error, WorkflowDict, get_traceback, ProgressBar, frozendict, dict_merge, short_repr
+    Task_Pool, analyze_section, execute_global_def
+from .utils import env, Error, WorkflowDict, get_traceback, ProgressBar, frozendict, dict_merge, short_repr, \
+    SharedValue
 from .sos_eval import SoS_exec
-from .sos_syntax import SOS_KEYWORDS
-from .dag import SoS_DAG
-from .target import BaseTarget, FileTarget, UnknownTarget, RemovedTarget, UnavailableLock, sos_variable, textMD5
-from .pattern import extract_pattern
+from .sos_syntax import SOS_KEYWORDS, SOS_WILDCARD
+from .dag import SoS_DAG, target_key
+from .target import BaseTarget, FileTarget, stat_cache, clear_file_paths, UnknownTarget, RemovedTarget, UnavailableLock, sos_variable, textMD5, \
+    hash_algorithms
+from .pattern import extract_pattern, compile_pattern, directory_listings, glob_files, record_globs
+from .signatures import workflow_journal, signature_store_names
 
 __all__ = []
 
@@ -68,6 +74,69 @@ class ExecuteError(Error):
         else:
             self.message += '\n[%s]:\n\t%s' % (short_line, error)
 
+class ProvidesIndex:
+    '''Index of targets provided by auxiliary steps so that steps that might
+    provide a target are found with a few lookups. Names of files are indexed
+    by their normalized paths, patterns are indexed by the literal suffixes
+    after their last wildcards, and other targets are compared one by one.'''
+    def __init__(self, sections):
+        self._sections = sections
+        # normalized name -> [(section index, pattern index, pattern)]
+        self._names = defaultdict(list)
+        # suffix -> [(section index, pattern index, pattern)]
+        self._suffixes = defaultdict(list)
+        self._objects = []
+        for sidx, section in enumerate(sections):
+            patterns = section.options['provides']
+            if isinstance(patterns, (str, BaseTarget)):
+                patterns = [patterns]
+            elif not isinstance(patterns, Sequence):
+                raise RuntimeError('Unknown target to match: {}'.format(patterns))
+            for pidx, p in enumerate(patterns):
+                if isinstance(p, BaseTarget):
+                    self._objects.append((sidx, pidx, p))
+                    continue
+                # a pattern can also match a file with the same name
+                self._names[target_key(p)].append((sidx, pidx, p))
+                if compile_pattern(p)[1]:
+                    normalized = os.path.normpath(p)
+                    last = list(SOS_WILDCARD.finditer(normalized))[-1]
+                    self._suffixes[normalized[last.end():]].append((sidx, pidx, p))
+        self._suffix_lengths = sorted(set(len(x) for x in self._suffixes))
+
+    def _candidates(self, target):
+        if isinstance(target, BaseTarget):
+            return self._objects
+        candidates = list(self._names.get(target_key(target), []))
+        for length in self._suffix_lengths:
+            if length > len(target):
+                break
+            suffix = target[len(target) - length:]
+            if suffix in self._suffixes:
+                candidates.extend(self._suffixes[suffix])
+        return candidates
+
+    def match(self, target):
+        '''Return a list of (section, result) for steps that provide target,
+        where result is the same as Base_Executor.match(target, provides)'''
+        matched = {}
+        # a pattern can be a candidate by both its name and its suffix
+        candidates = {(x[0], x[1]): x[2] for x in self._candidates(target)}
+        for (sidx, pidx), p in sorted(candidates.items(), key=lambda x: x[0]):
+            if sidx in matched:
+                continue
+            # other targets have to match exactly
+            if isinstance(target, BaseTarget) or isinstance(p, BaseTarget):
+                if target == p:
+                    matched[sidx] = {}
+                continue
+            res = extract_pattern(p, [target])
+            if res and not any(None in x for x in res.values()):
+                matched[sidx] = res
+            elif target_key(p) == target_key(target):
+                matched[sidx] = True
+        return [(self._sections[x], matched[x]) for x in sorted(matched)]
+
 def __null_func__(*args, **kwargs):
     '''This function will be passed to SoS's namespace and be executed
     to evaluate functions of input, output, and depends directives.'''
@@ -108,6 +177,26 @@ class Base_Executor:
             self.sig_content = sig.getvalue()
         return textMD5(self.sig_content)[:16]
 
+    def set_signature_options(self, cfg):
+        '''Set options of runtime signatures from configuration cfg'''
+        # policy of signature validation
+        if 'sig_check' in cfg:
+            if cfg['sig_check'] not in ('strict', 'fast'):
+                raise RuntimeError('Invalid value {} for configuration sig_check, which should be "strict" or "fast"'.format(cfg['sig_check']))
+            env.sig_check = cfg['sig_check']
+        # algorithm of file signatures
+        if 'sig_hash' in cfg:
+            if cfg['sig_hash'] not in hash_algorithms:
+                raise RuntimeError('Invalid value {} for configuration sig_hash, which should be one of {}'
+                    .format(cfg['sig_hash'], ', '.join(hash_algorithms)))
+            env.sig_hash = cfg['sig_hash']
+        # signature store, which is overridden by option -s
+        if 'sig_store' in cfg and env.sig_store is None:
+            if cfg['sig_store'] not in signature_store_names():
+                raise RuntimeError('Invalid value {} for configuration sig_store, which should be one of {}'
+                    .format(cfg['sig_store'], ', '.join(signature_store_names())))
+            env.sig_store = cfg['sig_store']
+
     def reset_dict(self):
         # if creating a new dictionary, set it up with some basic varibles
         # and functions
@@ -124,6 +213,9 @@ class Base_Executor:
 
         # inject a few things
         env.sos_dict.set('__workflow_sig__', os.path.join(env.exec_dir, '.sos', '{}.sig'.format(self.md5)))
+        # ID of this execution of the workflow, which identifies records of the
+        # workflow signature written by its steps and tasks
+        env.sos_dict.set('__workflow_run__', '{}-{}'.format(os.getpid(), uuid.uuid4().hex[:8]))
         env.sos_dict.set('__null_func__', __null_func__)
         env.sos_dict.set('__args__', self.args)
         env.sos_dict.set('__unknown_args__', self.args)
@@ -159,6 +251,16 @@ class Base_Executor:
                 raise RuntimeError('Failed to parse config file {}, is it in YAML/JSON format? ({})'.format(self.config_file, e))
         # set config to CONFIG
         env.sos_dict.set('CONFIG', frozendict(cfg))
+        self.set_signature_options(cfg)
+        # listings of directories are cached during each run
+        if 'listing_cache' in cfg:
+            env.listing_cache = bool(cfg['listing_cache'])
+        # DAGs are saved and reused by later executions of workflows
+        if 'dag_cache' in cfg:
+            env.dag_cache = bool(cfg['dag_cache'])
+        directory_listings.clear()
+        stat_cache.clear()
+        clear_file_paths()
 
         SoS_exec('import os, sys, glob', None)
         SoS_exec('from sos.runtime import *', None)
@@ -210,20 +312,24 @@ class Base_Executor:
         '''Feed dangling targets with their dependncies from auxiliary steps,
         optionally add other targets'''
         resolved = 0
+        provides = None
+        dangling_targets = dag.dangling(targets)
         while True:
-            dangling_targets = dag.dangling(targets)
             if not dangling_targets:
                 # if no dangling targets, means all objects COULD be produved by DAG
                 break
             env.logger.info('Resolving {} objects from {} nodes'.format(len(dangling_targets), dag.number_of_nodes()))
+            if provides is None:
+                provides = ProvidesIndex(self.workflow.auxiliary_sections)
+            # targets that are depended on by steps added in this round
+            num_dependent = dag.num_dependent_targets()
             # find matching steps
             # check auxiliary steps and see if any steps provides it
             for target in dangling_targets:
                 # target might no longer be dangling after a section is added.
-                if target not in dag.dangling(targets):
+                if dag.produces(target):
                     continue
-                mo = [(x, self.match(target, x.options['provides'])) for x in self.workflow.auxiliary_sections]
-                mo = [x for x in mo if x[1] is not False]
+                mo = provides.match(target)
                 if not mo:
                     for x in self.workflow.auxiliary_sections:
                         env.logger.debug('{}: {}'.format(x.step_name(), x.options['provides']))
@@ -267,15 +373,129 @@ class Base_Executor:
                 context['__changed_vars__'] = res['changed_vars']
                 context['__default_output__'] = env.sos_dict['__default_output__']
                 # NOTE: If a step is called multiple times with different targets, it is much better
-                # to use different names because pydotplus can be very slow in handling graphs with nodes
-                # with identical names.
+                # to use different names so that the nodes can be told apart (e.g. in DOT output).
                 dag.add_step(section.uuid, '{} {}'.format(section.step_name(),
                     short_repr(env.sos_dict['__default_output__'])), None, res['step_input'],
                     res['step_depends'], res['step_output'], context=context)
                 resolved += 1
+            # other dangling targets have been resolved so only targets of
+            # added steps need to be checked
+            dangling_targets = dag.dangling(None, num_dependent)
         return resolved
 
 
+    def add_shared_provides(self, section, changed_vars):
+        '''Add variables shared by a section to its provides option'''
+        if 'provides' in section.options:
+            if isinstance(section.options['provides'], str):
+                section.options.set('provides', [section.options['provides']])
+        else:
+            section.options.set('provides', [])
+        #
+        section.options.set('provides',
+            section.options['provides'] + [sos_variable(var) for var in changed_vars])
+
+    def _dag_file(self):
+        # DAG is saved by workflow instead of its signature (self.md5) so that
+        # analysis of unchanged sections can be reused after the workflow is changed
+        return os.path.join(env.exec_dir, '.sos', '{}.dag'.format(textMD5(repr((
+            self.workflow.content.filename, self.workflow.name, self.args)))[:16]))
+
+    def _analysis_signature(self):
+        '''Signature of things other than sections that determine the analysis
+        of sections'''
+        return textMD5(repr((__version__, os.getcwd(), env.run_mode, env.sos_dict['CONFIG'])))
+
+    def _dag_signature(self, targets):
+        '''Signature of things other than the status of targets that determine
+        the DAG of the workflow'''
+        return textMD5(repr((self._analysis_signature(), self.md5, targets)))
+
+    def _section_signature(self, section, default_input):
+        '''Signature of things that determine the analysis of a section'''
+        return textMD5(repr((section.step_name(), section.global_def, section.global_sigil, section.sigil,
+            section.statements, section.task, section.options, default_input,
+            env.sos_dict.get('__default_output__') if 'provides' in section.options else None,
+            sorted(env.parameter_vars))))
+
+    def _target_status(self, dag, targets):
+        '''Existence of targets that are not produced by the DAG, which
+        determines if auxiliary steps are needed'''
+        return [(x, FileTarget(x).exists() if isinstance(x, str) else x.exists())
+            for x in dag.dependent_targets() + (targets if targets else []) if not dag.produces(x)]
+
+    def _load_saved_dag(self):
+        '''Load DAG and analysis of sections saved by a previous execution of
+        the workflow, if configuration dag_cache is set.'''
+        if not env.dag_cache or self.md5 is None or self.nested:
+            return None
+        try:
+            with open(self._dag_file(), 'rb') as cache:
+                return pickle.load(cache)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            env.logger.debug('Failed to load DAG from {}: {}'.format(self._dag_file(), e))
+            return None
+
+    def _restore_analysis(self, sections):
+        '''Restore side effects of the analysis of sections (execution of
+        their global definitions) if their saved analysis is reused'''
+        executed = set()
+        for section in sections:
+            if (section.global_def, section.global_sigil) not in executed:
+                execute_global_def(section)
+                executed.add((section.global_def, section.global_sigil))
+
+    def load_dag(self, targets=None, saved=None):
+        '''Load DAG saved by a previous execution of the same workflow, if
+        configuration dag_cache is set and the saved DAG is still valid.'''
+        if saved is None:
+            saved = self._load_saved_dag()
+        if saved is None:
+            return None
+        sections = self.workflow.sections + self.workflow.auxiliary_sections
+        if saved['signature'] != self._dag_signature(targets) or len(saved['uuids']) != len(sections):
+            return None
+        for pathname, files in saved['globs'].items():
+            if sorted(glob_files(pathname)) != files:
+                env.logger.debug('Saved DAG is outdated because files matching {} are changed'.format(pathname))
+                return None
+        for target, status in saved['targets']:
+            if (FileTarget(target).exists() if isinstance(target, str) else target.exists()) != status:
+                env.logger.debug('Saved DAG is outdated because status of {} is changed'.format(target))
+                return None
+        # nodes of the saved DAG refer to sections by their UUIDs
+        for section, uuid in zip(sections, saved['uuids']):
+            section.uuid = uuid
+            if uuid in saved['shared']:
+                self.add_shared_provides(section, saved['shared'][uuid])
+        # restore side effects of the creation of the DAG, including parameters
+        # (env.parameter_vars) handled by the execution of global definitions
+        for section in self.workflow.sections:
+            self.skip(section)
+        self._restore_analysis(self.workflow.auxiliary_sections)
+        env.logger.debug('DAG of workflow {} is loaded from {}'.format(self.workflow.name, self._dag_file()))
+        return saved['dag']
+
+    def save_dag(self, dag, targets, globs, shared, analysis):
+        '''Save DAG so that it can be loaded by the next execution of the workflow'''
+        sections = self.workflow.sections + self.workflow.auxiliary_sections
+        try:
+            with open(self._dag_file() + '.tmp', 'wb') as cache:
+                pickle.dump({
+                    'signature': self._dag_signature(targets),
+                    'context': self._analysis_signature(),
+                    'uuids': [x.uuid for x in sections],
+                    'shared': shared,
+                    'globs': globs,
+                    'targets': self._target_status(dag, targets),
+                    'analysis': analysis,
+                    'dag': dag}, cache, pickle.HIGHEST_PROTOCOL)
+            os.replace(self._dag_file() + '.tmp', self._dag_file())
+        except Exception as e:
+            env.logger.debug('Failed to save DAG to {}: {}'.format(self._dag_file(), e))
+
     def initialize_dag(self, targets=None):
         '''Create a DAG by analyzing sections statically.'''
         # this is for testing only and allows tester to call initialize_dag
@@ -283,13 +503,90 @@ class Base_Executor:
         if not hasattr(self, '_base_symbols'):
             self.reset_dict()
 
+        # status of files is cached during the creation of DAG if the DAG is
+        # not created during the execution of a workflow
+        cached = not stat_cache.active
+        if cached:
+            stat_cache.start()
+        try:
+            saved = self._load_saved_dag()
+            dag = self.load_dag(targets, saved)
+            if dag is None:
+                dag = self.create_dag(targets, saved)
+        finally:
+            if cached:
+                stat_cache.stop()
+        # trim the DAG if targets are specified
+        if targets:
+            dag = dag.subgraph_from(targets)
+        # write DAG for debugging purposes
+        #dag.write_dot(os.path.join(env.exec_dir, '.sos', '{}.dot'.format(self.workflow.name)))
+        # check error
+        cycle = dag.circular_dependencies()
+        if cycle:
+            raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
+
+        return dag
+
+    def create_dag(self, targets=None, saved=None):
+        '''Create a DAG by analyzing sections and resolving dangling targets.
+        Saved analysis of sections are reused if the sections are unchanged.'''
+        cached = env.dag_cache and self.md5 is not None and not self.nested
+        # pathnames expanded during the creation of the DAG
+        globs = {}
+        # variables shared by sections, which are added to their provides
+        shared = {}
+        # analysis of sections, saved and reused by their signatures
+        analysis = {} if cached else None
+        if saved is None or saved.get('context') != self._analysis_signature():
+            saved = {}
+        else:
+            saved = saved['analysis']
+        if cached:
+            record_globs(globs)
+        try:
+            dag = self._create_dag(targets, shared, globs, saved, analysis)
+        finally:
+            record_globs(None)
+        if cached:
+            self.save_dag(dag, targets, globs, shared, analysis)
+        return dag
+
+    def _analyze_section(self, section, default_input, globs, saved, analysis):
+        '''Analyze section, or reuse its saved analysis if the section, its
+        input, and files it globbed are unchanged'''
+        if analysis is None:
+            return analyze_section(section, default_input)
+        sig = self._section_signature(section, default_input)
+        record = saved.get(sig)
+        if record is not None:
+            record_globs(None)
+            if any(sorted(glob_files(pathname)) != files for pathname, files in record['globs'].items()):
+                record = None
+            else:
+                env.logger.debug('Reuse analysis of section {}'.format(section.step_name()))
+                self._restore_analysis([section])
+        if record is None:
+            section_globs = {}
+            record_globs(section_globs)
+            try:
+                res = analyze_section(section, default_input)
+            finally:
+                record_globs(None)
+            record = {'result': res, 'globs': section_globs}
+        globs.update(record['globs'])
+        record_globs(globs)
+        analysis[sig] = record
+        return record['result']
+
+    def _create_dag(self, targets, shared, globs, saved, analysis):
         dag = SoS_DAG()
         default_input = []
         for idx, section in enumerate(self.workflow.sections):
             if self.skip(section):
                 continue
             #
-            res = analyze_section(section, default_input)
+            res = self._analyze_section(section, default_input, globs, saved, analysis)
 
             environ_vars = res['environ_vars'] - self._base_symbols
             signature_vars = res['signature_vars'] - self._base_symbols
@@ -299,14 +596,8 @@ class Base_Executor:
 
             # add shared to targets
             if res['changed_vars']:
-                if 'provides' in section.options:
-                    if isinstance(section.options['provides'], str):
-                        section.options.set('provides', [section.options['provides']])
-                else:
-                    section.options.set('provides', [])
-                #
-                section.options.set('provides',
-                    section.options['provides'] + [sos_variable(var) for var in changed_vars])
+                self.add_shared_provides(section, changed_vars)
+                shared[section.uuid] = changed_vars
 
             context={'__signature_vars__': signature_vars,
                     '__environ_vars__': environ_vars,
@@ -333,7 +624,7 @@ class Base_Executor:
         #
         # analyze auxiliary steps
         for idx, section in enumerate(self.workflow.auxiliary_sections):
-            res = analyze_section(section, default_input)
+            res = self._analyze_section(section, default_input, globs, saved, analysis)
             environ_vars = res['environ_vars'] - self._base_symbols
             signature_vars = res['signature_vars'] - self._base_symbols
             changed_vars = res['changed_vars']
@@ -342,29 +633,13 @@ class Base_Executor:
 
             # add shared to targets
             if res['changed_vars']:
-                if 'provides' in section.options:
-                    if isinstance(section.options['provides'], str):
-                        section.options.set('provides', [section.options['provides']])
-                else:
-                    section.options.set('provides', [])
-                #
-                section.options.set('provides',
-                    section.options['provides'] + [sos_variable(var) for var in changed_vars])
+                self.add_shared_provides(section, changed_vars)
+                shared[section.uuid] = changed_vars
         #
         self.resolve_dangling_targets(dag, targets)
         # now, there should be no dangling targets, let us connect nodes
         dag.build(self.workflow.auxiliary_sections)
         #dag.show_nodes()
-        # trim the DAG if targets are specified
-        if targets:
-            dag = dag.subgraph_from(targets)
-        # write DAG for debugging purposes
-        #dag.write_dot(os.path.join(env.exec_dir, '.sos', '{}.dot'.format(self.workflow.name)))
-        # check error
-        cycle = dag.circular_dependencies()
-        if cycle:
-            raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
-
         return dag
 
     def save_workflow_signature(self, dag):
@@ -384,217 +659,113 @@ class Base_Executor:
         # passing run_mode to SoS dict so that users can execute blocks of
         # python statements in different run modes.
         env.sos_dict.set('run_mode', env.run_mode)
-        # process step of the pipelinp
-        if isinstance(targets, str):
-            targets = [targets]
-        dag = self.initialize_dag(targets=targets)
-        #
-        # if targets are specified and there are only signatures for them, we need
-        # to remove the signature and really generate them
-        if targets:
-            for t in targets:
-                if not FileTarget(t).exists('target'):
-                    FileTarget(t).remove('signature')
-        #
-        prog = ProgressBar(self.workflow.name, dag.num_nodes(), disp=dag.num_nodes() > 1 and env.verbosity == 1)
-        self.reset_dict()
-        env.sos_dict.set('run_mode', env.run_mode)
-        exec_error = ExecuteError(self.workflow.name)
-        while True:
-            # find any step that can be executed and run it, and update the DAT
-            # with status.
-            runnable = dag.find_executable()
-            if runnable is None:
-                # no runnable
-                #dag.show_nodes()
-                break
-            # find the section from runnable
-            section = self.workflow.section_by_id(runnable._step_uuid)
+        # status of files is cached during the execution of the workflow
+        stat_cache.start()
+        try:
+            # process step of the pipelinp
+            if isinstance(targets, str):
+                targets = [targets]
+            dag = self.initialize_dag(targets=targets)
+            # files of values shared by steps
+            self._shared_files = set()
             #
-            # this is to keep compatibility of dag run with sequential run because
-            # in sequential run, we evaluate global section of each step in
-            # order to determine values of options such as skip.
-            # The consequence is that global definitions are available in
-            # SoS namespace.
-            try:
-                SoS_exec(section.global_def, section.global_sigil)
-            except Exception as e:
-                if env.verbosity > 2:
-                    sys.stderr.write(get_traceback())
-                raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
-                    section.global_def, e))
-
-            # clear existing keys, otherwise the results from some random result
-            # might mess with the execution of another step that does not define input
-            for k in ['__step_input__', '__default_output__', '__step_output__']:
-                if k in env.sos_dict:
-                    env.sos_dict.pop(k)
-            # if the step has its own context
-            env.sos_dict.quick_update(runnable._context)
-            # execute section with specified input
-            runnable._status = 'running'
-            q = mp.Queue()
-            if mode == 'run':
-                executor = SP_Step_Executor(section, q)
-            else:
-                executor = Dryrun_Step_Executor(section, q)
-            p = mp.Process(target=executor.run)
-            p.start()
+            # if targets are specified and there are only signatures for them, we need
+            # to remove the signature and really generate them
+            if targets:
+                for t in targets:
+                    if not FileTarget(t).exists('target'):
+                        FileTarget(t).remove('signature')
             #
-            res = q.get()
-            # if we does get the result
-            p.join()
-            # if the step says unknown target .... need to check if the target can
-            # be build dynamically.
-            if isinstance(res, UnknownTarget):
-                runnable._status = None
-                target = res.target
-                if self.resolve_dangling_targets(dag, [target]) == 0:
-                    raise RuntimeError('Failed to resolve {}{}.'
-                        .format(target, dag.steps_depending_on(target, self.workflow)))
-                # now, there should be no dangling targets, let us connect nodes
-                # this can be done more efficiently
-                runnable._depends_targets.append(target)
-                dag._all_dependent_files[target].append(runnable)
-                dag.build(self.workflow.auxiliary_sections)
-                #
-                cycle = dag.circular_dependencies()
-                if cycle:
-                    raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
-            elif isinstance(res, RemovedTarget):
-                runnable._status = None
-                dag.regenerate_target(res.target)
-            elif isinstance(res, UnavailableLock):
-                runnable._status = 'pending'
-                runnable._signature = (res.output, res.sig_file)
-                env.logger.info('Waiting on another process for step {}'.format(section.step_name()))
-            # if the job is failed
-            elif isinstance(res, Exception):
-                runnable._status = 'failed'
-                exec_error.append(runnable._node_id, res)
-                prog.progress(1)
-            else:#
-                for k, v in res.items():
-                    env.sos_dict.set(k, v)
+            prog = ProgressBar(self.workflow.name, dag.num_nodes(), disp=dag.num_nodes() > 1 and env.verbosity == 1)
+            self.reset_dict()
+            env.sos_dict.set('run_mode', env.run_mode)
+            exec_error = ExecuteError(self.workflow.name)
+            while True:
+                # find any step that can be executed and run it, and update the DAT
+                # with status.
+                runnable = dag.find_executable()
+                if runnable is None:
+                    # no runnable
+                    #dag.show_nodes()
+                    break
+                # find the section from runnable
+                section = self.workflow.section_by_id(runnable._step_uuid)
                 #
-                # set context to the next logic step.
-                for edge in dag.out_edges(runnable):
-                    node = edge[1]
-                    # if node is the logical next step...
-                    if node._node_index is not None and runnable._node_index is not None:
-                        #and node._node_index == runnable._node_index + 1:
-                        node._context.update(env.sos_dict.clone_selected_vars(
-                            node._context['__signature_vars__'] | node._context['__environ_vars__'] \
-                            | {'_input', '__step_output__', '__default_output__', '__args__'}))
-                runnable._status = 'completed'
-                prog.progress(1)
-            #env.logger.error('completed')
-        prog.done()
-        if exec_error.errors:
-            failed_steps, pending_steps = dag.pending()
-            if failed_steps:
-                sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in failed_steps]
-                exec_error.append(self.workflow.name,
-                    RuntimeError('{} failed step{}: {}'.format(len(sections), 
-                        's' if len(sections) > 1 else '', ', '.join(sections))))
-            if pending_steps:
-                sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in pending_steps]
-                exec_error.append(self.workflow.name,
-                    RuntimeError('{} pending step{}: {}'.format(len(sections),
-                        's' if len(sections) > 1 else '', ', '.join(sections))))
-            raise exec_error
-        else:
-            self.save_workflow_signature(dag)
-            env.logger.info('Workflow {} (ID={}) is executed successfully.'.format(self.workflow.name, self.md5))
-
-    def dryrun(self, targets=None):
-        '''Execute the script in dryrun mode.'''
-        try:
-            self.run(targets=targets, mode='dryrun')
-        # only runtime errors are ignored
-        except RuntimeError as e:
-            env.logger.warning('Workflow cannot be completed in dryrun mode: {}'.format(e))
-
-
-class MP_Executor(Base_Executor):
-    #
-    # Execute a workflow sequentially in batch mode
-    def __init__(self, workflow, args=[], config_file=None, nested=False):
-        Base_Executor.__init__(self, workflow, args, config_file, nested=nested)
-        if hasattr(env, 'accessed_vars'):
-            delattr(env, 'accessed_vars')
-
-    def step_executor(self, section, queue):
-        return MP_Step_Executor(section, queue)
-
-    def run(self, targets=None, mode='run'):
-        '''Execute a workflow with specified command line args. If sub is True, this
-        workflow is a nested workflow and be treated slightly differently.
-        '''
-        self.reset_dict()
-        env.run_mode = mode
-        # passing run_mode to SoS dict so that users can execute blocks of
-        # python statements in different run modes.
-        env.sos_dict.set('run_mode', env.run_mode)
-        # process step of the pipelinp
-        dag = self.initialize_dag(targets=targets)
-
-        # process step of the pipelinp
-        #
-        procs = [None for x in range(env.max_jobs)]
-        prog = ProgressBar(self.workflow.name, dag.num_nodes(), disp=dag.num_nodes() > 1 and env.verbosity == 1)
-        exec_error = ExecuteError(self.workflow.name)
-        while True:
-            # step 1: check existing jobs and see if they are completed
-            for idx, proc in enumerate(procs):
-                if proc is None:
-                    continue
-                (p, q, u) = proc
+                # this is to keep compatibility of dag run with sequential run because
+                # in sequential run, we evaluate global section of each step in
+                # order to determine values of options such as skip.
+                # The consequence is that global definitions are available in
+                # SoS namespace.
                 try:
-                    res = q.get_nowait()
-                except Empty:
-                    # continue waiting
-                    continue
+                    SoS_exec(section.global_def, section.global_sigil)
+                except Exception as e:
+                    if env.verbosity > 2:
+                        sys.stderr.write(get_traceback())
+                    raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
+                        section.global_def, e))
+
+                # clear existing keys, otherwise the results from some random result
+                # might mess with the execution of another step that does not define input
+                for k in ['__step_input__', '__default_output__', '__step_output__']:
+                    if k in env.sos_dict:
+                        env.sos_dict.pop(k)
+                # if the step has its own context
+                env.sos_dict.quick_update(runnable._context)
+                # execute section with specified input
+                dag.set_status(runnable, 'running')
+                r, w = mp.Pipe(duplex=False)
+                if mode == 'run':
+                    executor = SP_Step_Executor(section, w)
+                else:
+                    executor = Dryrun_Step_Executor(section, w)
+                p = mp.Process(target=executor.run)
+                p.start()
+                # close our copy of the sending end so that recv() fails instead of
+                # blocking forever if the step process dies without a result
+                w.close()
                 #
+                try:
+                    res = r.recv()
+                except EOFError:
+                    res = RuntimeError('Step process exited unexpectedly with code {}'.format(p.exitcode))
+                r.close()
+                # status of files might have been changed by the step
+                stat_cache.clear()
+                # merge records written by the step to the workflow signature
+                workflow_journal.merge(env.sos_dict['__workflow_sig__'])
                 # if we does get the result
                 p.join()
-
-                runnable = dag.node_by_id(u)
+                # if the step says unknown target .... need to check if the target can
+                # be build dynamically.
                 if isinstance(res, UnknownTarget):
-                    runnable._status = None
+                    dag.set_status(runnable, None)
                     target = res.target
                     if self.resolve_dangling_targets(dag, [target]) == 0:
                         raise RuntimeError('Failed to resolve {}{}.'
                             .format(target, dag.steps_depending_on(target, self.workflow)))
                     # now, there should be no dangling targets, let us connect nodes
-                    # this can be done more efficiently
-                    runnable._depends_targets.append(target)
-                    dag._all_dependent_files[target].append(runnable)
+                    dag.add_dependency(runnable, target)
                     dag.build(self.workflow.auxiliary_sections)
                     #
                     cycle = dag.circular_dependencies()
                     if cycle:
                         raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
                 elif isinstance(res, RemovedTarget):
-                    runnable._status = None
+                    dag.set_status(runnable, None)
                     dag.regenerate_target(res.target)
                 elif isinstance(res, UnavailableLock):
-                    runnable._status = 'pending'
+                    dag.set_status(runnable, 'pending')
                     runnable._signature = (res.output, res.sig_file)
-                    section = self.workflow.section_by_id(runnable._step_uuid)
                     env.logger.info('Waiting on another process for step {}'.format(section.step_name()))
-                    # move away to let other tasks to run first
-                    procs[idx] = None
                 # if the job is failed
                 elif isinstance(res, Exception):
-                    runnable._status = 'failed'
+                    dag.set_status(runnable, 'failed')
                     exec_error.append(runnable._node_id, res)
                     prog.progress(1)
-                    procs[idx] = None
-                else:
-                    #
+                else:#
                     for k, v in res.items():
                         env.sos_dict.set(k, v)
+                    self._shared_files |= {v.filename for v in res.values() if isinstance(v, SharedValue)}
                     #
                     # set context to the next logic step.
                     for edge in dag.out_edges(runnable):
@@ -605,75 +776,466 @@ class MP_Executor(Base_Executor):
                             node._context.update(env.sos_dict.clone_selected_vars(
                                 node._context['__signature_vars__'] | node._context['__environ_vars__'] \
                                 | {'_input', '__step_output__', '__default_output__', '__args__'}))
-                    runnable._status = 'completed'
+                    dag.set_status(runnable, 'completed')
                     prog.progress(1)
-                    procs[idx] = None
                 #env.logger.error('completed')
-                #dag.show_nodes()
-            # step 2: submit new jobs if there are empty slots
-            for idx, proc in enumerate(procs):
-                # if there is empty slot, submit
-                if proc is not None:
+            prog.done()
+            # merge records written by steps to the workflow signature
+            workflow_journal.merge(env.sos_dict['__workflow_sig__'])
+            if exec_error.errors:
+                failed_steps, pending_steps = dag.pending()
+                if failed_steps:
+                    sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in failed_steps]
+                    exec_error.append(self.workflow.name,
+                        RuntimeError('{} failed step{}: {}'.format(len(sections), 
+                            's' if len(sections) > 1 else '', ', '.join(sections))))
+                if pending_steps:
+                    sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in pending_steps]
+                    exec_error.append(self.workflow.name,
+                        RuntimeError('{} pending step{}: {}'.format(len(sections),
+                            's' if len(sections) > 1 else '', ', '.join(sections))))
+                raise exec_error
+            else:
+                self.save_workflow_signature(dag)
+                env.logger.info('Workflow {} (ID={}) is executed successfully.'.format(self.workflow.name, self.md5))
+        finally:
+            self.release_shared_values()
+            stat_cache.stop()
+
+    def release_shared_values(self, keep=set()):
+        '''Load values shared by steps through files, and remove the files after
+        the workflow is completed or failed, except for files in keep that are
+        needed to resume the workflow from its checkpoint.'''
+        files = getattr(self, '_shared_files', set()) - keep
+        env.sos_dict.load_shared_values({k for k, v in env.sos_dict.items()
+            if isinstance(v, SharedValue) and v.filename in files})
+        for filename in files:
+            try:
+                os.remove(filename)
+            except Exception as e:
+                env.logger.debug('Failed to remove {}: {}'.format(filename, e))
+        self._shared_files = set()
+
+    def write_dag(self, filename, targets=None, collapse=False):
+        '''Write the DAG of the workflow to filename in JSON format if filename
+        ends with .json, or in DOT format otherwise, without executing any step.'''
+        self.reset_dict()
+        env.run_mode = 'dryrun'
+        env.sos_dict.set('run_mode', env.run_mode)
+        if isinstance(targets, str):
+            targets = [targets]
+        dag = self.initialize_dag(targets=targets)
+        if filename.endswith('.json'):
+            dag.write_json(filename, collapse)
+        else:
+            dag.write_dot(filename, collapse)
+        return dag
+
+    def dryrun(self, targets=None):
+        '''Execute the script in dryrun mode.'''
+        try:
+            self.run(targets=targets, mode='dryrun')
+        # only runtime errors are ignored
+        except RuntimeError as e:
+            env.logger.warning('Workflow cannot be completed in dryrun mode: {}'.format(e))
+
+
+class Step_Worker(mp.Process):
+    '''A long-lived process that receives steps from the master process,
+    executes them, and sends their results back through the same pipe. It
+    saves the cost of forking a process and re-importing modules for each
+    step.'''
+    def __init__(self, executor, pipe):
+        mp.Process.__init__(self)
+        self.executor = executor
+        self.pipe = pipe
+
+    def run(self):
+        # namespace of the master process when the worker is started, which
+        # does not contain variables of steps executed by the worker
+        initial = env.sos_dict.copy()
+        while True:
+            try:
+                work = self.pipe.recv()
+            except EOFError:
+                # the master process has quit
+                break
+            if work is None:
+                break
+            section, shared_vars, context = work
+            # repeat what the master process does before executing the step,
+            # with a fresh namespace so that variables of previous steps are
+            # not leaked to this step
+            env.sos_dict = WorkflowDict(initial)
+            env.sos_dict.quick_update(shared_vars)
+            try:
+                SoS_exec(section.global_def, section.global_sigil)
+            except Exception as e:
+                self.pipe.send(RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
+                    section.global_def, e)))
+                continue
+            for k in ['__step_input__', '__default_output__', '__step_output__']:
+                if k in env.sos_dict:
+                    env.sos_dict.pop(k)
+            env.sos_dict.quick_update(context)
+            self.executor.step_executor(section, self.pipe).run()
+
+
+class MP_Executor(Base_Executor):
+    #
+    # Execute a workflow sequentially in batch mode
+    def __init__(self, workflow, args=[], config_file=None, nested=False):
+        Base_Executor.__init__(self, workflow, args, config_file, nested=nested)
+        if hasattr(env, 'accessed_vars'):
+            delattr(env, 'accessed_vars')
+
+    # minimal interval (in seconds) between checkpoints of the execution
+    CHECKPOINT_INTERVAL = 5
+
+    def _checkpoint_file(self):
+        return os.path.join(env.exec_dir, '.sos', '{}.checkpoint'.format(self.md5))
+
+    def _checkpoint_signature(self, targets):
+        return textMD5(repr((self._dag_signature(targets), env.sig_mode)))
+
+    def _file_status(self, res):
+        '''Size, modification time and inode of input, dependent and output
+        files of a completed step'''
+        files = []
+        for key in ('__step_input__', '__step_depends__', '__step_output__'):
+            if not isinstance(res.get(key, None), list):
+                continue
+            for target in res[key]:
+                if isinstance(target, str):
+                    filename = os.path.expanduser(target)
+                elif isinstance(target, FileTarget):
+                    filename = target.fullname()
+                else:
                     continue
-                # find any step that can be executed and run it, and update the DAT
-                # with status.
-                runnable = dag.find_executable()
-                if runnable is None:
-                    # no runnable
-                    #dag.show_nodes()
-                    break
-                # find the section from runnable
-                section = self.workflow.section_by_id(runnable._step_uuid)
-                #
-                # this is to keep compatibility of dag run with sequential run because
-                # in sequential run, we evaluate global section of each step in
-                # order to determine values of options such as skip.
-                # The consequence is that global definitions are available in
-                # SoS namespace.
-                try:
-                    SoS_exec(section.global_def, section.global_sigil)
-                except RuntimeError as e:
-                    if env.verbosity > 2:
-                        sys.stderr.write(get_traceback())
-                    raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
-                        section.global_def, e))
+                st = stat_cache.stat(filename)
+                files.append((filename, None if st is None else (st.st_size, st.st_mtime_ns, st.st_ino)))
+        return files
 
-                # clear existing keys, otherwise the results from some random result
-                # might mess with the execution of another step that does not define input
-                for k in ['__step_input__', '__default_output__', '__step_output__']:
-                    if k in env.sos_dict:
-                        env.sos_dict.pop(k)
-                # if the step has its own context
-                env.sos_dict.quick_update(runnable._context)
-                # execute section with specified input
-                runnable._status = 'running'
-                q = mp.Queue()
-                executor = self.step_executor(section, q)
-                p = mp.Process(target=executor.run)
-                procs[idx] = (p, q, runnable._node_uuid)
-                p.start()
-                #
-                #env.logger.error('started')
-                #dag.show_nodes()
+    def save_checkpoint(self, targets, completed):
+        '''Save results of completed steps so that the execution of the workflow
+        can be resumed with option --resume'''
+        try:
+            with open(self._checkpoint_file() + '.tmp', 'wb') as cp:
+                pickle.dump({
+                    'signature': self._checkpoint_signature(targets),
+                    'uuids': [x.uuid for x in self.workflow.sections + self.workflow.auxiliary_sections],
+                    'completed': completed}, cp, pickle.HIGHEST_PROTOCOL)
+            os.replace(self._checkpoint_file() + '.tmp', self._checkpoint_file())
+            # files of shared values that are needed to resume from the checkpoint
+            self._checkpoint_files = {v.filename for x in completed for v in x[1].values()
+                if isinstance(v, SharedValue)}
+        except Exception as e:
+            env.logger.warning('Failed to save checkpoint {}: {}'.format(self._checkpoint_file(), e))
+
+    def load_checkpoint(self, targets):
+        '''Load checkpoint saved by a previous execution of the workflow. Sections
+        take the UUIDs of the previous execution so that nodes of the DAG have the
+        same UUIDs.'''
+        try:
+            with open(self._checkpoint_file(), 'rb') as cp:
+                checkpoint = pickle.load(cp)
+        except FileNotFoundError:
+            env.logger.info('No checkpoint of workflow {} to resume from'.format(self.workflow.name))
+            return None
+        except Exception as e:
+            env.logger.warning('Failed to load checkpoint {}: {}'.format(self._checkpoint_file(), e))
+            return None
+        sections = self.workflow.sections + self.workflow.auxiliary_sections
+        if checkpoint['signature'] != self._checkpoint_signature(targets) or len(checkpoint['uuids']) != len(sections):
+            env.logger.warning('Checkpoint of workflow {} is ignored because the workflow or its options have been changed'
+                .format(self.workflow.name))
+            return None
+        for section, uuid in zip(sections, checkpoint['uuids']):
+            section.uuid = uuid
+        return checkpoint
+
+    def restore_checkpoint(self, dag, checkpoint, completed, shared_vars):
+        '''Mark steps completed in the checkpoint as completed if all their
+        dependencies are completed and their files are unchanged, without
+        validating their signatures. Returns the number of restored steps.'''
+        restored = 0
+        # steps are restored in the order of their completion
+        for node_uuid, res, files in checkpoint['completed']:
+            try:
+                node = dag.node_by_id(node_uuid)
+            except RuntimeError:
+                continue
+            if node._status is not None or any(x._status != 'completed' for x in dag.predecessors(node)):
+                continue
+            if self._file_status(res) != files:
+                env.logger.debug('Step {} is not resumed because its files have been changed'.format(node._node_id))
+                continue
+            self.step_completed(dag, node, res, shared_vars)
+            completed.append((node_uuid, res, files))
+            restored += 1
+        return restored
+
+    def step_completed(self, dag, runnable, res, shared_vars):
+        '''Merge results of a completed step and pass them to its next steps'''
+        for k, v in res.items():
+            env.sos_dict.set(k, v)
+        shared_vars.update(res)
+        self._shared_files |= {v.filename for v in res.values() if isinstance(v, SharedValue)}
+        #
+        # set context to the next logic step.
+        for edge in dag.out_edges(runnable):
+            node = edge[1]
+            # if node is the logical next step...
+            if node._node_index is not None and runnable._node_index is not None:
+                #and node._node_index == runnable._node_index + 1:
+                node._context.update(env.sos_dict.clone_selected_vars(
+                    node._context['__signature_vars__'] | node._context['__environ_vars__'] \
+                    | {'_input', '__step_output__', '__default_output__', '__args__'}))
+        dag.set_status(runnable, 'completed')
+
+    def step_executor(self, section, pipe):
+        return MP_Step_Executor(section, pipe)
+
+    def _start_worker(self, slot):
+        master, worker = mp.Pipe()
+        p = Step_Worker(self, worker)
+        if env.task_pool is not None:
+            env.task_pool.slot = slot
+        p.start()
+        worker.close()
+        return (p, master)
+
+    def _stop_workers(self, workers):
+        for p, pipe in workers:
+            try:
+                pipe.send(None)
+            except (BrokenPipeError, OSError):
+                # worker has already quit
+                pass
+            pipe.close()
+        for p, pipe in workers:
+            p.join()
+
+    def run(self, targets=None, mode='run'):
+        '''Execute a workflow with specified command line args. If sub is True, this
+        workflow is a nested workflow and be treated slightly differently.
+        '''
+        self.reset_dict()
+        env.run_mode = mode
+        # passing run_mode to SoS dict so that users can execute blocks of
+        # python statements in different run modes.
+        env.sos_dict.set('run_mode', env.run_mode)
+        # status of files is cached during the execution of the workflow
+        stat_cache.start()
+        try:
+            # results of completed steps are saved to a checkpoint, from which
+            # an interrupted execution can be resumed
+            checkpoint = mode == 'run' and self.md5 is not None and not self.nested
+            resumed = self.load_checkpoint(targets) if checkpoint and env.resume else None
+            # process step of the pipelinp
+            dag = self.initialize_dag(targets=targets)
+            # start steps with long chains of depending steps first
+            dag.set_priority('critical_path')
+
+            # process step of the pipelinp
             #
-            if all(x is None for x in procs):
-                break
+            procs = [None for x in range(env.max_jobs)]
+            prog = ProgressBar(self.workflow.name, dag.num_nodes(), disp=dag.num_nodes() > 1 and env.verbosity == 1)
+            exec_error = ExecuteError(self.workflow.name)
+            # variables returned from completed steps, which are sent to workers
+            # because they do not inherit the namespace of the master process
+            shared_vars = {}
+            # node UUIDs, results and status of files of completed steps
+            completed = []
+            last_checkpoint = time.time()
+            # files of values shared by steps
+            self._shared_files = set()
+            if resumed:
+                restored = self.restore_checkpoint(dag, resumed, completed, shared_vars)
+                self._shared_files |= {v.filename for v in shared_vars.values() if isinstance(v, SharedValue)}
+                env.logger.info('Resuming workflow {} with {} completed step{}'.format(self.workflow.name,
+                    restored, 's' if restored != 1 else ''))
+                prog.progress(restored)
+            # start a pool of processes that executes concurrent tasks of all steps
+            parent_task_pool = env.task_pool
+            # (sections of nodes that are added to the DAG, including auxiliary steps)
+            if mode == 'run' and env.max_jobs > 1 and any(x.task for x in
+                self.workflow.sections + self.workflow.auxiliary_sections):
+                env.task_pool = Task_Pool(env.max_jobs, env.max_jobs)
             else:
-                time.sleep(0.1)
-        prog.done()
-        if exec_error.errors:
-            failed_steps, pending_steps = dag.pending()
-            if failed_steps:
-                sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in failed_steps]
-                exec_error.append(self.workflow.name,
-                    RuntimeError('{} failed step{}: {}'.format(len(sections), 
-                        's' if len(sections) > 1 else '', ', '.join(sections))))
-            if pending_steps:
-                sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in pending_steps]
-                exec_error.append(self.workflow.name,
-                    RuntimeError('{} pending step{}: {}'.format(len(sections), 
-                        's' if len(sections) > 1 else '', ', '.join(sections))))
-            raise exec_error
-        else:
-            self.save_workflow_signature(dag)
-            env.logger.info('Workflow {} (ID={}) is executed successfully.'.format(self.workflow.name, self.md5))
+                env.task_pool = None
+            # start a pool of long-lived workers if requested
+            workers = [self._start_worker(x) for x in range(env.max_jobs)] if env.worker_pool else []
+            try:
+                while True:
+                    # replace workers of the task pool that have been killed
+                    if env.task_pool is not None:
+                        env.task_pool.restart_workers()
+                    # step 1: check existing jobs and see if they are completed
+                    for idx, proc in enumerate(procs):
+                        if proc is None:
+                            continue
+                        (p, r, u) = proc
+                        if r.poll():
+                            try:
+                                res = r.recv()
+                            except EOFError:
+                                # the step process (or worker) died without a result
+                                p.join()
+                                res = RuntimeError('Step process exited unexpectedly with code {}'.format(p.exitcode))
+                        elif not p.is_alive() and not r.poll():
+                            res = RuntimeError('Step process exited unexpectedly with code {}'.format(p.exitcode))
+                        else:
+                            # continue waiting
+                            continue
+                        # status of files might have been changed by the step
+                        stat_cache.clear()
+                        # merge records written by the step to the workflow signature
+                        workflow_journal.merge(env.sos_dict['__workflow_sig__'])
+                        #
+                        # if we does get the result
+                        if workers:
+                            if not p.is_alive():
+                                # replace a worker that was killed during the step
+                                r.close()
+                                p.join()
+                                workers[idx] = self._start_worker(idx)
+                        else:
+                            r.close()
+                            p.join()
+                        # release the slot so that other steps can be submitted
+                        procs[idx] = None
+
+                        runnable = dag.node_by_id(u)
+                        if isinstance(res, UnknownTarget):
+                            dag.set_status(runnable, None)
+                            target = res.target
+                            if self.resolve_dangling_targets(dag, [target]) == 0:
+                                raise RuntimeError('Failed to resolve {}{}.'
+                                    .format(target, dag.steps_depending_on(target, self.workflow)))
+                            # now, there should be no dangling targets, let us connect nodes
+                            dag.add_dependency(runnable, target)
+                            dag.build(self.workflow.auxiliary_sections)
+                            #
+                            cycle = dag.circular_dependencies()
+                            if cycle:
+                                raise RuntimeError('Circular dependency detected {}. It is likely a later step produces input of a previous step.'.format(cycle))
+                        elif isinstance(res, RemovedTarget):
+                            dag.set_status(runnable, None)
+                            dag.regenerate_target(res.target)
+                        elif isinstance(res, UnavailableLock):
+                            dag.set_status(runnable, 'pending')
+                            runnable._signature = (res.output, res.sig_file)
+                            section = self.workflow.section_by_id(runnable._step_uuid)
+                            env.logger.info('Waiting on another process for step {}'.format(section.step_name()))
+                        # if the job is failed
+                        elif isinstance(res, Exception):
+                            dag.set_status(runnable, 'failed')
+                            exec_error.append(runnable._node_id, res)
+                            prog.progress(1)
+                        else:
+                            self.step_completed(dag, runnable, res, shared_vars)
+                            prog.progress(1)
+                            if checkpoint:
+                                completed.append((runnable._node_uuid, res, self._file_status(res)))
+                                if time.time() - last_checkpoint > self.CHECKPOINT_INTERVAL:
+                                    self.save_checkpoint(targets, completed)
+                                    last_checkpoint = time.time()
+                        #env.logger.error('completed')
+                        #dag.show_nodes()
+                    # step 2: submit new jobs if there are empty slots
+                    for idx, proc in enumerate(procs):
+                        # if there is empty slot, submit
+                        if proc is not None:
+                            continue
+                        # find any step that can be executed and run it, and update the DAT
+                        # with status.
+                        runnable = dag.find_executable()
+                        if runnable is None:
+                            # no runnable
+                            #dag.show_nodes()
+                            break
+                        # find the section from runnable
+                        section = self.workflow.section_by_id(runnable._step_uuid)
+                        #
+                        # this is to keep compatibility of dag run with sequential run because
+                        # in sequential run, we evaluate global section of each step in
+                        # order to determine values of options such as skip.
+                        # The consequence is that global definitions are available in
+                        # SoS namespace.
+                        try:
+                            SoS_exec(section.global_def, section.global_sigil)
+                        except RuntimeError as e:
+                            if env.verbosity > 2:
+                                sys.stderr.write(get_traceback())
+                            raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
+                                section.global_def, e))
+
+                        # clear existing keys, otherwise the results from some random result
+                        # might mess with the execution of another step that does not define input
+                        for k in ['__step_input__', '__default_output__', '__step_output__']:
+                            if k in env.sos_dict:
+                                env.sos_dict.pop(k)
+                        # if the step has its own context
+                        env.sos_dict.quick_update(runnable._context)
+                        # execute section with specified input
+                        dag.set_status(runnable, 'running')
+                        if workers:
+                            p, r = workers[idx]
+                            # only variables that are used by the step are sent
+                            used = runnable._context.get('__signature_vars__', set()) | \
+                                runnable._context.get('__environ_vars__', set()) | \
+                                {x._var for x in runnable._depends_targets if isinstance(x, sos_variable)}
+                            r.send((section, {k: v for k, v in shared_vars.items() if k in used},
+                                runnable._context))
+                        else:
+                            r, w = mp.Pipe(duplex=False)
+                            executor = self.step_executor(section, w)
+                            p = mp.Process(target=executor.run)
+                            if env.task_pool is not None:
+                                env.task_pool.slot = idx
+                            p.start()
+                            w.close()
+                        procs[idx] = (p, r, runnable._node_uuid)
+                        #
+                        #env.logger.error('started')
+                        #dag.show_nodes()
+                    #
+                    if all(x is None for x in procs):
+                        break
+                    else:
+                        # block until a step sends its result or its process exits
+                        wait([x[1] for x in procs if x is not None] +
+                            [x[0].sentinel for x in procs if x is not None])
+            finally:
+                self._stop_workers(workers)
+                if env.task_pool is not None:
+                    env.task_pool.close()
+                env.task_pool = parent_task_pool
+                if checkpoint and completed:
+                    self.save_checkpoint(targets, completed)
+            prog.done()
+            # merge records written by steps to the workflow signature
+            workflow_journal.merge(env.sos_dict['__workflow_sig__'])
+            if exec_error.errors:
+                failed_steps, pending_steps = dag.pending()
+                if failed_steps:
+                    sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in failed_steps]
+                    exec_error.append(self.workflow.name,
+                        RuntimeError('{} failed step{}: {}'.format(len(sections), 
+                            's' if len(sections) > 1 else '', ', '.join(sections))))
+                if pending_steps:
+                    sections = [self.workflow.section_by_id(x._step_uuid).step_name() for x in pending_steps]
+                    exec_error.append(self.workflow.name,
+                        RuntimeError('{} pending step{}: {}'.format(len(sections), 
+                            's' if len(sections) > 1 else '', ', '.join(sections))))
+                raise exec_error
+            else:
+                self.save_workflow_signature(dag)
+                if checkpoint and os.path.isfile(self._checkpoint_file()):
+                    os.remove(self._checkpoint_file())
+                env.logger.info('Workflow {} (ID={}) is executed successfully.'.format(self.workflow.name, self.md5))
+        finally:
+            self.release_shared_values(getattr(self, '_checkpoint_files', set())
+                if checkpoint and os.path.isfile(self._checkpoint_file()) else set())
+            stat_cache.stop()
@@ -22,17 +22,22 @@
 import os
 import sys
 import copy
-import glob
 import fnmatch
+import pickle
+import queue
+import types
+import uuid
+import multiprocessing as mp
 
 from collections.abc import Sequence, Iterable, Mapping
-from itertools import tee, combinations
+from itertools import combinations, islice
 
 from .utils import env, AbortExecution, short_repr, \
-    get_traceback, transcribe, ActivityNotifier
-from .pattern import extract_pattern
-from .sos_eval import SoS_eval, SoS_exec, Undetermined
-from .target import BaseTarget, FileTarget, dynamic, RuntimeInfo, UnknownTarget, RemovedTarget, UnavailableLock
+    get_traceback, transcribe, ActivityNotifier, share_value, PickledVars, WorkflowDict
+from .pattern import extract_pattern, glob_files
+from .sos_eval import SoS_eval, SoS_exec, Undetermined, accessed_vars
+from .target import BaseTarget, FileTarget, stat_cache, dynamic, RuntimeInfo, UnknownTarget, RemovedTarget, UnavailableLock
+from .signatures import workflow_journal
 from .sos_syntax import SOS_INPUT_OPTIONS, SOS_DEPENDS_OPTIONS, SOS_OUTPUT_OPTIONS, \
     SOS_RUNTIME_OPTIONS
 
@@ -82,6 +87,10 @@ def execute_task(params):
         if '_runtime' in sos_dict and 'env' in sos_dict['_runtime']:
             os.environ.update(sos_dict['_runtime']['env'])
 
+        # use signature options of the workflow, which might not be set
+        # (e.g. from command line) for processes that execute the task
+        if signature is not None:
+            env.sig_store, env.sig_check, env.sig_hash = signature.sig_options
         env.sos_dict.quick_update(sos_dict)
         SoS_exec('import os, sys, glob', None)
         SoS_exec('from sos.runtime import *', None)
@@ -103,13 +112,158 @@ def execute_task(params):
         raise RuntimeError('KeyboardInterrupt from {}'.format(os.getpid()))
     finally:
         env.sos_dict.set('__step_sig__', None)
+        workflow_journal.flush()
 
     if signature is not None:
         signature.write()
+        workflow_journal.flush()
     env.deregister_process(os.getpid())
     return {'succ': 0, 'output': env.sos_dict['_output'], 'path': os.environ['PATH']}
 
 
+class Task_Worker(mp.Process):
+    '''A worker of the task pool that executes tasks from all steps and sends
+    results to the result queue of the slot of the submitting step.'''
+    def __init__(self, tasks, results, running, index):
+        mp.Process.__init__(self)
+        # tasks are executed in daemon processes, as with multiprocessing.Pool
+        self.daemon = True
+        self.tasks = tasks
+        self.results = results
+        # pid, slot, tag and index of the task that is being executed by
+        # each worker, which is cleared (pid=0) after the result is sent
+        self.running = running
+        self.index = index
+
+    def run(self):
+        # namespace of the workflow (e.g. command line arguments) inherited
+        # from the master process before any step is executed, and namespace
+        # with definitions of sos.runtime and the global section, which is
+        # created once for each global section
+        initial = env.sos_dict.copy()
+        global_def = None
+        namespace = {}
+        while True:
+            slot, tag, idx, param = self.tasks.get()
+            # record the task so that the step does not wait for the result
+            # of the task if the worker is killed
+            self.running[4 * self.index: 4 * self.index + 4] = [os.getpid(), slot, tag, idx]
+            task, task_global_def, global_sigil, sos_dict, signature, sigil = param.data
+            try:
+                if global_def != (task_global_def, global_sigil):
+                    global_def = None
+                    env.sos_dict = WorkflowDict(initial)
+                    SoS_exec('import os, sys, glob', None)
+                    SoS_exec('from sos.runtime import *', None)
+                    if task_global_def:
+                        SoS_exec(task_global_def, global_sigil)
+                    namespace = env.sos_dict.copy()
+                    global_def = (task_global_def, global_sigil)
+                # each task is executed in a fresh copy of the namespace so that
+                # variables of previous tasks (of other steps) are not leaked
+                env.sos_dict = WorkflowDict(namespace)
+                res = execute_task(TaskParams(param.name, (task, '', '', sos_dict, signature, sigil)))
+            except Exception as e:
+                res = {'succ': 1, 'exception': e, 'path': os.environ['PATH']}
+            # results are pickled by the worker so that results that cannot be
+            # pickled are reported instead of being lost by the queue
+            try:
+                res = pickle.dumps(res, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                res = pickle.dumps({'succ': 1, 'path': os.environ['PATH'],
+                    'exception': RuntimeError('Failed to pickle result of task {}: {}'.format(param.name, e))},
+                    pickle.HIGHEST_PROTOCOL)
+            self.results[slot].put((tag, idx, res))
+            self.running[4 * self.index] = 0
+
+
+class Task_Pool:
+    '''A pool of processes that is shared by all steps of a workflow, created
+    by the master process before steps are executed. Each step is executed in
+    one of the slots of the executor and receives results of its tasks from
+    the result queue of its slot.'''
+    # interval (in seconds) to check if workers that execute tasks are alive
+    CHECK_INTERVAL = 1
+
+    def __init__(self, num_workers, num_slots):
+        self.tasks = mp.Queue()
+        self.results = [mp.Queue() for x in range(num_slots)]
+        # slot of the step that is executed by the current process, which
+        # is set before the step process is forked
+        self.slot = None
+        self.running = mp.Array('q', 4 * num_workers)
+        self.workers = [Task_Worker(self.tasks, self.results, self.running, x) for x in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, tag, idx, param):
+        self.tasks.put((self.slot, tag, idx, param))
+
+    def restart_workers(self):
+        '''Replace workers that have been killed, called by the master process'''
+        for i, worker in enumerate(self.workers):
+            if not worker.is_alive():
+                env.logger.warning('Worker {} of task pool exited unexpectedly with code {}'
+                    .format(worker.pid, worker.exitcode))
+                self.workers[i] = Task_Worker(self.tasks, self.results, self.running, i)
+                self.workers[i].start()
+
+    def collect(self, tag, num_results):
+        '''Yield (idx, result) of num_results tasks submitted with tag.
+        Results of tasks of previous steps that failed before collecting
+        their results are discarded. A RuntimeError is raised if a worker
+        that executes one of the tasks is killed.'''
+        while num_results > 0:
+            try:
+                res_tag, idx, res = self.results[self.slot].get(timeout=self.CHECK_INTERVAL)
+            except queue.Empty:
+                running = self.running[:]
+                for i in range(0, len(running), 4):
+                    pid, slot, task_tag, idx = running[i:i + 4]
+                    if pid and slot == self.slot and task_tag == tag and not _process_alive(pid):
+                        raise RuntimeError('Worker {} of task pool exited unexpectedly while executing task {}'
+                            .format(pid, idx))
+                continue
+            if res_tag != tag:
+                continue
+            try:
+                res = pickle.loads(res)
+            except Exception as e:
+                res = {'succ': 1, 'path': os.environ['PATH'],
+                    'exception': RuntimeError('Failed to load result of task {}: {}'.format(idx, e))}
+            num_results -= 1
+            yield idx, res
+
+    def close(self):
+        # all steps have collected their results so remaining tasks are from
+        # failed steps, which are terminated as with multiprocessing.Pool
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+
+def _process_alive(pid):
+    '''Test if a process, which might not be a child process, is alive'''
+    import psutil
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def execute_global_def(section):
+    '''Execute global definition of section without handling parameters'''
+    if section.global_def:
+        try:
+            SoS_exec('del sos_handle_parameter_\n' + section.global_def, section.global_sigil)
+        except RuntimeError as e:
+            if env.verbosity > 2:
+                sys.stderr.write(get_traceback())
+            raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
+                section.global_def, e))
+        finally:
+            SoS_exec('from sos.runtime import sos_handle_parameter_', None)
+
 def analyze_section(section, default_input=None):
     '''Analyze a section for how it uses input and output, what variables
     it uses, and input, output, etc.'''
@@ -151,16 +305,7 @@ def analyze_section(section, default_input=None):
     # removed. We achieve this by removing function sos_handle_parameter_
     # from the SoS_dict namespace
     #
-    if section.global_def:
-        try:
-            SoS_exec('del sos_handle_parameter_\n' + section.global_def, section.global_sigil)
-        except RuntimeError as e:
-            if env.verbosity > 2:
-                sys.stderr.write(get_traceback())
-            raise RuntimeError('Failed to execute statements\n"{}"\n{}'.format(
-                section.global_def, e))
-        finally:
-            SoS_exec('from sos.runtime import sos_handle_parameter_', None)
+    execute_global_def(section)
 
     #
     # 2. look for input statement
@@ -333,36 +478,38 @@ class Base_Step_Executor:
     # Nested functions to handle different parameters of input directive
     @staticmethod
     def handle_group_by(ifiles, group_by):
-        '''Handle input option group_by'''
+        '''Handle input option group_by. Returns the number of groups and a
+        function that generates the groups so that they do not have to be
+        created all at once.'''
         if group_by == 'single':
-            return [[x] for x in ifiles]
+            return len(ifiles), lambda: ([x] for x in ifiles)
         elif group_by == 'all':
             # default option
-            return [ifiles]
+            return 1, lambda: iter([ifiles])
         elif group_by == 'pairs':
             if len(ifiles) % 2 != 0:
                 raise ValueError('Paired group_by has to have even number of input files: {} provided'
                     .format(len(ifiles)))
-            return list(list(x) for x in zip(ifiles[:len(ifiles)//2], ifiles[len(ifiles)//2:]))
+            half = len(ifiles) // 2
+            return half, lambda: (list(x) for x in zip(islice(ifiles, half), islice(ifiles, half, None)))
         elif group_by == 'pairwise':
-            f1, f2 = tee(ifiles)
-            next(f2, None)
-            return [list(x) for x in zip(f1, f2)]
+            return max(0, len(ifiles) - 1), lambda: (list(x) for x in zip(ifiles, islice(ifiles, 1, None)))
         elif group_by == 'combinations':
-            return [list(x) for x in combinations(ifiles, 2)]
+            return len(ifiles) * (len(ifiles) - 1) // 2, lambda: (list(x) for x in combinations(ifiles, 2))
         elif isinstance(group_by, int) or group_by.isdigit():
             group_by = int(group_by)
             if len(ifiles) % group_by != 0:
                 raise ValueError('Size of group_by block has to be divisible by the number of input files: {} provided'
                     .format(len(ifiles)))
             group_by = max(1, group_by)
-            return [ifiles[i:i + group_by] for i in range(0, len(ifiles), group_by)]
+            return len(ifiles) // group_by, lambda: (ifiles[i:i + group_by] for i in range(0, len(ifiles), group_by))
         else:
             raise ValueError('Unsupported group_by option ``{}``!'.format(group_by))
 
     @staticmethod
-    def handle_paired_with(paired_with, ifiles, _groups, _vars):
-        '''Handle input option paired_with'''
+    def handle_paired_with(paired_with, ifiles):
+        '''Handle input option paired_with. Returns a list of variable names
+        and mappings from input files to values of the variables.'''
         if paired_with is None or not paired_with:
             paired_with = []
         elif isinstance(paired_with, str):
@@ -372,6 +519,7 @@ class Base_Step_Executor:
         else:
             raise ValueError('Unacceptable value for parameter paired_with: {}'.format(paired_with))
         #
+        paired_vars = []
         for wv in paired_with:
             if '.' in wv:
                 if wv.split('.')[0] not in env.sos_dict:
@@ -386,12 +534,11 @@ class Base_Step_Executor:
             if len(values) != len(ifiles):
                 raise ValueError('Length of variable {} (length {}) should match the number of input files (length {}).'
                     .format(wv, len(values), len(ifiles)))
-            file_map = {x:y for x,y in zip(ifiles, values)}
-            for idx, grp in enumerate(_groups):
-                _vars[idx]['_' + wv.split('.')[0]] = [file_map[x] for x in grp]
+            paired_vars.append(('_' + wv.split('.')[0], {x:y for x,y in zip(ifiles, values)}))
+        return paired_vars
 
     @staticmethod
-    def handle_extract_pattern(pattern, ifiles, _groups, _vars):
+    def handle_extract_pattern(pattern, ifiles):
         '''Handle input option pattern'''
         if pattern is None or not pattern:
             patterns = []
@@ -402,6 +549,7 @@ class Base_Step_Executor:
         else:
             raise ValueError('Unacceptable value for parameter pattern: {}'.format(pattern))
         #
+        paired_vars = []
         for pattern in patterns:
             res = extract_pattern(pattern, ifiles)
             # now, assign the variables to env
@@ -410,10 +558,13 @@ class Base_Step_Executor:
                     raise RuntimeError('Pattern defined variable {} is not allowed'.format(k))
                 env.sos_dict[k] = v
             # also make k, v pair with _input
-            Base_Step_Executor.handle_paired_with(res.keys(), ifiles, _groups, _vars)
+            paired_vars.extend(Base_Step_Executor.handle_paired_with(res.keys(), ifiles))
+        return paired_vars
 
     @staticmethod
-    def handle_for_each(for_each, _groups, _vars):
+    def handle_for_each(for_each):
+        '''Handle input option for_each. Returns a list of loops, each with its
+        size and the names and values of its variables.'''
         if for_each is None or not for_each:
             for_each = []
         elif isinstance(for_each, str):
@@ -423,6 +574,7 @@ class Base_Step_Executor:
         else:
             raise ValueError('Unacceptable value for parameter for_each: {}'.format(for_each))
         #
+        loops = []
         for fe_all in for_each:
             loop_size = None
             for fe in [x.strip() for x in fe_all.split(',')]:
@@ -439,32 +591,41 @@ class Base_Step_Executor:
                 elif loop_size != len(values):
                     raise ValueError('Length of variable {} (length {}) should match the length of variable {} (length {}).'
                         .format(fe, len(values), fe_all.split(',')[0], loop_size))
-            # expand
-            _tmp_groups = copy.deepcopy(_groups)
-            _groups.clear()
-            for i in range(loop_size):
-                _groups.extend(_tmp_groups)
             #
-            _tmp_vars = copy.deepcopy(_vars)
-            _vars.clear()
-            for vidx in range(loop_size):
-                for idx in range(len(_tmp_vars)):
-                    for fe in [x.strip() for x in fe_all.split(',')]:
-                        if fe.split('.')[0] not in env.sos_dict:
-                            raise ValueError('Variable {} does not exist.'.format(fe))
-                        if '.' in fe:
-                            var_name = '_' + fe.replace('.', '_')
-                            values = getattr(env.sos_dict[fe.split('.')[0]], fe.split('.', 1)[-1])
-                        else:
-                            var_name = '_' + fe
-                            values = env.sos_dict[fe]
-                        if isinstance(values, Sequence):
-                            _tmp_vars[idx][var_name] = values[vidx]
-                        elif isinstance(values, pd.DataFrame):
-                            _tmp_vars[idx][var_name] = values.iloc[vidx]
-                        else:
-                            raise ValueError('Unrecognized for_each variable {}'.format(fe))
-                _vars.extend(copy.deepcopy(_tmp_vars))
+            loop_vars = []
+            for fe in [x.strip() for x in fe_all.split(',')]:
+                if fe.split('.')[0] not in env.sos_dict:
+                    raise ValueError('Variable {} does not exist.'.format(fe))
+                if '.' in fe:
+                    var_name = '_' + fe.replace('.', '_')
+                    values = getattr(env.sos_dict[fe.split('.')[0]], fe.split('.', 1)[-1])
+                else:
+                    var_name = '_' + fe
+                    values = env.sos_dict[fe]
+                if isinstance(values, Sequence):
+                    loop_vars.append((var_name, values.__getitem__))
+                elif isinstance(values, pd.DataFrame):
+                    loop_vars.append((var_name, values.iloc.__getitem__))
+                else:
+                    raise ValueError('Unrecognized for_each variable {}'.format(fe))
+            loops.append((loop_size, loop_vars))
+        return loops
+
+    @staticmethod
+    def generate_substeps(groups, paired_vars, loops):
+        '''Generate _input and variables of substeps one at a time, with the
+        last for_each loop as the outermost loop.'''
+        if not loops:
+            for grp in groups():
+                yield grp, {name: [file_map[x] for x in grp] for name, file_map in paired_vars}
+            return
+        loop_size, loop_vars = loops[-1]
+        for vidx in range(loop_size):
+            for grp, _vars in Base_Step_Executor.generate_substeps(groups, paired_vars, loops[:-1]):
+                for var_name, value in loop_vars:
+                    _vars[var_name] = copy.deepcopy(value(vidx))
+                # each substep has its own copy of _input
+                yield copy.copy(grp), _vars
 
     # directive input
     def process_input_args(self, ifiles, **kwargs):
@@ -473,9 +634,8 @@ class Base_Step_Executor:
             determines and set __step_input__
             determines and set pattern variables if needed
         returns
-            _groups
-            _vars
-        which are groups of _input and related _vars
+            number of substeps
+            a generator of _input and related _vars of substeps
         '''
         if isinstance(ifiles, Undetermined):
             env.sos_dict.set('input', Undetermined())
@@ -483,7 +643,7 @@ class Base_Step_Executor:
             # temporarily set depends and output to Undetermined because we cannot
             # go far with such input
             env.sos_dict.set('output', Undetermined())
-            return [Undetermined()], [{}]
+            return 1, iter([(Undetermined(), {})])
 
         for k in kwargs.keys():
             if k not in SOS_INPUT_OPTIONS:
@@ -503,21 +663,24 @@ class Base_Step_Executor:
         #
         # handle group_by
         if 'group_by' in kwargs:
-            _groups = Base_Step_Executor.handle_group_by(ifiles, kwargs['group_by'])
+            num_groups, groups = Base_Step_Executor.handle_group_by(ifiles, kwargs['group_by'])
         else:
-            _groups = [ifiles]
+            num_groups, groups = 1, lambda: iter([ifiles])
         #
-        _vars = [{} for x in _groups]
+        paired_vars = []
         # handle paired_with
         if 'paired_with' in kwargs:
-            Base_Step_Executor.handle_paired_with(kwargs['paired_with'], ifiles,  _groups, _vars)
+            paired_vars.extend(Base_Step_Executor.handle_paired_with(kwargs['paired_with'], ifiles))
         # handle pattern
         if 'pattern' in kwargs:
-            Base_Step_Executor.handle_extract_pattern(kwargs['pattern'], ifiles, _groups, _vars)
+            paired_vars.extend(Base_Step_Executor.handle_extract_pattern(kwargs['pattern'], ifiles))
         # handle for_each
+        loops = []
         if 'for_each' in kwargs:
-            Base_Step_Executor.handle_for_each(kwargs['for_each'], _groups, _vars)
-        return _groups, _vars
+            loops = Base_Step_Executor.handle_for_each(kwargs['for_each'])
+            for loop_size, loop_vars in loops:
+                num_groups *= loop_size
+        return num_groups, Base_Step_Executor.generate_substeps(groups, paired_vars, loops)
 
     def process_depends_args(self, dfiles, **kwargs):
         for k in kwargs.keys():
@@ -636,24 +799,25 @@ class Base_Step_Executor:
             '__step_name__': env.sos_dict['step_name'],
         }
         result['__changed_vars__'] = set()
+        # large values are saved to files and are loaded by the steps that use them
         if 'shared' in self.step.options:
             vars = self.step.options['shared']
             if isinstance(vars, str):
                 result['__changed_vars__'].add(vars)
-                result[vars] = copy.deepcopy(env.sos_dict[vars])
+                result[vars] = share_value(env.sos_dict[vars])
             elif isinstance(vars, Mapping):
                 result['__changed_vars__'] |= vars.keys()
                 for var in vars.keys():
-                    result[var] = copy.deepcopy(env.sos_dict[var])
+                    result[var] = share_value(env.sos_dict[var])
             elif isinstance(vars, Sequence):
                 for item in vars:
                     if isinstance(item, str):
                         result['__changed_vars__'].add(item)
-                        result[item] = copy.deepcopy(env.sos_dict[item])
+                        result[item] = share_value(env.sos_dict[item])
                     elif isinstance(item, Mapping):
                         result['__changed_vars__'] |= item.keys()
                         for var in item.keys():
-                            result[var] = copy.deepcopy(env.sos_dict[var])
+                            result[var] = share_value(env.sos_dict[var])
                     else:
                         raise ValueError('Option shared should be a string, a mapping of expression, or a list of string or mappings. {} provided'.format(vars))
             else:
@@ -665,7 +829,16 @@ class Base_Step_Executor:
         return result
 
     def run(self):
+        # files are created and checked by the step so their status is not
+        # cached, which might hide files created earlier by the step
+        cache_active = stat_cache.active
+        stat_cache.active = False
+        stat_cache.clear()
         try:
+            # values shared by previous steps through files, which are loaded
+            # only if they are used by the step
+            env.sos_dict.load_shared_values(env.sos_dict.get('__signature_vars__', set())
+                | env.sos_dict.get('__environ_vars__', set()))
             if 'workdir' in self.step.options:
                 orig_dir = os.getcwd()
                 if os.path.exists(self.step.options['workdir']):
@@ -681,6 +854,10 @@ class Base_Step_Executor:
         finally:
             if 'workdir' in self.step.options:
                 os.chdir(orig_dir)
+            # write records to workflow signature before results are returned
+            workflow_journal.flush()
+            stat_cache.clear()
+            stat_cache.active = cache_active
 
     def _run(self):
         '''Execute a single step and return results. The result for batch mode is the
@@ -758,7 +935,7 @@ class Base_Step_Executor:
                 args, kwargs = SoS_eval('__null_func__({})'.format(stmt), self.step.sigil)
                 # Files will be expanded differently with different running modes
                 input_files = self.expand_input_files(stmt, *args)
-                self._groups, self._vars = self.process_input_args(input_files, **kwargs)
+                num_groups, substeps = self.process_input_args(input_files, **kwargs)
             except UnknownTarget:
                 raise
             except RemovedTarget:
@@ -771,8 +948,7 @@ class Base_Step_Executor:
             input_statement_idx += 1
         else:
             # default case
-            self._groups = [env.sos_dict['input']]
-            self._vars = [{}]
+            num_groups, substeps = 1, iter([(env.sos_dict['input'], {})])
             # assuming everything starts from 0 is after input
             input_statement_idx = 0
 
@@ -781,17 +957,20 @@ class Base_Step_Executor:
         self.proc_results = []
         # run steps after input statement, which will be run multiple times for each input
         # group.
-        env.sos_dict.set('__num_groups__', len(self._groups))
+        env.sos_dict.set('__num_groups__', num_groups)
 
         self.prepare_input_loop()
 
         # determine if a single index or the whole step should be skipped
         skip_index = False
-        # signatures of each index, which can remain to be None if no output
-        # is defined.
-        signatures = [None for x in self._groups]
+        # signatures of substeps that have output defined, which are
+        # released after all substeps are completed
+        signatures = []
         try:
-            for idx, (g, v) in enumerate(zip(self._groups, self._vars)):
+            # substeps are generated one at a time so that memory usage does not
+            # grow with the number of substeps
+            for idx, (g, v) in enumerate(substeps):
+                sig = None
                 # other variables
                 env.sos_dict.update(v)
                 env.sos_dict.set('_input', g)
@@ -824,10 +1003,11 @@ class Base_Step_Executor:
                                 # ofiles can be Undetermined
                                 sg = self.step_signature(idx)
                                 if sg is not None and not isinstance(g, Undetermined):
-                                    signatures[idx] = RuntimeInfo(self.step.md5, sg, env.sos_dict['_input'],
+                                    sig = RuntimeInfo(self.step.md5, sg, env.sos_dict['_input'],
                                         env.sos_dict['_output'], env.sos_dict['_depends'], env.sos_dict['__signature_vars__'])
+                                    signatures.append(sig)
                                     if env.sig_mode == 'default':
-                                        res = signatures[idx].validate()
+                                        res = sig.validate()
                                         if res:
                                             # in this case, an Undetermined output can get real output files
                                             # from a signature
@@ -838,11 +1018,11 @@ class Base_Step_Executor:
                                             env.logger.info('Step ``{}`` (index={}) is ``ignored`` due to saved signature'.format(env.sos_dict['step_name'], idx))
                                             skip_index = True
                                     elif env.sig_mode == 'assert':
-                                        if not signatures[idx].validate():
+                                        if not sig.validate():
                                             env.logger.info('Step ``{}`` (index={}) is ``rerun`` due to signature mismatch'.format(env.sos_dict['step_name'], idx))
                                             raise RuntimeError('Signature mismatch.')
                                     elif env.sig_mode == 'construct':
-                                        if signatures[idx].write():
+                                        if sig.write():
                                             env.logger.info('Step ``{}`` (index={}) is ``ignored`` with signature constructed'.format(env.sos_dict['step_name'], idx))
                                             skip_index = True
                                 if skip_index:
@@ -867,7 +1047,7 @@ class Base_Step_Executor:
                             raise RuntimeError('Failed to process step {}: {} ({})'.format(key, value.strip(), e))
                     else:
                         try:
-                            self.execute(statement[1], signatures[idx])
+                            self.execute(statement[1], sig)
                         except AbortExecution as e:
                             if e.message:
                                 env.logger.warning(e)
@@ -879,8 +1059,8 @@ class Base_Step_Executor:
                     continue
                 # finally, tasks..
                 if not self.step.task:
-                    if signatures[idx] is not None:
-                        signatures[idx].write()
+                    if sig is not None:
+                        sig.write()
                     continue
 
                 # check if the task is active
@@ -896,7 +1076,7 @@ class Base_Step_Executor:
                         if env.sos_dict['_index'] not in allowed_index:
                             continue
                     elif isinstance(active, slice):
-                        allowed_index = list(range(env.sos_dict['__num_groups__']))[active]
+                        allowed_index = range(env.sos_dict['__num_groups__'])[active]
                         if env.sos_dict['_index'] not in allowed_index:
                             continue
                     else:
@@ -905,7 +1085,7 @@ class Base_Step_Executor:
                 self.log('task')
                 try:
                     self.prepare_runtime()
-                    self.submit_task(signatures[idx])
+                    self.submit_task(sig)
                 except Exception as e:
                     # FIXME: cannot catch exception from subprocesses
                     if env.verbosity > 2:
@@ -930,8 +1110,7 @@ class Base_Step_Executor:
                 # if output is no longer Undetermined, set it to output
                 # of each signature
                 for sig in signatures:
-                    if sig is not None:
-                        sig.set(env.sos_dict['output'], 'output')
+                    sig.set(env.sos_dict['output'], 'output')
 
             self.log('output')
             # variables defined by the shared option needs to be available to be verified
@@ -941,6 +1120,7 @@ class Base_Step_Executor:
                         if var == val:
                             continue
                         try:
+                            env.sos_dict.load_shared_values(accessed_vars(val, self.step.sigil))
                             env.sos_dict.set(var, SoS_eval(val, self.step.sigil))
                         except Exception as e:
                             raise RuntimeError('Failed to evaluate shared variable {} from expression {}: {}'
@@ -954,6 +1134,7 @@ class Base_Step_Executor:
                                 if var == val:
                                     continue
                                 try:
+                                    env.sos_dict.load_shared_values(accessed_vars(val, self.step.sigil))
                                     env.sos_dict.set(var, SoS_eval(val, self.step.sigil))
                                 except Exception as e:
                                     raise RuntimeError('Failed to evaluate shared variable {} from expression {}: {}'
@@ -964,25 +1145,24 @@ class Base_Step_Executor:
         finally:
             # release all signatures
             for sig in signatures:
-                if sig is not None:
-                    sig.release()
+                sig.release()
 
 class Queued_Step_Executor(Base_Step_Executor):
     # this class execute the step in a separate process
-    # and returns result using a queue
-    def __init__(self, step, queue):
+    # and returns result through the sending end of a pipe
+    def __init__(self, step, pipe):
         Base_Step_Executor.__init__(self, step)
-        self.queue = queue
+        self.pipe = pipe
 
     def run(self):
         try:
             notifier = ActivityNotifier('Running {}'.format(self.step.step_name()))
             res = Base_Step_Executor.run(self)
-            self.queue.put(res)
+            self.pipe.send(res)
         except Exception as e:
             if env.verbosity > 2:
                 sys.stderr.write(get_traceback())
-            self.queue.put(e)
+            self.pipe.send(e)
         finally:
             notifier.stop()
 
@@ -1015,7 +1195,7 @@ def _expand_file_list(ignore_unknown, *args):
         elif FileTarget(ifile).exists():
             tmp.append(ifile)
         else:
-            expanded = sorted(glob.glob(os.path.expanduser(ifile)))
+            expanded = sorted(glob_files(os.path.expanduser(ifile)))
             # no matching file ... but this is not a problem at the
             # inspection stage.
             #
@@ -1034,11 +1214,11 @@ def _expand_file_list(ignore_unknown, *args):
 
 class Dryrun_Step_Executor(Queued_Step_Executor):
     '''Run script in prepare mode'''
-    def __init__(self, step, queue):
+    def __init__(self, step, pipe):
         env.run_mode = 'prepare'
         if hasattr(env, 'accessed_vars'):
             delattr(env, 'accessed_vars')
-        Queued_Step_Executor.__init__(self, step, queue)
+        Queued_Step_Executor.__init__(self, step, pipe)
 
     def log(self, stage=0, msg=None):
         if stage == 'start':
@@ -1079,11 +1259,11 @@ class Dryrun_Step_Executor(Queued_Step_Executor):
 
 class SP_Step_Executor(Queued_Step_Executor):
     '''Single process step executor'''
-    def __init__(self, step, queue):
+    def __init__(self, step, pipe):
         env.run_mode = 'run'
         if hasattr(env, 'accessed_vars'):
             delattr(env, 'accessed_vars')
-        Queued_Step_Executor.__init__(self, step, queue)
+        Queued_Step_Executor.__init__(self, step, pipe)
 
     def verify_input(self):
         # now, if we are actually going to run the script, we
@@ -1152,6 +1332,8 @@ class SP_Step_Executor(Queued_Step_Executor):
         env.sos_dict.set('output', self.expand_output_files('', *args))
 
     def verify_output(self):
+        # output files have been changed by the step
+        stat_cache.clear()
         if env.sos_dict['output'] is None:
             return
         if isinstance(env.sos_dict['output'], Undetermined):
@@ -1167,18 +1349,53 @@ class SP_Step_Executor(Queued_Step_Executor):
 
 
 class MP_Step_Executor(SP_Step_Executor):
-    def __init__(self, step, queue):
-        SP_Step_Executor.__init__(self, step, queue)
+    def __init__(self, step, pipe):
+        SP_Step_Executor.__init__(self, step, pipe)
+        self.task_tag = None
+        self.num_pooled_tasks = 0
+        # a pool forked from the step process, which executes tasks that use
+        # variables that cannot be passed to the task pool (e.g. local functions)
         self.pool = None
+        # pickled values of variables that are not changed across substeps
+        self._pickled_vars = {}
+
+    def _task_vars(self):
+        '''Return pickled values of variables that are passed to a task executed
+        by the task pool, and names of variables that cannot be pickled. All
+        variables of the step are passed except for those that are defined by
+        workers, namely definitions of sos.runtime and the global section.'''
+        import sos.runtime
+        if self.step.global_def:
+            defined = accessed_vars(self.step.global_def, self.step.global_sigil)
+        else:
+            defined = set()
+        selected = {k for k, v in env.sos_dict.items() if k != '__builtins__' and
+            k not in defined and getattr(sos.runtime, k, None) is not v}
+        selected |= env.sos_dict['__signature_vars__'] | {'_input', '_output', '_depends',
+            'input', 'output', 'depends', '_index', '_runtime', '__workflow_sig__',
+            '__workflow_run__', 'step_name', '__step_context__', '__num_groups__'}
+        pickled = env.sos_dict.pickle_selected_vars(selected, self._pickled_vars, warn=False)
+        unpicklable = {k for k in selected - pickled.keys() - defined if k in env.sos_dict and
+            not isinstance(env.sos_dict.get(k), (types.ModuleType, WorkflowDict))}
+        return pickled, unpicklable
 
     def submit_task(self, signature):
-        # if concurrent is set, create a pool object
-        import multiprocessing as mp
-        if self.pool is None and env.max_jobs > 1 and len(self._groups) > 1 and \
+        # if concurrent is set, submit tasks to the task pool of the workflow
+        if env.task_pool is not None and env.max_jobs > 1 and env.sos_dict['__num_groups__'] > 1 and \
             'concurrent' in env.sos_dict['_runtime'] and env.sos_dict['_runtime']['concurrent']:
-            self.pool = mp.Pool(min(env.max_jobs, len(self._groups)))
-
-        if self.pool:
+            pickled, unpicklable = self._task_vars()
+            if unpicklable:
+                # tasks are executed by processes forked from the step process,
+                # which have all variables of the step
+                if self.pool is None:
+                    env.logger.debug('Tasks of step {} are not executed by the task pool because of variables {} that cannot be pickled'
+                        .format(self.step.step_name(), ', '.join(sorted(unpicklable))))
+                    self.pool = mp.Pool(min(env.max_jobs, env.sos_dict['__num_groups__']))
+                sos_dict = env.sos_dict.clone_selected_vars(env.sos_dict['__signature_vars__'] \
+                    | {'_input', '_output', '_depends', 'input', 'output', 'depends', '_index',
+                    '_runtime', '__workflow_sig__', '__workflow_run__'})
+            else:
+                sos_dict = PickledVars(pickled)
             param = TaskParams(
                 name = '{} (index={})'.format(self.step.step_name(), env.sos_dict['_index']),
                 data = (
@@ -1187,19 +1404,27 @@ class MP_Step_Executor(SP_Step_Executor):
                     self.step.global_sigil,
                     # if pool, it must not be in prepare mode and have
                     # __signature_vars__
-                    env.sos_dict.clone_selected_vars(env.sos_dict['__signature_vars__'] \
-                        | {'_input', '_output', '_depends', 'input', 'output', 'depends', '_index',
-                        '_runtime', '__workflow_sig__'}),
+                    # variables are pickled only once and are unpickled by the worker
+                    sos_dict,
                     signature,
                     self.step.sigil
                 ))
-
-            self.proc_results.append(
-                self.pool.apply_async(
-                    execute_task,            # function
-                        (param, )
-                    )
-            )
+            if unpicklable:
+                self.proc_results.append(self.pool.apply_async(execute_task, (param, )))
+                return
+            if self.task_tag is None:
+                # a unique (random 63-bit) tag that distinguishes tasks of this
+                # step from tasks of other steps, including steps executed by
+                # processes with the same pid
+                self.task_tag = uuid.uuid4().int >> 65
+            # limit the number of tasks in flight so that substeps are not
+            # generated faster than they can be executed
+            while self.num_pooled_tasks >= 2 * env.max_jobs:
+                self.collect_results(1)
+            env.task_pool.submit(self.task_tag, len(self.proc_results), param)
+            # placeholder of result, which is filled by collect_results
+            self.proc_results.append(None)
+            self.num_pooled_tasks += 1
         else:
             param = TaskParams(
                 name = '{} (index={})'.format(self.step.step_name(), env.sos_dict['_index']),
@@ -1218,12 +1443,11 @@ class MP_Step_Executor(SP_Step_Executor):
                     param
                 ))
 
-    def wait_for_results(self):
-        from multiprocessing.pool import AsyncResult
-        if self.pool is None:
-            return
+    def collect_results(self, num_results):
         try:
-            self.proc_results = [res.get() if isinstance(res, AsyncResult) else res for res in self.proc_results]
+            for idx, res in env.task_pool.collect(self.task_tag, num_results):
+                self.proc_results[idx] = res
+                self.num_pooled_tasks -= 1
         except KeyboardInterrupt:
             # if keyboard interrupt
             raise RuntimeError('KeyboardInterrupt fro m {} (master)'.format(os.getpid()))
@@ -1231,11 +1455,18 @@ class MP_Step_Executor(SP_Step_Executor):
             # if keyboard interrupt etc
             env.logger.error('Caught {}'.format(e))
             raise
-        finally:
-            # finally, write results back to the master process
-            self.pool.terminate()
-            self.pool.close()
-            self.pool.join()
+
+    def wait_for_results(self):
+        if self.num_pooled_tasks > 0:
+            self.collect_results(self.num_pooled_tasks)
+        if self.pool is not None:
+            from multiprocessing.pool import AsyncResult
+            try:
+                self.proc_results = [res.get() if isinstance(res, AsyncResult) else res for res in self.proc_results]
+            finally:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
 
     def log(self, stage=None, msg=None):
         if stage == 'start':
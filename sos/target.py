@@ -21,12 +21,16 @@
 #
 import os
 import sys
+import mmap
+import stat
 import hashlib
 import shlex
 import shutil
-import fasteners
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 from .utils import env, Error, short_repr
 from .sos_eval import Undetermined
+from .signatures import signature_store, default_signature_store, workflow_journal
 
 __all__ = ['dynamic', 'executable', 'env_variable', 'sos_variable']
 
@@ -66,39 +70,146 @@ def fileMD5(filename, partial=True):
     of the file for large files. This should signicicantly reduce
     the time spent on the creation and comparison of file signature
     when dealing with large bioinformat ics datasets. '''
-    filesize = os.path.getsize(filename)
-    # calculate md5 for specified file
-    md5 = hashlib.md5()
-    block_size = 2**20  # buffer of 1M
     try:
-        # 2**24 = 16M
-        if (not partial) or filesize < 2**24:
-            with open(filename, 'rb') as f:
-                while True:
-                    data = f.read(block_size)
-                    if not data:
-                        break
-                    md5.update(data)
-        else:
-            count = 16
-            # otherwise, use the first and last 32M
-            with open(filename, 'rb') as f:
-                while True:
-                    data = f.read(block_size)
-                    count -= 1
-                    if count == 8:
-                        # 2**23 = 8M
-                        f.seek(-2**23, 2)
-                    if not data or count == 0:
-                        break
-                    md5.update(data)
+        return fileDigest(filename, 'md5', partial)
     except IOError as e:
         sys.exit('Failed to read {}: {}'.format(filename, e))
-    return md5.hexdigest()
+
+#
+# algorithms that can be used for file signatures. Digests of algorithms other
+# than md5 are saved with the name of algorithm (e.g. blake2b:0a3f...) so that
+# signatures saved with different algorithms can be validated.
+#
+hash_algorithms = ('md5', 'sha1', 'sha256', 'blake2b', 'xxh64', 'xxh3_64', 'xxh128')
+
+def _hasher(algorithm):
+    if algorithm in ('md5', 'sha1', 'sha256', 'blake2b'):
+        return hashlib.new(algorithm)
+    elif algorithm in hash_algorithms:
+        try:
+            import xxhash
+        except ImportError:
+            raise RuntimeError('Module xxhash is required to use hash algorithm {}'.format(algorithm))
+        return getattr(xxhash, algorithm)()
+    else:
+        raise ValueError('Unsupported hash algorithm {}, which should be one of {}'
+            .format(algorithm, ', '.join(hash_algorithms)))
+
+def digest_algorithm(digest):
+    '''Return the algorithm with which a saved digest was calculated'''
+    return digest.split(':', 1)[0] if ':' in digest else 'md5'
+
+def fileDigest(filename, algorithm='md5', partial=True):
+    '''Calculate digest of a file with specified algorithm. For files larger
+    than 16M, only the first 8M and 7M before the last 1M are hashed unless
+    partial is False, which is how fileMD5 has always hashed large files.'''
+    h = _hasher(algorithm)
+    with open(filename, 'rb') as f:
+        filesize = os.fstat(f.fileno()).st_size
+        if filesize > 0:
+            # map the file to memory so that data are hashed without copying,
+            # and without holding the GIL if hashed by multiple threads
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m, memoryview(m) as data:
+                # 2**24 = 16M
+                if (not partial) or filesize < 2**24:
+                    h.update(data)
+                else:
+                    # 2**23 = 8M
+                    h.update(data[:2**23])
+                    h.update(data[filesize - 2**23 : filesize - 2**20])
+    return h.hexdigest() if algorithm == 'md5' else '{}:{}'.format(algorithm, h.hexdigest())
+
+def fileDigests(filenames, algorithm='md5', partial=True):
+    '''Calculate digests of multiple files concurrently'''
+    if len(filenames) <= 1:
+        return [fileDigest(x, algorithm, partial) for x in filenames]
+    with ThreadPoolExecutor(max_workers=min(len(filenames), os.cpu_count() or 1)) as pool:
+        return list(pool.map(lambda x: fileDigest(x, algorithm, partial), filenames))
+
+
+#
+# Status of files are checked repeatedly by the DAG and steps during the execution
+# of workflows. They are cached while a workflow is executed, and the cache is
+# cleared when a step starts and when a step reports its output.
+#
+class StatCache:
+    '''A cache of os.stat of files. If more than one file under a directory
+    is checked, the directory is listed with os.scandir so that other files
+    that do not exist are identified without calling os.stat.'''
+    def __init__(self):
+        self.active = False
+        # number of os.stat calls that are saved by the cache
+        self.saved = 0
+        self.clear()
+
+    def clear(self):
+        self._stats = {}
+        # number of checked files under directories, or listings of directories
+        self._dirs = {}
+
+    def start(self):
+        '''Start caching status of files for the execution of a workflow'''
+        self.clear()
+        self.saved = 0
+        self.active = True
+
+    def stop(self):
+        if self.active:
+            env.logger.debug('{} stat calls saved by cached status of files'.format(self.saved))
+        self.active = False
+        self.clear()
+
+    def invalidate(self, filename):
+        '''Remove cached status of a file that has been changed'''
+        path = os.path.abspath(filename)
+        self._stats.pop(path, None)
+        self._dirs.pop(os.path.dirname(path), None)
+
+    def stat(self, filename):
+        '''Return os.stat of filename, or None if it does not exist'''
+        if not self.active:
+            try:
+                return os.stat(filename)
+            except OSError:
+                return None
+        path = os.path.abspath(filename)
+        if path in self._stats:
+            self.saved += 1
+            return self._stats[path]
+        dirname, name = os.path.split(path)
+        listing = self._dirs.get(dirname, 0)
+        if listing == 1:
+            # list the directory when the second file under it is checked
+            try:
+                with os.scandir(dirname) as it:
+                    listing = {x.name: x for x in it}
+            except OSError:
+                listing = None
+            self._dirs[dirname] = listing
+        elif listing == 0:
+            self._dirs[dirname] = 1
+        if isinstance(listing, dict) and name not in listing:
+            self.saved += 1
+            st = None
+        else:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+        self._stats[path] = st
+        return st
+
+    def isfile(self, filename):
+        st = self.stat(filename)
+        return st is not None and stat.S_ISREG(st.st_mode)
+
+stat_cache = StatCache()
 
 
 class BaseTarget:
     '''A base class for all targets (e.g. a file)'''
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -108,120 +219,214 @@ class BaseTarget:
     def sig_file(self):
         raise RuntimeError('Undefined base function')
 
+#
+# Paths of file targets are shared by all targets of the same file so that
+# absolute paths and paths of signatures are calculated only once for each
+# file.
+#
+class _FilePath:
+    '''Filename, expanded name, interned absolute path and path of signature
+    of a file'''
+    __slots__ = ('filename', 'fullname', 'abspath', 'sig_file')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fullname = os.path.expanduser(filename)
+        self.abspath = sys.intern(os.path.abspath(self.fullname))
+        self.sig_file = None
+
+# shared paths keyed by working directory (empty for absolute filenames) and
+# filename, which are cleared for each run and when env.exec_dir is changed
+# because paths of signatures depend on env.exec_dir
+_file_paths = {}
+_file_paths_exec_dir = None
+
+def clear_file_paths():
+    '''Remove shared paths of files, which are used only by existing targets'''
+    _file_paths.clear()
+
+def _file_path(filename):
+    global _file_paths_exec_dir
+    if _file_paths_exec_dir != env.exec_dir:
+        _file_paths.clear()
+        _file_paths_exec_dir = env.exec_dir
+    cwd = '' if filename[:1] in ('/', '~') else os.getcwd()
+    try:
+        paths = _file_paths[cwd]
+    except KeyError:
+        paths = _file_paths[cwd] = {}
+    try:
+        return paths[filename]
+    except KeyError:
+        path = paths[filename] = _FilePath(filename)
+        return path
+
 class FileTarget(BaseTarget):
     '''A regular target for files.
     '''
+    __slots__ = ('_path', '_md5', '_attachments')
+
     def __init__(self, filename):
-        self._filename = filename
-        self._sig_file = None
+        self._path = _file_path(filename)
         self._md5 = None
-        self._attachments = []
+        self._attachments = ()
 
     def exists(self, mode='any'):
-        if mode in ('any', 'target') and os.path.isfile(self.fullname()):
+        if mode in ('any', 'target') and stat_cache.isfile(self.fullname()):
             return True
-        if mode in ('any', 'signature') and os.path.isfile(self.sig_file()):
+        if mode in ('any', 'signature') and signature_store().exists(self.sig_file()):
             return True
         return False
 
     def add(self, filename):
         '''add related files to the same signature'''
+        if not self._attachments:
+            self._attachments = []
         self._attachments.append(os.path.abspath(os.path.expanduser(filename)))
 
     def remove(self, mode='both'):
         if mode in ('both', 'target') and os.path.isfile(self.fullname()):
             os.remove(self.fullname())
-        if mode in ('both', 'signature') and os.path.isfile(self.sig_file()):
-            os.remove(self.sig_file())
+            stat_cache.invalidate(self.fullname())
+        if mode in ('both', 'signature'):
+            signature_store().remove(self.sig_file())
 
     def fullname(self):
-        return os.path.expanduser(self._filename)
+        return self._path.fullname
+
+    def _sig_line(self):
+        '''Return the first line of signature with fields name, mtime, size and md5'''
+        sig = signature_store().get(self.sig_file())
+        if sig is None:
+            raise RuntimeError('{} or its signature does not exist.'.format(self._path.filename))
+        return sig.split('\n', 1)[0].rsplit('\t', 3)
 
     def size(self):
-        if os.path.isfile(self._filename):
-            return os.path.getsize(self.fullname())
-        elif os.path.isfile(self.sig_file()):
-            with open(self.sig_file()) as md5:
-                line = md5.readline()
-                _, _, s, _ = line.rsplit('\t', 3)
-                return s.strip()
+        st = stat_cache.stat(self.fullname())
+        if st is not None and stat.S_ISREG(st.st_mode):
+            return st.st_size
         else:
-            raise RuntimeError('{} or its signature does not exist.'.format(self._filename))
+            return self._sig_line()[2].strip()
 
     def mtime(self):
-        if os.path.isfile(self._filename):
-            return os.path.getmtime(self.fullname())
-        elif os.path.isfile(self.sig_file()):
-            with open(self.sig_file()) as md5:
-                line = md5.readline()
-                _, t, _, _ = line.rsplit('\t', 3)
-                return t.strip()
+        st = stat_cache.stat(self.fullname())
+        if st is not None and stat.S_ISREG(st.st_mode):
+            return st.st_mtime
         else:
-            raise RuntimeError('{} or its signature does not exist.'.format(self._filename))
+            return self._sig_line()[1].strip()
 
     def sig_file(self):
-        if self._sig_file is not None:
-            return self._sig_file
+        if self._path.sig_file is not None:
+            return self._path.sig_file
         # If the output path is outside of the current working directory
-        fullname = os.path.abspath(self.fullname())
+        fullname = self._path.abspath
         name_md5 = textMD5(fullname)
-        rel_path = os.path.relpath(fullname, env.exec_dir)
 
         # if this file is not relative to cache, use global signature file
-        if rel_path.startswith('../'):
-            self._sig_file = os.path.join(os.path.expanduser('~'), '.sos', '.runtime',
+        if not (fullname + os.sep).startswith(os.path.join(os.path.abspath(env.exec_dir), '')):
+            self._path.sig_file = os.path.join(os.path.expanduser('~'), '.sos', '.runtime',
                 name_md5 + '.file_info')
         else:
             # if this file is relative to cache, use local directory
-            self._sig_file = os.path.join('.sos', '.runtime', name_md5 + '.file_info')
-        return self._sig_file
+            self._path.sig_file = os.path.join('.sos', '.runtime', name_md5 + '.file_info')
+        return self._path.sig_file
 
     def __eq__(self, other):
-        return os.path.abspath(self.fullname()) == os.path.abspath(other.fullname())
+        if not isinstance(other, FileTarget):
+            return NotImplemented
+        # absolute paths are interned
+        return self._path.abspath is other._path.abspath
+
+    def __hash__(self):
+        # hash of str is cached by python
+        return hash(self._path.abspath)
+
+    def __reduce__(self):
+        # the path is shared with other targets of the unpickling process
+        return (FileTarget, (self._path.filename,), (self._md5, self._attachments))
+
+    def __setstate__(self, state):
+        self._md5, self._attachments = state
+
+    def _stat_line(self, st):
+        return '# stat\t{}\t{}\t{}'.format(st.st_mtime_ns, st.st_size, st.st_ino)
 
     def write_sig(self):
-        '''Write .file_info file with signature'''
-        # path to file
-        with open(self.sig_file(), 'w') as md5:
-            self.calc_md5()
-            md5.write('{}\t{}\t{}\t{}\n'.format(self.fullname(), os.path.getmtime(self.fullname()),
-                os.path.getsize(self.fullname()), self.md5()))
-            for f in self._attachments:
-                md5.write('{}\t{}\n'.format(f, fileMD5(f)))
+        '''Write .file_info signature'''
+        if env.sig_check == 'fast' and not self._attachments and self.validate_stat():
+            # the existing signature is up to date
+            return
+        self.calc_md5()
+        st = os.stat(self.fullname())
+        md5 = StringIO()
+        md5.write('{}\t{}\t{}\t{}\n'.format(self.fullname(), st.st_mtime,
+            st.st_size, self.md5()))
+        for f in self._attachments:
+            md5.write('{}\t{}\n'.format(f, fileDigest(f, env.sig_hash)))
+        # size, modification time and inode for the fast validation of signature
+        md5.write(self._stat_line(st) + '\n')
+        signature_store().set(self.sig_file(), md5.getvalue())
+        # the file exists, which might have been created after its directory was listed
+        stat_cache.invalidate(self.fullname())
+
+    def validate_stat(self):
+        '''Check if size, modification time and inode of the file match those
+        recorded in its signature, in which case the MD5 from the signature
+        is used without reading the file.'''
+        sig = signature_store().get(self.sig_file())
+        if sig is None:
+            return False
+        for line in sig.splitlines():
+            if line.startswith('# stat\t'):
+                try:
+                    st = os.stat(self.fullname())
+                except OSError:
+                    return False
+                if line != self._stat_line(st):
+                    return False
+                self._md5 = sig.split('\n', 1)[0].rsplit('\t', 1)[-1].strip()
+                return True
+        # signatures written by previous versions of SoS
+        return False
 
-    def calc_md5(self):
-        if self._md5 is None:
-            self._md5 = fileMD5(self.fullname())
+    def calc_md5(self, algorithm=None):
+        '''Return digest of the file, calculated with specified algorithm or
+        env.sig_hash'''
+        if algorithm is None:
+            algorithm = env.sig_hash
+        if self._md5 is None or digest_algorithm(self._md5) != algorithm:
+            self._md5 = fileDigest(self.fullname(), algorithm)
         return self._md5
 
     def md5(self):
         '''Return md5'''
         if self._md5 is not None:
             return self._md5
-        if not os.path.isfile(self.sig_file()):
+        if not signature_store().exists(self.sig_file()):
             return self.calc_md5()
         else:
-            with open(self.sig_file()) as md5:
-                line = md5.readline()
-                _, _, _, m = line.rsplit('\t', 3)
-                return m.strip()
+            return self._sig_line()[3].strip()
 
     def validate(self):
         '''Check if file matches its signature'''
-        if not os.path.isfile(self.sig_file()):
+        sig = signature_store().get(self.sig_file())
+        if sig is None:
             return False
-        with open(self.sig_file()) as md5:
-            for line in md5:
-                f, _, _, m = line.rsplit('\t', 3)
-                if not os.path.isfile(f):
-                    return False
-                if fileMD5(f) != m.strip():
-                    env.logger.debug('MD5 mismatch {}'.format(f))
-                    return False
+        if env.sig_check == 'fast' and not self._attachments and self.validate_stat():
+            return True
+        for line in sig.splitlines():
+            if line.startswith('#'):
+                continue
+            f, m = line.split('\t', 1)[0], line.rsplit('\t', 1)[-1]
+            if not stat_cache.isfile(f):
+                return False
+            if fileDigest(f, digest_algorithm(m.strip())) != m.strip():
+                env.logger.debug('MD5 mismatch {}'.format(f))
+                return False
         return True
 
     def __repr__(self):
-        return self._filename
+        return self._path.filename
 
 class dynamic(BaseTarget):
     '''A dynamic executable that only handles input files when
@@ -273,7 +478,7 @@ class executable(BaseTarget):
             else:
                 self._available_commands.add((self._cmd, self._version))
                 return True
-        if mode in ('any', 'signature') and os.path.isfile(self.sig_file):
+        if mode in ('any', 'signature') and signature_store().exists(self.sig_file):
             return True
         return False
 
@@ -297,9 +502,7 @@ class executable(BaseTarget):
 
     def write_sig(self):
         '''Write .sig file with signature'''
-        # path to file
-        with open(self.sig_file, 'w') as md5:
-            md5.write('{}\t{}\n'.format(self.fullname(), self.md5()))
+        signature_store().set(self.sig_file, '{}\t{}\n'.format(self.fullname(), self.md5()))
 
     def __hash__(self):
         return hash(repr(self))
@@ -417,9 +620,13 @@ class RuntimeInfo:
         # path to file
         self.proc_info = '{}.exe_info'.format(info_file)
 
-        # we will need to lock on a file that we do not really write to
-        # otherwise the lock will be broken when we write to it.
-        self.lock = fasteners.InterProcessLock(self.proc_info + '_')
+        # signature options of the workflow, which are passed along with the
+        # signature to processes (e.g. RQ or Celery workers) that execute tasks
+        self.sig_options = (env.sig_store if env.sig_store is not None else default_signature_store(),
+            env.sig_check, env.sig_hash)
+        # lock the signature through the signature store, which locks a file
+        # that we do not really write to so that it is not broken by writes.
+        self.lock = signature_store(self.sig_options[0]).lock(self.proc_info)
         if not self.lock.acquire(blocking=False):
             raise UnavailableLock((self.output_files, self.proc_info))
         else:
@@ -432,7 +639,8 @@ class RuntimeInfo:
                 'output_files': self.output_files,
                 'dependent_files': self.dependent_files,
                 'signature_vars': self.signature_vars,
-                'script': self.script}
+                'script': self.script,
+                'sig_options': self.sig_options}
 
     def __setstate__(self, dict):
         self.step_md5 = dict['step_md5']
@@ -442,6 +650,7 @@ class RuntimeInfo:
         self.dependent_files = dict['dependent_files']
         self.signature_vars = dict['signature_vars']
         self.script = dict['script']
+        self.sig_options = dict['sig_options']
 
     def release(self):
         self.lock.release()
@@ -457,13 +666,29 @@ class RuntimeInfo:
         else:
             raise RuntimeError('Invalid signature file type {}'.format(file_type))
 
+    def _calc_digests(self, targets):
+        '''Calculate digests of file targets concurrently, skipping files with
+        up to date signatures if signatures are checked with file stat.'''
+        targets = [x for x in targets if (x._md5 is None or digest_algorithm(x._md5) != env.sig_hash)
+            and not (env.sig_check == 'fast' and not x._attachments and x.validate_stat())]
+        if len(targets) > 1:
+            for t, digest in zip(targets, fileDigests([x.fullname() for x in targets], env.sig_hash)):
+                t._md5 = digest
+
     def write(self):
         '''Write signature file with signature of script, input, output and dependent files.'''
         if isinstance(self.output_files, Undetermined) or isinstance(self.dependent_files, Undetermined):
             env.logger.trace('Write signature failed due to undetermined files')
             return False
         env.logger.trace('Write signature {}'.format(self.proc_info))
-        with open(self.proc_info, 'w') as md5:
+        # output files have just been produced by the step
+        stat_cache.clear()
+        self._calc_digests([x for x in self.input_files + self.output_files + self.dependent_files
+            if isinstance(x, FileTarget) and x.exists('target')])
+        store = signature_store()
+        md5 = StringIO()
+        # signatures of files and the step are written in one transaction
+        with store.batch():
             md5.write('{}\n'.format(textMD5(self.script)))
             md5.write('# input\n')
             for f in self.input_files:
@@ -506,25 +731,52 @@ class RuntimeInfo:
                         env.logger.debug('Variable {} of value {} is ignored from step signature'.format(var, value))
             md5.write('# step process\n')
             md5.write(self.script)
+            store.set(self.proc_info, md5.getvalue())
         # successfully write signature, write in workflow runtime info
-        workflow_sig = env.sos_dict['__workflow_sig__']
-        with fasteners.InterProcessLock(workflow_sig + '_'):
-            with open(workflow_sig, 'a') as wf:
-                wf.write('EXE_SIG\tstep={}\tsession={}\n'.format(self.step_md5, os.path.basename(self.proc_info).split('.')[0]))
-                for f in self.input_files:
-                    if isinstance(f, FileTarget):
-                        wf.write('IN_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
-                for f in self.dependent_files:
-                    if isinstance(f, FileTarget):
-                        wf.write('IN_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
-                for f in self.output_files:
-                    if isinstance(f, FileTarget):
-                        wf.write('OUT_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
+        # workflow runtime info is buffered and merged to workflow signature later
+        records = ['EXE_SIG\tstep={}\tsession={}\n'.format(self.step_md5, os.path.basename(self.proc_info).split('.')[0])]
+        for f in self.input_files:
+            if isinstance(f, FileTarget):
+                records.append('IN_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
+        for f in self.dependent_files:
+            if isinstance(f, FileTarget):
+                records.append('IN_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
+        for f in self.output_files:
+            if isinstance(f, FileTarget):
+                records.append('OUT_FILE\tfilename={}\tsession={}\tsize={}\tmd5={}\n'.format(f, self.step_md5, f.size(), f.md5()))
+        workflow_journal.append(env.sos_dict['__workflow_sig__'], ''.join(records))
         return True
 
+    def _saved_file_digests(self, sig):
+        '''Calculate digests of files listed in signature concurrently, with
+        algorithms of saved digests. Returns a dictionary with (filename, saved
+        digest) as keys.'''
+        files = {}
+        for line in sig.split('# context\n', 1)[0].splitlines()[1:]:
+            if line.startswith('#') or '\t' not in line:
+                continue
+            f, m = line.rsplit('\t', 1)
+            if ('(' in f and ')' in f) or not os.path.isfile(os.path.expanduser(f)):
+                continue
+            if env.sig_check == 'fast' and FileTarget(f).validate_stat():
+                continue
+            files.setdefault(digest_algorithm(m.strip()), []).append((f, m.strip()))
+        digests = {}
+        for algorithm, items in files.items():
+            if len(items) < 2:
+                continue
+            try:
+                for item, digest in zip(items, fileDigests([os.path.expanduser(x[0]) for x in items], algorithm)):
+                    digests[item] = digest
+            except Exception as e:
+                # files will be checked one by one
+                env.logger.debug('Failed to calculate digests of files: {}'.format(e))
+        return digests
+
     def validate(self):
         '''Check if ofiles and ifiles match signatures recorded in md5file'''
-        if not self.proc_info or not os.path.isfile(self.proc_info):
+        sig = signature_store().get(self.proc_info) if self.proc_info else None
+        if sig is None:
             env.logger.trace('Fail because of no signature file {}'.format(self.proc_info))
             return False
         env.logger.trace('Validating {}'.format(self.proc_info))
@@ -546,9 +798,10 @@ class RuntimeInfo:
                     return False
         #
         files_checked = {x.fullname():False for x in sig_files if not isinstance(x, Undetermined)}
+        digests = self._saved_file_digests(sig)
         res = {'input': [], 'output': [], 'depends': [], 'vars': {}}
         cur_type = 'input'
-        with open(self.proc_info) as md5:
+        with StringIO(sig) as md5:
             cmdMD5 = md5.readline().strip()   # command
             if textMD5(self.script) != cmdMD5:
                 env.logger.trace('Fail because of command change')
@@ -584,7 +837,14 @@ class RuntimeInfo:
                     else:
                         freal = FileTarget(f)
                     if freal.exists('target'):
-                        fmd5 = freal.calc_md5()
+                        if not isinstance(freal, FileTarget):
+                            fmd5 = freal.calc_md5()
+                        elif env.sig_check == 'fast' and freal.validate_stat():
+                            fmd5 = freal.md5()
+                        elif (f, m.strip()) in digests:
+                            fmd5 = digests[(f, m.strip())]
+                        else:
+                            fmd5 = freal.calc_md5(digest_algorithm(m.strip()))
                     elif freal.exists('signature'):
                         env.logger.info('Validate with signature of non-existing target {}'.format(freal))
                         fmd5 = freal.md5()
@@ -605,9 +865,6 @@ class RuntimeInfo:
             return False
         env.logger.trace('Signature matches and returns {}'.format(res))
         # validation success, record signature used
-        workflow_sig = env.sos_dict['__workflow_sig__']
-        with fasteners.InterProcessLock(workflow_sig + '_'):
-            with open(workflow_sig, 'a') as wf:
-                wf.write(self.proc_info + '\n')
+        workflow_journal.append(env.sos_dict['__workflow_sig__'], self.proc_info + '\n')
         return res
 
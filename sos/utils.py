@@ -33,6 +33,7 @@ import collections
 import traceback
 import threading
 import pickle
+import mmap
 import yaml
 import urllib
 import urllib.parse
@@ -202,7 +203,11 @@ class WorkflowDict(object):
         return getattr(self._dict, attr)
 
     def __getitem__(self, key):
-        return self._dict[key]
+        value = self._dict[key]
+        if isinstance(value, SharedValue):
+            # values shared by steps through files are loaded when they are used
+            value = self._dict[key] = value.load()
+        return value
 
     def __setitem__(self, key, value):
         '''Set value to key, trigger logging and warning messages if needed'''
@@ -260,7 +265,45 @@ class WorkflowDict(object):
             env.logger.warning('{}: Variables with leading underscore is reserved for SoS temporary variables.'.format(key))
 
     def clone_selected_vars(self, selected):
-        return {x:copy.deepcopy(y) for x,y in self._dict.items() if x in selected and pickleable(y)}
+        return PickledVars(self.pickle_selected_vars(selected)).load()
+
+    # variables of steps that are set by SoS and are not changed in place
+    _step_vars = {'input', 'output', 'depends'}
+
+    def pickle_selected_vars(self, selected, cache=None, warn=True):
+        '''Return a dictionary of pickled values of selected variables, skipping
+        values that cannot be pickled (with a warning if warn is True). Pickled
+        values of variables that are not changed (e.g. by substeps of the same
+        step) are saved to and reused from cache, which is a dictionary of names
+        to (value, pickled value).'''
+        res = {}
+        for key, value in self._dict.items():
+            if key not in selected or isinstance(value, (types.ModuleType, WorkflowDict)):
+                continue
+            if cache is not None and key in cache and cache[key][0] is value:
+                if cache[key][1] is not None:
+                    res[key] = cache[key][1]
+                continue
+            try:
+                pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                if warn:
+                    env.logger.warning('Object {} is not passed because it is not pickleable'.format(short_repr(value)))
+                pickled = None
+            # unpickleable values are also recorded so that they are reported only once
+            if cache is not None and (pickled is None or key in self._step_vars or immutable(value)):
+                cache[key] = (value, pickled)
+            if pickled is not None:
+                res[key] = pickled
+        return res
+
+    def load_shared_values(self, names):
+        '''Replace values of variables in names that are shared by steps through
+        files with values loaded from the files. Other shared values are loaded
+        when they are accessed.'''
+        for key in names & self._dict.keys():
+            if isinstance(self._dict[key], SharedValue):
+                self._dict[key] = self._dict[key].load()
 
 #
 # Runtime environment
@@ -307,6 +350,30 @@ class RuntimeEnvironments(object):
         # construct            (reconstruct signature from existing output files)
         self.sig_mode = 'default'
         #
+        # signature store that saves runtime signatures, which can be 'file'
+        # (one file per signature), 'sqlite' (a database under .sos), or stores
+        # defined by entry point sos_signature_stores. If unset (None), it is
+        # set by configuration sig_store or determined by default_signature_store
+        self.sig_store = None
+        #
+        # validation of file signatures, which can be
+        #
+        # strict               (always compare MD5 of files)
+        # fast                 (trust saved MD5 if size, mtime and inode of files are unchanged)
+        self.sig_check = 'strict'
+        #
+        # algorithm used to calculate signatures of files
+        self.sig_hash = 'md5'
+        #
+        # cache listings of directories for glob_wildcards and expansion of
+        # wildcard filenames (config listing_cache)
+        self.listing_cache = False
+        #
+        # save DAGs of workflows in .sos and reuse them if the workflow,
+        # command line options, configuration and dependent targets are
+        # unchanged (config dag_cache)
+        self.dag_cache = False
+        #
         # global dictionaries used by SoS during the
         # execution of SoS workflows
         self.sos_dict = WorkflowDict()
@@ -318,6 +385,15 @@ class RuntimeEnvironments(object):
         # maximum number of concurrent jobs
         self.max_jobs = 1
         self.running_jobs = 0
+        # execute steps in max_jobs long-lived worker processes instead of
+        # in a new process for each step
+        self.worker_pool = False
+        # resume the execution of a workflow from its checkpoint, which is
+        # saved by MP_Executor
+        self.resume = False
+        # pool of processes that execute concurrent tasks of all steps of
+        # a workflow, which is created by MP_Executor
+        self.task_pool = None
         # this directory will be used by a lot of processes
         self.exec_dir = os.getcwd()
         if not os.path.isdir('.sos/.runtime'):
@@ -539,6 +615,30 @@ def get_traceback():
     #print "*** tb_lineno:", exc_traceback.tb_lineno
 
 
+def immutable(obj):
+    '''Test if obj is an immutable object, which cannot be changed in place'''
+    if obj is None or isinstance(obj, (str, bool, int, float, complex, bytes)):
+        return True
+    if isinstance(obj, (tuple, frozenset)):
+        return all(immutable(x) for x in obj)
+    return False
+
+def _load_pickled_vars(pickled):
+    return {x: pickle.loads(y) for x, y in pickled.items()}
+
+class PickledVars(object):
+    '''Pickled values of variables that are sent to other processes (e.g. with
+    tasks). Pickled values are not pickled again, and are unpickled to a
+    dictionary of variables when this object is unpickled.'''
+    def __init__(self, pickled):
+        self.pickled = pickled
+
+    def load(self):
+        return _load_pickled_vars(self.pickled)
+
+    def __reduce__(self):
+        return (_load_pickled_vars, (self.pickled,))
+
 def pickleable(obj):
     if isinstance(obj, (str, bool, int, float, complex, bytes)):
         return True
@@ -551,6 +651,79 @@ def pickleable(obj):
         env.logger.warning('Object {} is not passed because it is not pickleable'.format(short_repr(obj)))
         return False
 
+class SharedValue(object):
+    '''A large value (bytes, numpy array, pandas DataFrame etc) shared by a step.
+    The value is saved to a file under .sos and only the name of the file is
+    passed to other processes. Data of numpy arrays, including arrays in pandas
+    objects, is mapped to memory instead of being copied when the value is loaded.'''
+    # values with less data are copied and passed directly
+    THRESHOLD = 2**20
+    # offsets of data in the file, which are aligned for numpy arrays
+    ALIGNMENT = 64
+
+    def __init__(self, filename, size, buffers):
+        self.filename = filename
+        # size of pickled value, or type of value (bytes or bytearray) that is
+        # saved as it is, and offsets and lengths of buffers (data of arrays)
+        # that are saved after the pickled value
+        self.size = size
+        self.buffers = buffers
+
+    def __deepcopy__(self, memo):
+        # the file is not changed after it is written so it can be shared
+        return self
+
+    def __repr__(self):
+        return 'SharedValue({})'.format(self.filename)
+
+    @classmethod
+    def save(cls, value, filename):
+        '''Save value to filename and return a SharedValue, or None if value
+        does not have enough data to be shared through a file.'''
+        if isinstance(value, (bytes, bytearray)):
+            data = None
+            buffers = [pickle.PickleBuffer(value)]
+        elif type(value).__module__.split('.')[0] in ('numpy', 'pandas'):
+            # data of arrays are not copied to pickled value but are passed to buffer_callback
+            buffers = []
+            data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+        else:
+            return None
+        buffers = [x.raw() for x in buffers]
+        if sum(x.nbytes for x in buffers) < cls.THRESHOLD:
+            return None
+        offsets = []
+        with open(filename + '.tmp', 'wb') as shared:
+            if data is not None:
+                shared.write(data)
+            for buf in buffers:
+                shared.write(b'\0' * (-shared.tell() % cls.ALIGNMENT))
+                offsets.append((shared.tell(), buf.nbytes))
+                shared.write(buf)
+        os.replace(filename + '.tmp', filename)
+        return cls(filename, type(value) if data is None else len(data), offsets)
+
+    def load(self):
+        '''Load value from the file'''
+        with open(self.filename, 'rb') as shared:
+            if self.size is bytes:
+                shared.seek(self.buffers[0][0])
+                return shared.read(self.buffers[0][1])
+            elif self.size is bytearray:
+                shared.seek(self.buffers[0][0])
+                value = bytearray(self.buffers[0][1])
+                shared.readinto(value)
+                return value
+            # changes to the loaded value are not written back to the file
+            data = memoryview(mmap.mmap(shared.fileno(), 0, access=mmap.ACCESS_COPY))
+        return pickle.loads(data[:self.size], buffers=[data[x:x+n] for x, n in self.buffers])
+
+def share_value(value):
+    '''Return a SharedValue if value is large enough to be shared through a file,
+    or a copy of value otherwise.'''
+    res = SharedValue.save(value, os.path.join(env.exec_dir, '.sos', '{}.shared'.format(uuid.uuid4().hex)))
+    return copy.deepcopy(value) if res is None else res
+
 class ProgressBar:
     '''A text-based progress bar, it differs from regular progress bar in that
     1. it can start from the middle with init count
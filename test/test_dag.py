@@ -31,6 +31,7 @@ from sos.sos_script import SoS_Script
 from sos.utils import env
 from sos.sos_executor import Base_Executor, MP_Executor
 from sos.target import FileTarget
+from sos.dag import SoS_DAG
 
 
 class TestDAG(unittest.TestCase):
@@ -744,6 +745,58 @@ A_2;
             FileTarget(f).remove('both')
 
 
+    def testWorkerPool(self):
+        '''Test execution of steps in a pool of long-lived workers'''
+        for f in ['a.txt', 'pid_1.txt', 'pid_2.txt', 'pid_3.txt']:
+            FileTarget(f).remove('both')
+        script = SoS_Script(r'''
+import random
+
+[A: shared='b', provides='a.txt']
+b = 1
+sh:
+    touch a.txt
+
+[B_1]
+depends: 'a.txt'
+with open('pid_1.txt', 'w') as pid:
+    pid.write(str(os.getpid()))
+
+[B_2: shared='c']
+c = b + random.randint(1, 1)
+with open('pid_2.txt', 'w') as pid:
+    pid.write(str(os.getpid()))
+
+[B_3]
+with open('pid_3.txt', 'w') as pid:
+    pid.write(str(os.getpid()))
+''')
+        wf = script.workflow('B')
+        env.max_jobs = 2
+        env.worker_pool = True
+        MP_Executor(wf).run()
+        self.assertEqual(env.sos_dict['c'], 2)
+        pids = set()
+        for f in ['pid_1.txt', 'pid_2.txt', 'pid_3.txt']:
+            with open(f) as pid:
+                pids.add(pid.read())
+            FileTarget(f).remove('both')
+        # steps are executed by at most two worker processes
+        self.assertLessEqual(len(pids), 2)
+        FileTarget('a.txt').remove('both')
+        # variables of steps are not leaked to later steps executed by the same worker
+        script = SoS_Script('''
+[C_1]
+local_var = 1
+
+[C_2: shared='leaked']
+leaked = 'local_var' in globals()
+''')
+        wf = script.workflow('C')
+        env.max_jobs = 1
+        MP_Executor(wf).run()
+        self.assertEqual(env.sos_dict['leaked'], False)
+
     def testDynamicNestedWorkflow(self):
         #
         # Because we are not sure which workflows would be executed
@@ -959,5 +1012,348 @@ sh:
         for file in ('a.vcf', 'a.bam', 'a.bam.bai'):
             FileTarget(file).remove('both')
 
+    def testNormalizedTargets(self):
+        '''Test connection of steps with different names of the same file'''
+        for f in ['A1.txt', 'A2.txt']:
+            FileTarget(f).remove('both')
+        script = SoS_Script('''
+[A_1]
+input: None
+output: 'A1.txt'
+
+[A_2]
+input: './A1.txt'
+output: 'A2.txt'
+''')
+        wf = script.workflow()
+        dag = Base_Executor(wf).initialize_dag()
+        self.assertDAG(dag,
+'''
+strict digraph "" {
+A_1;
+A_2;
+A_1 -> A_2;
+}
+''')
+        # a dependency added later is connected by the next build
+        dag.add_step('X', 'X', None, [], [], ['X.txt'],
+            context={'__signature_vars__': set(), '__environ_vars__': set(), '__changed_vars__': set()})
+        dag.add_dependency([x for x in dag.nodes() if x._node_id == 'A_1'][0], 'X.txt')
+        dag.build([])
+        self.assertEqual(sorted(['{} -> {}'.format(x, y) for x, y in dag.edges()]),
+            ['A_1 -> A_2', 'X -> A_1'])
+
+    def testReadyQueue(self):
+        '''Test the queue of executable nodes of DAG'''
+        dag = SoS_DAG()
+        for name, depends, output in [('D', [], ['D.txt']), ('A', [], ['A.txt']),
+            ('B', ['A.txt'], ['B.txt']), ('C', ['B.txt'], ['C.txt'])]:
+            dag.add_step(name, name, None, [], depends, output,
+                context={'__signature_vars__': set(), '__environ_vars__': set(), '__changed_vars__': set()})
+        dag.build([])
+        nodes = {x._node_id: x for x in dag.nodes()}
+        # nodes are by default executed in the order they are added
+        self.assertEqual(dag.find_executable()._node_id, 'D')
+        # long chains are started first with critical path priority
+        dag.set_priority('critical_path')
+        self.assertEqual(dag.find_executable()._node_id, 'A')
+        dag.set_status(nodes['A'], 'running')
+        self.assertEqual(dag.find_executable()._node_id, 'D')
+        dag.set_status(nodes['D'], 'running')
+        self.assertEqual(dag.find_executable(), None)
+        dag.set_status(nodes['A'], 'completed')
+        self.assertEqual(dag.find_executable()._node_id, 'B')
+        # regenerate A would make B wait for A again
+        dag.regenerate_target('A.txt')
+        self.assertEqual(dag.find_executable()._node_id, 'A')
+        dag.set_status(nodes['A'], 'completed')
+        dag.set_status(nodes['B'], 'completed')
+        self.assertEqual(dag.find_executable()._node_id, 'C')
+        # user-defined priority
+        dag.set_status(nodes['D'], None)
+        dag.set_priority(lambda node: 1 if node._node_id == 'D' else 0)
+        self.assertEqual(dag.find_executable()._node_id, 'D')
+
+    def testNodeLookup(self):
+        '''Test detection of duplicate nodes and lookup of nodes by UUID'''
+        dag = SoS_DAG()
+        context = {'name': 'a', '__signature_vars__': {'name', 'b'}, '__environ_vars__': {'name'},
+            '__changed_vars__': set()}
+        for i in range(2):
+            dag.add_step('A', 'A a.txt', None, [], [], ['a.txt'], context=context)
+        # context with the same items in different orders
+        dag.add_step('A', 'A a.txt', None, [], [], ['a.txt'], context={'__changed_vars__': set(),
+            '__environ_vars__': {'name'}, '__signature_vars__': {'b', 'name'}, 'name': 'a'})
+        self.assertEqual(dag.num_nodes(), 1)
+        # different names of the same target, and context of duplicate nodes is not copied
+        dag.add_step('A', 'A a.txt', None, [], [], ['./a.txt'], context={'unpicklable': lambda x: x})
+        self.assertEqual(dag.num_nodes(), 1)
+        dag.add_step('A', 'A b.txt', None, [], [], ['b.txt'], context=dict(context, name='b'))
+        self.assertEqual(dag.num_nodes(), 2)
+        # nodes have their own copies of context
+        context['name'] = 'c'
+        for node in dag.nodes():
+            self.assertTrue(dag.node_by_id(node._node_uuid) is node)
+            self.assertTrue(node._context['name'] in ('a', 'b'))
+        self.assertRaises(RuntimeError, dag.node_by_id, 'unknown')
+
+    def testProvidesIndex(self):
+        '''Test matching of targets to auxiliary steps with an index of provides'''
+        from sos.sos_executor import ProvidesIndex
+        from sos.target import sos_variable
+        script = SoS_Script('''
+[A: provides='{name}.txt']
+[B: provides=['{name}.bam', 'b.txt']]
+[C: provides='data/{name}_R{read,\\d}.fq']
+[D: provides=sos_variable('d')]
+[E: provides='e{x}.txt.gz']
+''')
+        wf = script.workflow()
+        executor = Base_Executor(wf)
+        executor.reset_dict()
+        index = ProvidesIndex(wf.auxiliary_sections)
+        for target in ['a.txt', 'b.txt', './b.txt', 'a.bam', 'data/a_R1.fq', 'data/a_Rx.fq',
+            'e1.txt.gz', 'e.txt.gz', 'unknown', sos_variable('d'), sos_variable('e')]:
+            expected = [(x, executor.match(target, x.options['provides'])) for x in wf.auxiliary_sections]
+            self.assertEqual(index.match(target), [x for x in expected if x[1] is not False])
+        self.assertEqual([(x.name, y) for x, y in index.match('b.txt')], [('A', {'name': ['b']}), ('B', True)])
+        self.assertEqual(index.match('data/a_R1.fq')[0][1], {'name': ['a'], 'read': ['1']})
+
+    def testIncrementalCycleDetection(self):
+        '''Test checking circular dependencies after the addition of edges'''
+        import random
+        random.seed(0)
+        for trial in range(20):
+            dag = SoS_DAG()
+            for i in range(30):
+                dag.add_step('uuid_{}'.format(i), 'step_{}'.format(i), None, [], [], [],
+                    {'__changed_vars__': set(), 'idx': i})
+            nodes = list(dag.nodes())
+            while True:
+                # add edges in batches of different sizes
+                for j in range(random.choice([1, 1, 5, 100])):
+                    dag.add_edge(random.choice(nodes), random.choice(nodes))
+                cycle = dag.circular_dependencies()
+                if cycle:
+                    # the cycle is made of existing edges
+                    self.assertTrue(all(dag.has_edge(*x) for x in cycle))
+                    self.assertEqual([x[1] for x in cycle], [x[0] for x in cycle[1:] + cycle[:1]])
+                    break
+                # nodes are in a topological order
+                order = [dag._topo_order[dag._ids[x]] for x in nodes]
+                self.assertTrue(all(order[nodes.index(u)] < order[nodes.index(v)] for u, v in dag.edges()))
+                self.assertEqual(sorted(order), list(range(len(nodes))))
+
+    def testCompactDAG(self):
+        '''Test edges of DAG before and after they are merged into arrays'''
+        import random
+        random.seed(1)
+        dag = SoS_DAG()
+        for i in range(50):
+            dag.add_step('uuid_{}'.format(i), 'step_{}'.format(i), None, [], [], [],
+                {'__changed_vars__': set(), 'idx': i})
+        nodes = dag.nodes()
+        edges = set()
+        for k in range(3):
+            for j in range(200):
+                u, v = sorted(random.sample(range(50), 2))
+                dag.add_edge(nodes[u], nodes[v])
+                edges.add((u, v))
+            for compact in (False, True):
+                if compact:
+                    dag._compact()
+                    self.assertEqual(dag._new_succ, {})
+                self.assertEqual(dag.number_of_edges(), len(edges))
+                self.assertEqual(sorted((nodes.index(u), nodes.index(v)) for u, v in dag.edges()), sorted(edges))
+                for i, node in enumerate(nodes):
+                    self.assertEqual(sorted(nodes.index(x) for x in dag.predecessors(node)),
+                        sorted(u for u, v in edges if v == i))
+                self.assertEqual(dag.circular_dependencies(), [])
+        # nodes added after compaction
+        dag.add_step('uuid_new', 'step_new', None, [], [], [], {'__changed_vars__': set()})
+        new_node = dag.nodes()[-1]
+        dag.add_edge(nodes[0], new_node)
+        self.assertEqual(dag.successors(new_node), [])
+        self.assertTrue(dag.has_edge(nodes[0], new_node))
+        self.assertEqual(dag.predecessors(new_node), [nodes[0]])
+
+    def testToNetworkx(self):
+        '''Test conversion of DAG to networkx.DiGraph'''
+        try:
+            import networkx
+        except ImportError:
+            self.skipTest('networkx is not installed')
+        script = SoS_Script('''
+[A_1]
+input: None
+output: 'a1.txt'
+
+[A_2]
+output: 'a2.txt'
+
+[A_3]
+output: 'a3.txt'
+''')
+        wf = script.workflow('A')
+        dag = Base_Executor(wf).initialize_dag()
+        graph = dag.to_networkx()
+        self.assertEqual(set(graph.nodes()), set(dag.nodes()))
+        self.assertEqual(set(graph.edges()), set(dag.edges()))
+        self.assertEqual([x._node_id for x in networkx.topological_sort(graph)], ['A_1', 'A_2', 'A_3'])
+        graph = dag.to_networkx(collapse=True)
+        self.assertEqual(set(graph.edges()), {('A_1', 'A_2'), ('A_2', 'A_3')})
+
+    def testSubgraphFrom(self):
+        '''Test trimming of DAG to nodes that produce specified targets'''
+        script = SoS_Script('''
+[A_1]
+input: None
+output: 'a1.txt'
+
+[A_2]
+output: 'a2.txt'
+
+[B]
+input: None
+output: 'b.txt'
+
+[C]
+input: './b.txt'
+output: 'c.txt'
+''')
+        dag = Base_Executor(script.workflow('A+B+C')).initialize_dag()
+        self.assertEqual(dag.num_nodes(), 4)
+        sub = dag.subgraph_from(['c.txt', 'a1.txt'])
+        self.assertTrue(isinstance(sub, SoS_DAG))
+        self.assertEqual(sorted(x._node_id for x in sub.nodes()), ['A_1', 'B_0', 'C_0'])
+        self.assertEqual(sorted((x._node_id, y._node_id) for x, y in sub.edges()), [('B_0', 'C_0')])
+        self.assertTrue(sub.produces('b.txt'))
+        self.assertFalse(sub.produces('a2.txt'))
+        # the trimmed DAG can be extended
+        sub.add_step('uuid', 'D', None, ['c.txt'], [], ['d.txt'], {'__changed_vars__': set()})
+        sub.build([])
+        self.assertEqual(sub.num_nodes(), 4)
+        self.assertEqual(sub.circular_dependencies(), [])
+        self.assertEqual(len(sub.dangling(None)), 0)
+
+    def testWriteDAG(self):
+        '''Test writing DAG in DOT and JSON formats'''
+        import json
+        script = SoS_Script('''
+[align: provides='{name}.bam']
+output: "${name}.bam"
+
+[default]
+depends: ['s{}.bam'.format(i) for i in range(3)]
+output: 'all.txt'
+''')
+        executor = Base_Executor(script.workflow())
+        dag = executor.write_dag('a.dot')
+        with open('a.dot') as dot:
+            self.assertDAG(dag, dot.read())
+        self.assertDAG(dag, '''strict digraph "" {
+default_0;
+"align ['s0.bam']";
+"align ['s1.bam']";
+"align ['s2.bam']";
+"align ['s0.bam']" -> default_0;
+"align ['s1.bam']" -> default_0;
+"align ['s2.bam']" -> default_0;
+}
+''')
+        # nodes of the same step are collapsed
+        out = StringIO()
+        dag.write_dot(out, collapse=True)
+        self.assertEqual(out.getvalue(), '''strict digraph "" {
+default_0;
+align [label="align (3 nodes)"];
+align -> default_0;
+}
+''')
+        # nothing is executed
+        self.assertFalse(os.path.isfile('all.txt'))
+        for collapse in (False, True):
+            executor.write_dag('a.json', collapse=collapse)
+            with open('a.json') as js:
+                graph = json.load(js)
+            self.assertEqual(len(graph['nodes']), 2 if collapse else 4)
+            self.assertEqual([x['size'] for x in graph['nodes']], [1, 3] if collapse else [1, 1, 1, 1])
+            self.assertEqual(sorted(graph['edges']), [[1, 0]] if collapse else [[1, 0], [2, 0], [3, 0]])
+        self.temp_files.extend(['a.dot', 'a.json'])
+
+    def testDAGCache(self):
+        '''Test saving and loading of DAG with configuration dag_cache'''
+        for f in ['a.txt', 'dag_1.in', 'dag_2.in', 'dag_cache.yaml']:
+            FileTarget(f).remove('both')
+        self.touch('dag_1.in')
+        with open('dag_cache.yaml', 'w') as config:
+            config.write('dag_cache: true\n')
+        self.temp_files.append('dag_cache.yaml')
+        script = '''
+[A: provides='{name}.txt']
+output: '${name}.txt'
+
+[default]
+input: 'dag_*.in'
+depends: 'a.txt'
+'''
+        # not saved without the configuration
+        Base_Executor(SoS_Script(script).workflow()).initialize_dag()
+        self.assertEqual(Base_Executor(SoS_Script(script).workflow()).load_dag(), None)
+        executor = Base_Executor(SoS_Script(script).workflow(), config_file='dag_cache.yaml')
+        executor.reset_dict()
+        self.assertEqual(executor.load_dag(), None)
+        self.assertEqual(executor.initialize_dag().num_nodes(), 2)
+        # the saved DAG is loaded for a newly parsed workflow
+        wf = SoS_Script(script).workflow()
+        executor = Base_Executor(wf, config_file='dag_cache.yaml')
+        executor.reset_dict()
+        dag = executor.load_dag()
+        self.assertEqual(dag.num_nodes(), 2)
+        for node in dag.nodes():
+            self.assertEqual(dag.node_by_id(node._node_uuid), node)
+            wf.section_by_id(node._step_uuid)
+        # but not for different targets
+        self.assertEqual(executor.load_dag(['a.txt']), None)
+        # or if a dependent target is created
+        self.touch('a.txt')
+        executor.reset_dict()
+        self.assertEqual(executor.load_dag(), None)
+        self.assertEqual(executor.initialize_dag().num_nodes(), 1)
+        self.assertEqual(executor.load_dag().num_nodes(), 1)
+        # or if globbed files are changed
+        self.touch('dag_2.in')
+        executor.reset_dict()
+        self.assertEqual(executor.load_dag(), None)
+        self.assertEqual(executor.initialize_dag().num_nodes(), 1)
+        # only sections that are changed are analyzed again
+        from sos import sos_executor
+        analyzed = []
+        analyze_section = sos_executor.analyze_section
+        sos_executor.analyze_section = lambda section, *args: analyzed.append(section.step_name()) \
+            or analyze_section(section, *args)
+        try:
+            executor = Base_Executor(SoS_Script(script + 'a = 1\n').workflow(), config_file='dag_cache.yaml')
+            executor.reset_dict()
+            self.assertEqual(executor.initialize_dag().num_nodes(), 1)
+            self.assertEqual(analyzed, ['default_0'])
+        finally:
+            sos_executor.analyze_section = analyze_section
+        # parameters are handled for a loaded DAG
+        script = '''
+parameter: n = 5
+[default]
+output: '${n}.txt'
+'''
+        for i in range(2):
+            executor = Base_Executor(SoS_Script(script).workflow(), args=['--n', '7'], config_file='dag_cache.yaml')
+            executor.reset_dict()
+            if i:
+                self.assertNotEqual(executor.load_dag(), None)
+                executor.reset_dict()
+            self.assertEqual(executor.initialize_dag().num_nodes(), 1)
+            self.assertEqual(env.parameter_vars, {'n'})
+            self.assertEqual(env.sos_dict['n'], 7)
+
 if __name__ == '__main__':
     unittest.main()
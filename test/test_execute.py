@@ -32,7 +32,7 @@ from sos.utils import env
 from sos.sos_eval import Undetermined
 from sos.sos_executor import Base_Executor, MP_Executor, ExecuteError
 from sos.sos_script import ParsingError
-from sos.target import FileTarget
+from sos.target import FileTarget, textMD5, fileDigest, fileDigests
 import subprocess
 
 class TestExecute(unittest.TestCase):
@@ -75,6 +75,9 @@ class TestExecute(unittest.TestCase):
         self.assertEqual(subprocess.call('sos-runner scripts/master', stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 1)
         self.assertEqual(subprocess.call('sos dryrun file://{}/scripts/master.sos'.format(os.getcwd()), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 1)
         self.assertEqual(subprocess.call('sos dryrun scripts/master.sos L', stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 0)
+        self.assertEqual(subprocess.call('sos dryrun scripts/master.sos L --dag master.dot', stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 0)
+        self.assertTrue(os.path.isfile('master.dot'))
+        os.remove('master.dot')
         self.assertEqual(subprocess.call('sos-runner scripts/master L', stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 0)
         self.assertEqual(subprocess.call('sos convert -h', stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL, shell=True), 0)
         #
@@ -250,6 +253,28 @@ output: "${_data['A']}_${_data['B']}_${_data['C']}.txt"
         Base_Executor(wf).dryrun()
         self.assertEqual(env.sos_dict['res'], ['1_2_Hello.txt', '2_4_World.txt'])
 
+    def testSubstepGeneration(self):
+        '''Test generation of substeps one at a time'''
+        from sos.sos_step import Base_Step_Executor
+        self.touch(['a.txt', 'b.txt'])
+        script = SoS_Script(r"""
+[0: shared=['res', 'num_groups']]
+res = []
+x = [1, 2]
+z = ['p', 'q']
+input: 'a.txt', 'b.txt', group_by='single', for_each=['x', 'z']
+num_groups = __num_groups__
+res.append('{}{}{}'.format(_input[0][0], _x, _z))
+""")
+        wf = script.workflow()
+        Base_Executor(wf).run()
+        self.assertEqual(env.sos_dict['num_groups'], 8)
+        self.assertEqual(env.sos_dict['res'], ['a1p', 'b1p', 'a2p', 'b2p', 'a1q', 'b1q', 'a2q', 'b2q'])
+        # groups are not created before they are used
+        num_groups, groups = Base_Step_Executor.handle_group_by(['f{}'.format(x) for x in range(10000)], 'combinations')
+        self.assertEqual(num_groups, 49995000)
+        self.assertEqual(next(groups()), ['f0', 'f1'])
+
     def testPairedWith(self):
         '''Test option paired_with '''
         pass
@@ -511,6 +536,115 @@ if run_mode == 'run':
         MP_Executor(wf).run()
         self.assertLess(time.time() - start, 6)
 
+    def testSharedTaskPool(self):
+        '''Test execution of concurrent tasks of all steps in a pool of -j processes'''
+        env.max_jobs = 2
+        script =  SoS_Script(r"""
+import os
+
+[1]
+repeat = range(4)
+input: for_each='repeat'
+
+task: concurrent=True
+with open('pid_1_{}.txt'.format(_repeat), 'w') as pid:
+    pid.write(str(os.getpid()))
+
+[2]
+repeat = range(4)
+input: for_each='repeat'
+
+task: concurrent=True
+with open('pid_2_{}.txt'.format(_repeat), 'w') as pid:
+    pid.write(str(os.getpid()))
+""")
+        wf = script.workflow()
+        MP_Executor(wf).run()
+        pids = set()
+        self.assertEqual(len(glob.glob('pid_*.txt')), 8)
+        for filename in glob.glob('pid_*.txt'):
+            with open(filename) as pid:
+                pids.add(pid.read())
+            os.remove(filename)
+        # tasks of both steps are executed by the same two processes
+        self.assertTrue(0 < len(pids) <= 2)
+        self.assertEqual(env.task_pool, None)
+
+    def testTaskPoolNamespace(self):
+        '''Test variables that are available to tasks executed by the task pool'''
+        env.max_jobs = 2
+        script =  SoS_Script(r"""
+import os
+
+def global_func(x):
+    return x + 1
+
+[1]
+repeat = range(4)
+step_var = 'a'
+input: for_each='repeat'
+
+task: concurrent=True
+leaked_var = 1
+with open('ns_1_{}.txt'.format(_repeat), 'w') as ns:
+    ns.write('{} {}'.format(step_var, global_func(_repeat)))
+
+[2]
+repeat = range(4)
+def local_func(x):
+    return x * 2
+input: for_each='repeat'
+
+task: concurrent=True
+with open('ns_2_{}.txt'.format(_repeat), 'w') as ns:
+    ns.write('{} {}'.format(local_func(_repeat), 'leaked_var' in globals()))
+""")
+        wf = script.workflow()
+        MP_Executor(wf).run()
+        for i in range(4):
+            with open('ns_1_{}.txt'.format(i)) as ns:
+                self.assertEqual(ns.read(), 'a {}'.format(i + 1))
+            # steps with local functions are executed in forked processes, and
+            # variables of tasks are not leaked to tasks of other steps
+            with open('ns_2_{}.txt'.format(i)) as ns:
+                self.assertEqual(ns.read(), '{} False'.format(i * 2))
+        for filename in glob.glob('ns_*.txt'):
+            os.remove(filename)
+
+    def testTaskPoolFailure(self):
+        '''Test failed tasks that cannot return results to the task pool'''
+        env.max_jobs = 2
+        for task in ('class LocalError(Exception):\n    pass\nraise LocalError(_repeat)',
+            'os.kill(os.getpid(), 9)'):
+            script =  SoS_Script(r"""
+import os
+
+[1]
+repeat = range(2)
+input: for_each='repeat'
+
+task: concurrent=True
+""" + task + '\n')
+            wf = script.workflow()
+            self.assertRaises(ExecuteError, MP_Executor(wf).run)
+
+    def testStepProcessFailure(self):
+        '''Test steps executed by processes that die without results'''
+        env.max_jobs = 2
+        for worker_pool in (False, True):
+            env.worker_pool = worker_pool
+            script =  SoS_Script(r"""
+import os
+
+[1]
+os._exit(3)
+""")
+            wf = script.workflow()
+            try:
+                self.assertRaises(ExecuteError, MP_Executor(wf).run)
+            finally:
+                env.worker_pool = False
+
     def testPrependPath(self):
         '''Test prepend path'''
         import stat
@@ -1141,6 +1275,339 @@ cp ${_input} ${_dest}
         env.sig_mode = 'default'
         shutil.rmtree('temp')
 
+    def testSQLiteSignatureStore(self):
+        '''Test saving signatures to a SQLite database'''
+        env.sig_store = 'sqlite'
+        self._testSignature(r"""
+import time
+[*_0]
+output: 'temp/a.txt', 'temp/b.txt'
+task:
+if run_mode == 'run':
+   time.sleep(1)
+   run('''echo "a.txt" > 'temp/a.txt' ''')
+   run('''echo "b.txt" > 'temp/b.txt' ''')
+
+[1: shared={'oa':'output'}]
+dest = ['temp/c.txt', 'temp/d.txt']
+input: group_by='single', paired_with='dest'
+output: _dest
+
+task:
+if run_mode == 'run':
+    time.sleep(0.5)
+    run(" cp ${_input} ${_dest} ")
+""")
+        # no signature file is written
+        self.assertTrue(os.path.isfile('.sos/signatures.db'))
+        self.assertFalse(glob.glob('.sos/.runtime/*.exe_info'))
+        self.assertFalse(glob.glob('.sos/.runtime/*.file_info'))
+        # signatures are locked through the database instead of lock files
+        self.assertFalse(glob.glob('.sos/.runtime/*_'))
+        self.assertTrue(FileTarget('temp/c.txt').exists('signature'))
+        env.sig_mode = 'default'
+        shutil.rmtree('temp')
+
+    def testSignatureStoreConfig(self):
+        '''Test setting signature store and passing it to tasks'''
+        import pickle
+        from sos.target import RuntimeInfo, UnavailableLock
+        with open('config.yaml', 'w') as config:
+            config.write('sig_store: sqlite\n')
+        script = SoS_Script(r"""
+[0]
+output: 'a.txt'
+task:
+run('touch a.txt')
+""")
+        try:
+            Base_Executor(script.workflow()).run()
+            self.assertTrue(os.path.isfile('.sos/signatures.db'))
+            self.assertFalse(glob.glob('.sos/.runtime/*.exe_info'))
+            self.assertEqual(env.sig_store, 'sqlite')
+            # option -s is checked against available signature stores
+            self.assertEqual(subprocess.call('sos run scripts/master.sos L -n -s bogus', stderr=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, shell=True), 1)
+            # option -s overrides configuration
+            env.sig_store = 'file'
+            Base_Executor(script.workflow()).run()
+            self.assertEqual(env.sig_store, 'file')
+            # signature options are passed along with signatures
+            env.sig_store = 'sqlite'
+            env.sig_check = 'fast'
+            sig = RuntimeInfo('step', 'script', [], ['a.txt'])
+            env.sig_store = 'file'
+            env.sig_check = 'strict'
+            self.assertEqual(pickle.loads(pickle.dumps(sig)).sig_options, ('sqlite', 'fast', env.sig_hash))
+            # the signature is locked by the store
+            self.assertFalse(os.path.isfile(sig.proc_info + '_'))
+            env.sig_store = 'sqlite'
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    RuntimeInfo('step', 'script', [], ['a.txt'])
+                    os._exit(0)
+                except UnavailableLock:
+                    os._exit(1)
+            self.assertEqual(os.waitpid(pid, 0)[1] >> 8, 1)
+            sig.release()
+        finally:
+            env.sig_check = 'strict'
+            os.remove('config.yaml')
+            FileTarget('a.txt').remove('both')
+
+    def testMigrateSignatures(self):
+        '''Test migration of signatures from files to a SQLite database'''
+        from sos.signatures import migrate_signatures
+        os.makedirs('.sos/.runtime')
+        self.touch('a.txt')
+        FileTarget('a.txt').write_sig()
+        self.assertTrue(os.path.isfile(FileTarget('a.txt').sig_file()))
+        self.assertEqual(migrate_signatures('.sos/.runtime', 'file', 'sqlite', remove=True), 1)
+        self.assertFalse(os.path.isfile(FileTarget('a.txt').sig_file()))
+        env.sig_store = 'sqlite'
+        self.assertTrue(FileTarget('a.txt').exists('signature'))
+        self.assertTrue(FileTarget('a.txt').validate())
+        self.assertEqual(FileTarget('a.txt').size(), 4)
+        # and back
+        self.assertEqual(migrate_signatures('.sos/.runtime', 'sqlite', 'file'), 1)
+        env.sig_store = 'file'
+        self.assertTrue(FileTarget('a.txt').validate())
+        # signatures under ~/.sos are also migrated by command sos migrate
+        home = os.path.abspath('home')
+        os.makedirs(os.path.join(home, '.sos', '.runtime'))
+        with open(os.path.join(home, '.sos', '.runtime', 'a.exe_info'), 'w') as sig:
+            sig.write('test\n')
+        try:
+            self.assertEqual(subprocess.call('sos migrate --remove', stderr=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, shell=True, env=dict(os.environ, HOME=home)), 0)
+            self.assertFalse(os.path.isfile(os.path.join(home, '.sos', '.runtime', 'a.exe_info')))
+            self.assertTrue(os.path.isfile(os.path.join(home, '.sos', 'signatures.db')))
+            self.assertFalse(os.path.isfile(FileTarget('a.txt').sig_file()))
+            self.assertEqual(migrate_signatures(os.path.join(home, '.sos', '.runtime'), 'sqlite', 'file'), 1)
+        finally:
+            shutil.rmtree(home)
+
+    def testFastSignatureCheck(self):
+        '''Test validation of signatures with size, mtime and inode of files'''
+        os.makedirs('.sos/.runtime')
+        self.touch('a.txt')
+        FileTarget('a.txt').write_sig()
+        # change content without changing size and modification time
+        st = os.stat('a.txt')
+        with open('a.txt', 'w') as a:
+            a.write('TEST')
+        os.utime('a.txt', ns=(st.st_atime_ns, st.st_mtime_ns))
+        env.sig_check = 'strict'
+        self.assertFalse(FileTarget('a.txt').validate())
+        env.sig_check = 'fast'
+        self.assertTrue(FileTarget('a.txt').validate())
+        # MD5 of the original content is taken from the signature
+        t = FileTarget('a.txt')
+        self.assertTrue(t.validate_stat())
+        self.assertEqual(t.md5(), textMD5('test'))
+        # a changed modification time leads to MD5 comparison
+        os.utime('a.txt', ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+        self.assertFalse(FileTarget('a.txt').validate())
+        env.sig_check = 'strict'
+
+    def testSignatureHashAlgorithm(self):
+        '''Test file signatures calculated with different hash algorithms'''
+        os.makedirs('.sos/.runtime')
+        self.touch(['a.txt', 'b.txt'])
+        env.sig_hash = 'blake2b'
+        FileTarget('a.txt').write_sig()
+        self.assertTrue(FileTarget('a.txt').md5().startswith('blake2b:'))
+        self.assertTrue(FileTarget('a.txt').validate())
+        self.assertEqual(fileDigests(['a.txt', 'b.txt'], 'blake2b'),
+            [FileTarget('a.txt').md5()] * 2)
+        # signatures remain valid with another default algorithm
+        env.sig_hash = 'md5'
+        self.assertTrue(FileTarget('a.txt').validate())
+        self.assertEqual(FileTarget('b.txt').calc_md5(), textMD5('test'))
+        self.assertEqual(fileDigest('a.txt'), textMD5('test'))
+
+    def testWorkflowSignatureJournal(self):
+        '''Test merging of buffered records to workflow signature'''
+        from sos.signatures import workflow_journal
+        for f in ['a.txt', 'b.txt']:
+            FileTarget(f).remove('both')
+        script = SoS_Script(r"""
+[A_1]
+output: 'a.txt'
+run('touch a.txt')
+
+[A_2]
+output: 'b.txt'
+# records of completed steps are merged before the workflow is completed
+with open(__workflow_sig__) as sig:
+    assert 'OUT_FILE\tfilename=a.txt' in sig.read()
+run('touch b.txt')
+""")
+        wf = script.workflow('A')
+        executor = MP_Executor(wf)
+        executor.run()
+        workflow_sig = env.sos_dict['__workflow_sig__']
+        self.assertFalse(glob.glob(workflow_sig + '.*'))
+        with open(workflow_sig) as sig:
+            content = sig.read()
+        self.assertEqual(content.count('EXE_SIG'), 2)
+        self.assertTrue('OUT_FILE\tfilename=a.txt' in content)
+        self.assertTrue('OUT_FILE\tfilename=b.txt' in content)
+        # records are written only after they are merged
+        workflow_journal.append(workflow_sig, 'RECORD\n')
+        workflow_journal.flush()
+        with open(workflow_sig) as sig:
+            self.assertFalse('RECORD' in sig.read())
+        self.assertEqual(workflow_journal.merge(workflow_sig), 1)
+        with open(workflow_sig) as sig:
+            self.assertTrue(sig.read().endswith('RECORD\n'))
+        # segments of other executions are not merged, and are removed if
+        # the master processes of the executions have quit
+        proc = subprocess.Popen(['true'])
+        proc.wait()
+        segments = ['{}.{}-0.{}.journal'.format(workflow_sig, pid, pid) for pid in (os.getpid(), proc.pid)]
+        for segment in segments:
+            with open(segment, 'w') as journal:
+                journal.write('OTHER\n')
+        self.assertEqual(workflow_journal.merge(workflow_sig), 0)
+        self.assertTrue(os.path.isfile(segments[0]))
+        self.assertFalse(os.path.isfile(segments[1]))
+        os.remove(segments[0])
+        with open(workflow_sig) as sig:
+            self.assertFalse('OTHER' in sig.read())
+        for f in ['a.txt', 'b.txt']:
+            FileTarget(f).remove('both')
+
+    def testStatCache(self):
+        '''Test cached status of files during the execution of workflows'''
+        from sos.target import StatCache
+        for f in ['a.txt', 'b.txt', 'c.txt']:
+            FileTarget(f).remove('both')
+        cache = StatCache()
+        # status of files are not cached outside of workflows
+        self.assertFalse(cache.isfile('a.txt'))
+        with open('a.txt', 'w') as a:
+            a.write('a')
+        self.assertTrue(cache.isfile('a.txt'))
+        cache.start()
+        self.assertTrue(cache.isfile('a.txt'))
+        self.assertTrue(cache.isfile('a.txt'))
+        self.assertEqual(cache.saved, 1)
+        # the directory is listed when the second file under it is checked
+        # so files that do not exist are not checked with os.stat
+        self.assertFalse(cache.isfile('b.txt'))
+        self.assertFalse(cache.isfile('c.txt'))
+        self.assertEqual(cache.saved, 3)
+        with open('b.txt', 'w') as b:
+            b.write('b')
+        self.assertFalse(cache.isfile('b.txt'))
+        cache.invalidate('b.txt')
+        self.assertTrue(cache.isfile('b.txt'))
+        self.assertEqual(cache.stat('b.txt').st_size, 1)
+        cache.stop()
+        self.assertFalse(cache.active)
+        # files created by steps are seen by later steps
+        FileTarget('b.txt').remove('both')
+        script = SoS_Script(r"""
+[A_1]
+output: 'b.txt'
+run('touch b.txt')
+
+[A_2]
+input: 'a.txt', 'b.txt'
+output: 'c.txt'
+run('touch c.txt')
+""")
+        wf = script.workflow('A')
+        Base_Executor(wf).run()
+        self.assertTrue(os.path.isfile('c.txt'))
+        for f in ['a.txt', 'b.txt', 'c.txt']:
+            FileTarget(f).remove('both')
+        # files created by a step after their directory was listed are seen by the step
+        script = SoS_Script(r"""
+[0]
+from sos.target import FileTarget
+assert not FileTarget('b.txt').exists() and not FileTarget('c.txt').exists()
+run('touch b.txt c.txt')
+assert FileTarget('b.txt').exists() and FileTarget('c.txt').exists()
+""")
+        wf = script.workflow()
+        Base_Executor(wf).run()
+        # the cache is stopped even if the workflow fails
+        script = SoS_Script(r"""
+[0]
+fail_if(True, 'failed')
+""")
+        wf = script.workflow()
+        self.assertRaises(Exception, Base_Executor(wf).run)
+        from sos.target import stat_cache
+        self.assertFalse(stat_cache.active)
+        for f in ['a.txt', 'b.txt', 'c.txt']:
+            FileTarget(f).remove('both')
+
+    def testResume(self):
+        '''Test resuming the execution of a workflow from its checkpoint'''
+        for f in ['resume_a.txt', 'resume_ok.txt', 'resume.log']:
+            FileTarget(f).remove('both')
+        script = SoS_Script(r'''
+[A_1]
+output: 'resume_a.txt'
+sh:
+    echo 1 >> resume.log
+    echo a > resume_a.txt
+
+[A_2]
+fail_if(not os.path.isfile('resume_ok.txt'))
+''')
+        # ignore signatures so that steps are executed unless they are resumed
+        env.sig_mode = 'ignore'
+        env.max_jobs = 2
+        executor = MP_Executor(script.workflow('A'))
+        self.assertRaises(ExecuteError, executor.run)
+        self.assertTrue(os.path.isfile(executor._checkpoint_file()))
+        self.assertRaises(ExecuteError, MP_Executor(script.workflow('A')).run)
+        with open('resume.log') as log:
+            self.assertEqual(len(log.readlines()), 2)
+        # the completed step is executed again if its output is changed
+        env.resume = True
+        with open('resume_a.txt', 'w') as a:
+            a.write('changed')
+        self.assertRaises(ExecuteError, MP_Executor(script.workflow('A')).run)
+        with open('resume.log') as log:
+            self.assertEqual(len(log.readlines()), 3)
+        with open('resume_ok.txt', 'w') as ok:
+            ok.write('ok')
+        executor = MP_Executor(script.workflow('A'))
+        executor.run()
+        with open('resume.log') as log:
+            self.assertEqual(len(log.readlines()), 3)
+        # checkpoint is removed after the workflow is completed
+        self.assertFalse(os.path.isfile(executor._checkpoint_file()))
+        for f in ['resume_a.txt', 'resume_ok.txt', 'resume.log']:
+            FileTarget(f).remove('both')
+
+    def testSharedFilePath(self):
+        '''Test sharing of paths by targets of the same file'''
+        import pickle
+        a = FileTarget('a.txt')
+        b = FileTarget('a.txt')
+        c = FileTarget(os.path.abspath('a.txt'))
+        self.assertTrue(a._path is b._path)
+        self.assertEqual(a, c)
+        self.assertNotEqual(a, FileTarget('b.txt'))
+        self.assertNotEqual(a, 'a.txt')
+        self.assertEqual(len({a, b, c}), 1)
+        self.assertEqual(a.sig_file(), c.sig_file())
+        self.assertEqual(repr(c), os.path.abspath('a.txt'))
+        # attachments and digests are not shared
+        a.add('b.txt')
+        self.assertEqual(len(b._attachments), 0)
+        d = pickle.loads(pickle.dumps(a))
+        self.assertEqual(d, a)
+        self.assertEqual(d._attachments, a._attachments)
+        self.assertTrue(d._path is a._path)
+
     def testSignatureWithSharedVariable(self):
         '''Test restoration of signature from variables.'''
         FileTarget('a.txt').remove('both')
@@ -1804,5 +2271,43 @@ run:
         wf = script.workflow()
         Base_Executor(wf).run()
 
+    def testLargeSharedVar(self):
+        '''Test passing large shared variables through files'''
+        script = SoS_Script('''
+[1: shared='data']
+data = b'a' * 3000000
+
+[2: shared={'size': 'len(data)', 'type': 'type(data).__name__', 'files': 'num_files'}]
+import glob
+num_files = len(glob.glob('.sos/*.shared'))
+''')
+        for executor in (Base_Executor, MP_Executor):
+            env.max_jobs = 2
+            executor(script.workflow()).run()
+            self.assertEqual(env.sos_dict['size'], 3000000)
+            self.assertEqual(env.sos_dict['type'], 'bytes')
+            self.assertEqual(env.sos_dict['data'], b'a' * 3000000)
+            # the value was passed through a file, which is removed afterwards
+            self.assertEqual(env.sos_dict['files'], 1)
+            self.assertEqual(glob.glob('.sos/*.shared'), [])
+        # files are also removed if the workflow fails
+        script = SoS_Script('''
+[1: shared='data']
+data = b'a' * 3000000
+
+[2]
+fail_if(len(data) > 0, 'failed')
+''')
+        self.assertRaises(Exception, Base_Executor(script.workflow()).run)
+        self.assertEqual(glob.glob('.sos/*.shared'), [])
+        # except for files that are needed to resume from the checkpoint
+        executor = MP_Executor(script.workflow())
+        self.assertRaises(Exception, executor.run)
+        self.assertTrue(os.path.isfile(executor._checkpoint_file()))
+        self.assertEqual(len(glob.glob('.sos/*.shared')), 1)
+        os.remove(executor._checkpoint_file())
+        for filename in glob.glob('.sos/*.shared'):
+            os.remove(filename)
+
 if __name__ == '__main__':
     unittest.main()
@@ -23,15 +23,17 @@
 import os
 import unittest
 import cProfile
+import time
 import timeit
 import shutil
 import textwrap
 
 # these functions are normally not available but can be imported 
 # using their names for testing purposes
-from sos.utils import env, logger, WorkflowDict, ProgressBar
-from sos.pattern import extract_pattern, expand_pattern
-from sos.sos_eval import interpolate, SoS_eval, InterpolationError, accessed_vars, \
+from sos.utils import env, logger, WorkflowDict, ProgressBar, SharedValue, share_value, PickledVars
+from sos.pattern import extract_pattern, expand_pattern, apply_wildcards, _compiled_patterns, \
+    glob_wildcards, glob_files, directory_listings
+from sos.sos_eval import interpolate, SoS_eval, SoS_exec, InterpolationError, accessed_vars, \
     Undetermined, on_demand_options
 from sos.actions import downloadURL
 from sos.sos_script import SoS_Script
@@ -51,6 +53,12 @@ def internet_on(host='8.8.8.8', port=80, timeout=3):
 
 with_network = internet_on()
 
+try:
+    import numpy
+    with_numpy = True
+except ImportError:
+    with_numpy = False
+
 class TestUtils(unittest.TestCase):
     def setUp(self):
         env.reset()
@@ -219,6 +227,55 @@ class TestUtils(unittest.TestCase):
         # interpolation will only happen in string
         self.assertRaises(SyntaxError, SoS_eval, '''${a}''', '${ }')
 
+    def testInterpolationTemplate(self):
+        '''Test interpolation with parsed templates'''
+        from sos.sos_eval import SoS_String
+        env.sos_dict = WorkflowDict({'a': 1, 'b': ['file 1', 'file2'], 's': '${a}'})
+        for i in range(2):
+            self.assertEqual(interpolate('cat ${b!q} > ${a:03d}.txt', '${ }'), "cat 'file 1' file2 > 001.txt")
+        self.assertTrue(SoS_String.TEMPLATES[('cat ${b!q} > ${a:03d}.txt', '${', '}')])
+        # nested and escaped sigils are interpolated dynamically
+        self.assertEqual(interpolate('${b[${a}]}', '${ }'), 'file2')
+        self.assertEqual(SoS_String.TEMPLATES[('${b[${a}]}', '${', '}')], None)
+        self.assertEqual(interpolate('\\${a} ${a}', '${ }'), '${a} 1')
+        # interpolated values with sigils are interpolated again
+        self.assertEqual(interpolate('value is ${s}', '${ }'), 'value is 1')
+        # expressions are evaluated only once
+        calls = []
+        env.sos_dict.set('f', lambda: calls.append(1) or 'x')
+        self.assertEqual(interpolate('${f()} ${s}', '${ }'), 'x 1')
+        self.assertEqual(len(calls), 1)
+        self.assertRaises(InterpolationError, interpolate, '${f()} ${1/0}', '${ }')
+        self.assertEqual(len(calls), 2)
+
+    def testCachedExec(self):
+        '''Test repeated execution of statements with cached code'''
+        env.sos_dict = WorkflowDict({'interpolate': interpolate, 'a': 1})
+        stmts = '''
+class A:
+    def __init__(self):
+        pass
+
+    def value(self):
+        return a
+
+b = "${a + 1}"
+A().value()
+'''
+        for i in range(3):
+            env.sos_dict.set('a', i)
+            self.assertEqual(SoS_exec(stmts, '${ }'), i)
+            self.assertEqual(env.sos_dict['b'], str(i + 1))
+            self.assertEqual(SoS_eval('"${a}" * 2', '${ }'), str(i) * 2)
+        # statements are executed until the one that fails
+        self.assertRaises(NameError, SoS_exec, 'c = 5\nc += d\n', None)
+        self.assertEqual(env.sos_dict['c'], 5)
+        # the size of caches are limited
+        from sos import sos_eval
+        for i in range(sos_eval.MAX_CACHED_CODE + 10):
+            SoS_eval('{}'.format(i), None)
+        self.assertLessEqual(len(sos_eval.SoS_eval_cache), sos_eval.MAX_CACHED_CODE + 1)
+
     def testWorkflowDict(self):
         '''Test workflow dict with attribute access'''
         env.reset()
@@ -229,6 +286,82 @@ class TestUtils(unittest.TestCase):
         d['a'] += 1
         self.assertEqual(d['a'], 2)
 
+    def testSharedValue(self):
+        '''Test saving and loading large values shared by steps'''
+        import copy
+        import pickle
+        for value in (b'a' * 2000000, bytearray(b'b' * 2000000)):
+            res = share_value(value)
+            self.assertTrue(isinstance(res, SharedValue))
+            # only the name of the file is passed
+            self.assertLess(len(pickle.dumps(res)), 1000)
+            self.assertTrue(copy.deepcopy(res) is res)
+            self.assertEqual(res.load(), value)
+            self.assertEqual(type(res.load()), type(value))
+            os.remove(res.filename)
+        # small values are copied
+        self.assertEqual(share_value(b'a' * 100), b'a' * 100)
+        value = ['a' * 2000000]
+        res = share_value(value)
+        self.assertEqual(res, value)
+        self.assertFalse(res is value)
+        d = WorkflowDict()
+        d.set('a', share_value(b'c' * 2000000))
+        d.set('b', 1)
+        d.set('c', share_value(b'd' * 2000000))
+        filenames = [d.get('a').filename, d.get('c').filename]
+        # only values of selected variables are loaded
+        d.load_shared_values({'a', 'b'})
+        self.assertEqual(d.get('a'), b'c' * 2000000)
+        self.assertTrue(isinstance(d.get('c'), SharedValue))
+        # other values are loaded when they are accessed
+        self.assertEqual(d['c'], b'd' * 2000000)
+        self.assertEqual(d.get('c'), b'd' * 2000000)
+        for filename in filenames:
+            os.remove(filename)
+
+    @unittest.skipIf(not with_numpy, 'Skip test because numpy is not installed')
+    def testSharedArray(self):
+        '''Test loading of shared numpy array from mapped memory'''
+        value = numpy.arange(1000000, dtype='float64')
+        res = share_value(value)
+        self.assertTrue(isinstance(res, SharedValue))
+        loaded = res.load()
+        self.assertTrue((loaded == value).all())
+        # the loaded array can be changed without changing the file
+        loaded[0] = 5
+        self.assertEqual(res.load()[0], 0)
+        os.remove(res.filename)
+
+    def testPickleSelectedVars(self):
+        '''Test pickling of variables sent to tasks'''
+        import pickle
+        d = WorkflowDict()
+        d.set('a', 'ref.fa')
+        d.set('b', [1, 2])
+        d.set('input', ['a.txt', 'b.txt'])
+        d.set('f', lambda x: x)
+        d.set('os', os)
+        d.set('c', 1)
+        cache = {}
+        pickled = d.pickle_selected_vars({'a', 'b', 'input', 'f', 'os'}, cache)
+        self.assertEqual(sorted(pickled.keys()), ['a', 'b', 'input'])
+        # unpickleable values and values that can be changed are not cached
+        self.assertEqual(sorted(cache.keys()), ['a', 'f', 'input'])
+        self.assertEqual(cache['f'][1], None)
+        # pickled values are reused if variables are not changed
+        d['b'].append(3)
+        d.set('input', ['c.txt'])
+        again = d.pickle_selected_vars({'a', 'b', 'input', 'f', 'os'}, cache)
+        self.assertTrue(again['a'] is pickled['a'])
+        vars = pickle.loads(pickle.dumps(PickledVars(again)))
+        self.assertEqual(vars, {'a': 'ref.fa', 'b': [1, 2, 3], 'input': ['c.txt']})
+        self.assertEqual(PickledVars(again).load(), vars)
+        # cloned values are copies
+        cloned = d.clone_selected_vars({'b', 'f', 'c'})
+        self.assertEqual(cloned, {'b': [1, 2, 3], 'c': 1})
+        self.assertFalse(cloned['b'] is d['b'])
+
     def testPatternMatch(self):
         '''Test snake match's pattern match facility'''
         res = extract_pattern('{a}-{b}.txt', ['file-1.txt', 'file-ab.txt'])
@@ -256,6 +389,55 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(expand_pattern('{b}.txt'), ['file name.txt'])
         self.assertEqual(expand_pattern('{c}.txt'), ['file1.txt', 'file2.txt', 'file 3.txt'])
         self.assertEqual(expand_pattern('{a}_{c}.txt'), ['100_file1.txt', '100_file2.txt', '100_file 3.txt'])
+        # a pattern with constraint and repeated wildcard is compiled once
+        # and matched against all files
+        res = extract_pattern('{name}_R{read,\\d}_{name}.fq', ['a_R1_a.fq', 'a_R1_b.fq', 'b_Rx_b.fq', 'b_R2_b.fq'])
+        self.assertEqual(res, {'name': ['a', None, None, 'b'], 'read': ['1', None, None, '2']})
+        self.assertTrue('{name}_R{read,\\d}_{name}.fq' in _compiled_patterns)
+        self.assertEqual(apply_wildcards('{name}_R{read,\\d}.fq', {'name': 'a', 'read': 1}), 'a_R1.fq')
+        self.assertEqual(apply_wildcards('{name}_R{read}.fq', {'name': 'a'}, keep_dynamic=True), 'a_R{read}.fq')
+        # the size of caches are limited
+        from sos import pattern
+        for i in range(pattern.MAX_CACHED_PATTERNS + 10):
+            apply_wildcards('{{name}}_{}.fq'.format(i), {'name': 'a'})
+        self.assertLessEqual(len(pattern._pattern_templates), pattern.MAX_CACHED_PATTERNS + 1)
+
+    def testGlobWildcards(self):
+        '''Test glob_wildcards with pruned directories and cached listings'''
+        if os.path.isdir('glob_test'):
+            shutil.rmtree('glob_test')
+        for sample in ('S1', 'S2'):
+            os.makedirs(os.path.join('glob_test', sample, 'raw'))
+            os.makedirs(os.path.join('glob_test', sample, 'work', 'raw'))
+            for read in ('R1', 'R2'):
+                for d in ('raw', os.path.join('work', 'raw')):
+                    with open(os.path.join('glob_test', sample, d, read + '.fq'), 'w'):
+                        pass
+        # wildcards without constraints can match multiple levels of directories
+        res = glob_wildcards('glob_test/{sample}/raw/{read}.fq')
+        self.assertEqual(sorted(zip(res['sample'], res['read'])), [('S1', 'R1'), ('S1', 'R2'),
+            ('S1/work', 'R1'), ('S1/work', 'R2'), ('S2', 'R1'), ('S2', 'R2'), ('S2/work', 'R1'), ('S2/work', 'R2')])
+        # directories that cannot match the pattern are not scanned
+        res = glob_wildcards('glob_test/{sample,\\w+}/raw/{read,[^/]+}.fq')
+        self.assertEqual(sorted(zip(res['sample'], res['read'])), [('S1', 'R1'), ('S1', 'R2'), ('S2', 'R1'), ('S2', 'R2')])
+        # cached listings are updated when directories are changed
+        env.listing_cache = True
+        try:
+            directory_listings.clear()
+            os.utime(os.path.join('glob_test', 'S1', 'raw'), (time.time() - 10, time.time() - 10))
+            self.assertEqual(sorted(glob_files('glob_test/S1/raw/*.fq')),
+                ['glob_test/S1/raw/R1.fq', 'glob_test/S1/raw/R2.fq'])
+            self.assertTrue(os.path.join('glob_test', 'S1', 'raw') in directory_listings._listings)
+            with open(os.path.join('glob_test', 'S1', 'raw', 'R3.fq'), 'w'):
+                pass
+            self.assertEqual(sorted(glob_files('glob_test/S1/raw/*.fq')),
+                ['glob_test/S1/raw/R1.fq', 'glob_test/S1/raw/R2.fq', 'glob_test/S1/raw/R3.fq'])
+            res = glob_wildcards('glob_test/S1/raw/{read,\\w+}.fq')
+            self.assertEqual(sorted(res['read']), ['R1', 'R2', 'R3'])
+        finally:
+            env.listing_cache = False
+            directory_listings.clear()
+        shutil.rmtree('glob_test')
 
     def testAccessedVars(self):
         '''Test accessed vars of a SoS expression or statement.'''